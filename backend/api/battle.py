@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多人对战API（房间状态在内存中，事件通过 SSE 推送）
+"""
+
+from flask import request, jsonify, current_app, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from db import get_db, get_user_db
+from services.question_bank import question_bank
+from services.pubsub import hub
+from services.shards import router as shard_router
+from services.maintenance import connect as maintenance_connect
+from services import battle
+from services.battle import engine, BattleError
+import os
+import time
+
+SAVE_RESULTS_SQL = """
+    INSERT INTO quiz_records
+    (user_id, mode, start_time, end_time, total_questions, correct_answers, time_spent, completed)
+    VALUES (?, 'battle', ?, ?, ?, ?, ?, TRUE)
+"""
+
+def load_username(user_id):
+    with get_db() as conn:
+        row = conn.execute("SELECT username FROM users WHERE id = ?", (user_id,)).fetchone()
+    return row['username'] if row else None
+
+def register_battle_routes(app):
+    """注册对战相关路由"""
+
+    app.config.setdefault('BATTLE_MAX_ROOMS', int(os.environ.get('QUIZ_BATTLE_MAX_ROOMS', battle.DEFAULT_MAX_ROOMS)))
+    app.config.setdefault('BATTLE_REVEAL_SECONDS',
+                          float(os.environ.get('QUIZ_BATTLE_REVEAL_SECONDS', battle.DEFAULT_REVEAL_SECONDS)))
+    engine.max_rooms = app.config['BATTLE_MAX_ROOMS']
+    engine.reveal_seconds = app.config['BATTLE_REVEAL_SECONDS']
+    # 对战房间的 SSE 连接数上限（计入 SSE_MAX_SUBSCRIBERS 总数），避免对战连接占满全部工作线程
+    app.config.setdefault('SSE_MAX_BATTLE_STREAMS',
+                          int(os.environ.get('QUIZ_SSE_MAX_BATTLE_STREAMS', battle.DEFAULT_MAX_STREAMS)))
+    hub.limits['battle'] = app.config['SSE_MAX_BATTLE_STREAMS']
+
+    # 旧库的 quiz_records.mode 只允许 speed / study（主库也要迁移：合并分片时对战成绩会搬回主库）
+    for path in dict.fromkeys([shard_router.main_path] + shard_router.user_paths()):
+        conn = maintenance_connect(path)
+        try:
+            if battle.ensure_battle_mode(conn):
+                app.logger.info(f'{path}: quiz_records 已允许 battle 模式')
+        finally:
+            conn.close()
+
+    def save_results(room):
+        """对战结束：每位玩家的成绩写成一条 battle 模式的答题记录（按所在分片各一个事务）"""
+        results = {row[0]: row for row in room.results()}
+        try:
+            with app.app_context():
+                for user_ids in shard_router.partition(results).values():
+                    conn = get_user_db(user_ids[0])
+                    try:
+                        conn.executemany(SAVE_RESULTS_SQL, [results[user_id] for user_id in user_ids])
+                        conn.commit()
+                    finally:
+                        conn.close()
+        except Exception:
+            app.logger.exception(f'保存对战 {room.code} 的成绩失败')
+
+    engine.on_finished = save_results
+
+    def battle_error(e):
+        return jsonify({'error': str(e)}), e.status
+
+    @app.route('/api/battle/rooms', methods=['POST'])
+    @jwt_required()
+    def create_battle_room():
+        """创建对战房间（创建者为房主）
+
+        参数：subject（默认语文）、tag、count（题目数，默认 10）、time_limit（每题秒数，默认 15）
+        """
+        try:
+            user_id = get_jwt_identity()
+            data = request.get_json() or {}
+            subject_name = data.get('subject', '语文')
+            try:
+                count = int(data.get('count', battle.DEFAULT_QUESTION_COUNT))
+                time_limit = int(data.get('time_limit', battle.DEFAULT_TIME_LIMIT))
+            except (TypeError, ValueError):
+                return jsonify({'error': '无效的参数'}), 400
+            if not 1 <= count <= battle.MAX_QUESTION_COUNT:
+                return jsonify({'error': f'题目数须在 1 到 {battle.MAX_QUESTION_COUNT} 之间'}), 400
+            if not battle.MIN_TIME_LIMIT <= time_limit <= battle.MAX_TIME_LIMIT:
+                return jsonify({'error': f'每题时限须在 {battle.MIN_TIME_LIMIT} 到 {battle.MAX_TIME_LIMIT} 秒之间'}), 400
+
+            with get_db() as conn:
+                # 题目与答案表取自题库缓存，对战过程中判分不再查询数据库
+                bank = question_bank.get(conn, subject_name)
+                questions, answer_key = battle.pick_questions(bank, count, data.get('tag'))
+
+            room = engine.create_room(user_id, load_username(user_id), subject_name, questions, answer_key,
+                                      time_limit)
+            with room.lock:
+                return jsonify(room.snapshot()), 201
+
+        except BattleError as e:
+            return battle_error(e)
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/battle/rooms/<code>', methods=['GET'])
+    @jwt_required()
+    def get_battle_room(code):
+        """房间当前状态"""
+        try:
+            room = engine.get(code)
+            with room.lock:
+                return jsonify(room.snapshot()), 200
+        except BattleError as e:
+            return battle_error(e)
+
+    @app.route('/api/battle/rooms/<code>/join', methods=['POST'])
+    @jwt_required()
+    def join_battle_room(code):
+        """加入房间（对战开始前；对战中离开的玩家可重新加入）"""
+        try:
+            user_id = get_jwt_identity()
+            room = engine.join(code, user_id, load_username(user_id))
+            with room.lock:
+                return jsonify(room.snapshot()), 200
+        except BattleError as e:
+            return battle_error(e)
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/battle/rooms/<code>/leave', methods=['POST'])
+    @jwt_required()
+    def leave_battle_room(code):
+        """离开房间（房主在开始前离开则解散房间）"""
+        try:
+            engine.leave(code, get_jwt_identity())
+            return jsonify({'message': '已离开房间'}), 200
+        except BattleError as e:
+            return battle_error(e)
+
+    @app.route('/api/battle/rooms/<code>/start', methods=['POST'])
+    @jwt_required()
+    def start_battle(code):
+        """房主开始对战"""
+        try:
+            engine.start(code, get_jwt_identity())
+            return jsonify({'message': '对战开始'}), 200
+        except BattleError as e:
+            return battle_error(e)
+
+    @app.route('/api/battle/rooms/<code>/answer', methods=['POST'])
+    @jwt_required()
+    def answer_battle_question(code):
+        """作答当前题目：立即返回对错与得分，正确答案在本题揭晓时统一推送"""
+        try:
+            data = request.get_json() or {}
+            question_id = data.get('question_id')
+            selected_option_id = data.get('selected_option_id')
+            if not isinstance(question_id, int) or not isinstance(selected_option_id, int):
+                return jsonify({'error': '缺少必要参数'}), 400
+
+            is_correct, points, score = engine.answer(code, get_jwt_identity(), question_id, selected_option_id)
+            return jsonify({
+                'is_correct': is_correct,
+                'points': points,
+                'score': score
+            }), 200
+        except BattleError as e:
+            return battle_error(e)
+
+    @app.route('/api/battle/rooms/<code>/stream', methods=['GET'])
+    @jwt_required(locations=['headers', 'query_string'])  # EventSource 无法设置请求头，可用 ?jwt=<token>
+    def stream_battle_room(code):
+        """房间事件推送（SSE）：先发完整快照，之后推送加入、出题、作答、揭晓与结算事件"""
+        try:
+            room = engine.get(code)
+        except BattleError as e:
+            return battle_error(e)
+
+        # 同一用户重连时取代旧连接，旧连接随即结束并释放其工作线程
+        subscriber = hub.subscribe(room.topic, owner=get_jwt_identity())
+        if subscriber is None:
+            return jsonify({'error': '订阅连接数已满，请稍后重试'}), 503
+
+        heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+        token_expires = get_jwt()['exp']
+
+        @stream_with_context
+        def generate():
+            try:
+                yield b'retry: 3000\n\n'
+                yield engine.snapshot_frame(room)
+                # 令牌过期后结束推送，客户端会带新令牌重连；房间结束或关闭后推送完剩余事件即结束
+                while time.time() < token_expires:
+                    message = subscriber.get(heartbeat)
+                    if subscriber.superseded:
+                        break
+                    if subscriber.lagging:
+                        subscriber.drain()
+                        yield engine.snapshot_frame(room)
+                    elif message is not None:
+                        yield message
+                    elif room.closed:
+                        break
+                    else:
+                        yield b': ping\n\n'
+                    if room.closed and subscriber.queue.empty():
+                        break
+            finally:
+                hub.unsubscribe(subscriber)
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # 关闭反向代理缓冲
+        })
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据导出API（流式 NDJSON / CSV）
+"""
+
+from flask import request, jsonify, Response, stream_with_context, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from db import get_db, get_user_db, get_user_dbs
+from services.export import DATASETS, FORMATS, DEFAULT_BATCH_SIZE, parse_filters, export_chunks
+from services.archive import attach_archive
+import datetime
+
+def check_export_permission(conn, user_id, filters):
+    """校验导出范围：本人数据可直接导出；分组数据仅组长可导出（可再按成员筛选），
+    且只包含已授权共享的成员（见 group_export_consents）
+
+    返回错误信息，允许时返回 None；未指定范围时默认导出本人数据
+    """
+    if 'group_id' in filters:
+        cursor = conn.execute(
+            "SELECT role FROM group_members WHERE group_id = ? AND user_id = ?",
+            (filters['group_id'], user_id)
+        )
+        row = cursor.fetchone()
+        if not row or row['role'] != 'owner':
+            return '只有组长可以导出分组数据'
+        return None
+    if filters.setdefault('user_id', user_id) != user_id:
+        return '只能导出本人或本人所管理分组的数据'
+    return None
+
+def register_export_routes(app):
+    """注册导出相关路由"""
+
+    app.config.setdefault('EXPORT_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+
+    @app.route('/api/export/<dataset>', methods=['GET'])
+    @jwt_required()
+    def export_dataset(dataset):
+        """流式导出答题记录（quiz_records）或单题记录（question_answers）
+
+        参数：format=ndjson|csv，user_id、group_id、mode、from、to（YYYY-MM-DD，含当天）
+        """
+        dataset = dataset.replace('-', '_')
+        if dataset not in DATASETS:
+            return jsonify({'error': '无效的导出类型'}), 404
+
+        fmt = request.args.get('format', 'ndjson')
+        if fmt not in FORMATS:
+            return jsonify({'error': '无效的导出格式'}), 400
+
+        try:
+            filters = parse_filters(
+                user_id=request.args.get('user_id'),
+                group_id=request.args.get('group_id'),
+                mode=request.args.get('mode'),
+                date_from=request.args.get('from'),
+                date_to=request.args.get('to'),
+            )
+        except ValueError:
+            return jsonify({'error': '无效的筛选条件'}), 400
+
+        user_id = get_jwt_identity()
+        with get_db() as conn:
+            error = check_export_permission(conn, user_id, filters)
+        if error:
+            return jsonify({'error': error}), 403
+
+        batch_size = app.config['EXPORT_BATCH_SIZE']
+
+        @stream_with_context
+        def generate():
+            # 连接在生成器内打开，随响应结束关闭；每批一条查询，不会长时间占用读事务。
+            # 分片模式下只导出本人时只读本人所在的分片，导出分组时依次读取各分片
+            if 'group_id' in filters:
+                conns = get_user_dbs()
+            else:
+                conns = [get_user_db(filters['user_id'])]
+            try:
+                if dataset == 'question_answers':
+                    for conn in conns:
+                        attach_archive(conn, current_app.config['ARCHIVE_DATABASE_PATH'])
+                yield from export_chunks(conns, dataset, fmt, filters, batch_size)
+            finally:
+                for conn in conns:
+                    conn.close()
+
+        stamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
+        return Response(generate(), mimetype=FORMATS[fmt], headers={
+            'Content-Disposition': f'attachment; filename="{dataset}-{stamp}.{fmt}"',
+            'Cache-Control': 'no-store',
+            'X-Accel-Buffering': 'no',
+        })
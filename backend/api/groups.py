@@ -0,0 +1,582 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+班级/分组相关API
+组长只能邀请已有用户（被邀请人接受后才成为成员），CSV 导入新建的账号直接加入分组；
+组长导出分组数据时只包含授权共享的成员（接受邀请时或之后通过 PUT /api/groups/<id>/consent 授权）；
+分组排行榜以成员表为驱动表，逐个成员查找分时段汇总表中的最佳成绩，代价只与分组人数相关
+"""
+
+from flask import request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from db import get_db, get_user_dbs, close_user_dbs
+from passwords import hash_password
+from services import leaderboard_rollups
+from services.leaderboard_rollups import period_start
+from services.leaderboard_cache import TOP_N
+from api.leaderboard import merge_leaderboards, speed_entry, study_entry
+import sqlite3
+import csv
+import io
+
+MAX_IMPORT_ROWS = 2000  # 单次 CSV 导入的最大行数
+LOOKUP_BATCH_SIZE = 500  # 按用户名批量查询时每批的参数个数
+
+# CROSS JOIN 固定以 group_members 为外层循环：按主键前缀取出本组成员，
+# 再按汇总表主键 (period, period_start, mode, user_id) 逐个查找，不会扫描整个时段的榜单
+GROUP_BOARD_SQL = {
+    'speed': """
+        SELECT
+            u.username,
+            r.user_id,
+            r.correct_answers,
+            r.total_questions,
+            r.time_spent,
+            ROUND(r.correct_answers * 100.0 / r.total_questions, 2) as accuracy,
+            r.created_at
+        FROM group_members gm
+        CROSS JOIN leaderboard_rollups r
+        JOIN users u ON u.id = r.user_id
+        WHERE gm.group_id = ? AND r.period = ? AND r.period_start = ?
+          AND r.mode = 'speed' AND r.user_id = gm.user_id
+        ORDER BY r.correct_answers DESC, r.time_spent ASC, r.created_at DESC
+        LIMIT ?
+    """,
+    'study': """
+        SELECT
+            u.username,
+            r.user_id,
+            r.total_questions,
+            r.time_spent,
+            r.created_at
+        FROM group_members gm
+        CROSS JOIN leaderboard_rollups r
+        JOIN users u ON u.id = r.user_id
+        WHERE gm.group_id = ? AND r.period = ? AND r.period_start = ?
+          AND r.mode = 'study' AND r.user_id = gm.user_id
+        ORDER BY r.total_questions DESC, r.time_spent DESC, r.created_at DESC
+        LIMIT ?
+    """,
+}
+
+# 列顺序与全站排行榜的查询相同，沿用其行转换函数
+GROUP_BOARD_ENTRY = {
+    'speed': speed_entry,
+    'study': study_entry,
+}
+
+def load_group_leaderboard(conn, group_id, mode, period='all', limit=TOP_N):
+    """查询分组排行榜（每个成员仅一条最佳成绩）"""
+    cursor = conn.execute(GROUP_BOARD_SQL[mode], (group_id, period, period_start(period), limit))
+    entry = GROUP_BOARD_ENTRY[mode]
+    return [entry(row, rank) for rank, row in enumerate(cursor.fetchall(), 1)]
+
+def get_group(conn, group_id):
+    """查询分组基本信息，不存在时返回 None"""
+    cursor = conn.execute(
+        "SELECT id, name, description, owner_id, created_at FROM groups WHERE id = ?",
+        (group_id,)
+    )
+    return cursor.fetchone()
+
+def get_member_role(conn, group_id, user_id):
+    """查询用户在分组中的角色，不是成员时返回 None"""
+    cursor = conn.execute(
+        "SELECT role FROM group_members WHERE group_id = ? AND user_id = ?",
+        (group_id, user_id)
+    )
+    row = cursor.fetchone()
+    return row['role'] if row else None
+
+def find_user_ids(conn, usernames):
+    """按用户名批量查询用户ID，返回 {username: id}"""
+    found = {}
+    usernames = list(usernames)
+    for i in range(0, len(usernames), LOOKUP_BATCH_SIZE):
+        batch = usernames[i:i + LOOKUP_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        cursor = conn.execute(
+            f"SELECT id, username FROM users WHERE username IN ({placeholders})",
+            batch
+        )
+        for row in cursor.fetchall():
+            found[row['username']] = row['id']
+    return found
+
+def add_members(conn, group_id, user_ids):
+    """批量加入成员（已是成员的忽略），返回新加入的人数"""
+    before = conn.total_changes
+    conn.executemany(
+        "INSERT OR IGNORE INTO group_members (group_id, user_id, role) VALUES (?, ?, 'member')",
+        [(group_id, user_id) for user_id in user_ids]
+    )
+    return conn.total_changes - before
+
+def set_export_consent(conn, group_id, user_id, granted):
+    """授权或撤回组长导出本人答题数据"""
+    if granted:
+        conn.execute(
+            "INSERT OR IGNORE INTO group_export_consents (group_id, user_id) VALUES (?, ?)",
+            (group_id, user_id)
+        )
+    else:
+        conn.execute(
+            "DELETE FROM group_export_consents WHERE group_id = ? AND user_id = ?",
+            (group_id, user_id)
+        )
+
+def invite_members(conn, group_id, user_ids, invited_by):
+    """批量邀请已有用户（已是成员的跳过，已邀请的不重复邀请）
+
+    返回 (新发出的邀请数, 已是成员的人数)
+    """
+    user_ids = list(user_ids)
+    members = set()
+    for i in range(0, len(user_ids), LOOKUP_BATCH_SIZE):
+        batch = user_ids[i:i + LOOKUP_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        cursor = conn.execute(
+            f"SELECT user_id FROM group_members WHERE group_id = ? AND user_id IN ({placeholders})",
+            [group_id] + batch
+        )
+        members.update(row['user_id'] for row in cursor.fetchall())
+
+    before = conn.total_changes
+    conn.executemany(
+        "INSERT OR IGNORE INTO group_invitations (group_id, user_id, invited_by) VALUES (?, ?, ?)",
+        [(group_id, user_id, invited_by) for user_id in user_ids if user_id not in members]
+    )
+    return conn.total_changes - before, len(members)
+
+def parse_enrollment_csv(text):
+    """解析批量导入的 CSV（表头须包含 username，可选 password、email）
+
+    返回 (rows, errors)，rows 为 [(行号, username, password, email)]
+    """
+    reader = csv.DictReader(io.StringIO(text))
+    fields = [name.strip().lower() for name in (reader.fieldnames or [])]
+    if 'username' not in fields:
+        raise ValueError('CSV 缺少 username 列')
+    reader.fieldnames = fields
+
+    rows, errors, seen = [], [], set()
+    for line_no, record in enumerate(reader, 2):
+        if len(rows) + len(errors) >= MAX_IMPORT_ROWS:
+            raise ValueError(f'单次最多导入 {MAX_IMPORT_ROWS} 行')
+        username = (record.get('username') or '').strip()
+        password = record.get('password') or ''
+        email = (record.get('email') or '').strip()
+        if not username:
+            continue
+        if username in seen:
+            errors.append({'line': line_no, 'username': username, 'error': '用户名重复'})
+            continue
+        seen.add(username)
+        rows.append((line_no, username, password, email))
+    return rows, errors
+
+def register_group_routes(app):
+    """注册分组相关路由"""
+
+    @app.route('/api/groups', methods=['POST'])
+    @jwt_required()
+    def create_group():
+        """创建分组（创建者为组长）"""
+        try:
+            user_id = get_jwt_identity()
+            data = request.get_json() or {}
+            name = (data.get('name') or '').strip()
+            description = (data.get('description') or '').strip()
+
+            if not name:
+                return jsonify({'error': '分组名称不能为空'}), 400
+
+            with get_db() as conn:
+                cursor = conn.execute(
+                    "INSERT INTO groups (name, description, owner_id) VALUES (?, ?, ?)",
+                    (name, description, user_id)
+                )
+                group_id = cursor.lastrowid
+                conn.execute(
+                    "INSERT INTO group_members (group_id, user_id, role) VALUES (?, ?, 'owner')",
+                    (group_id, user_id)
+                )
+                conn.commit()
+
+                return jsonify({
+                    'id': group_id,
+                    'name': name,
+                    'description': description,
+                    'owner_id': user_id
+                }), 201
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups', methods=['GET'])
+    @jwt_required()
+    def list_my_groups():
+        """获取当前用户所属的分组"""
+        try:
+            user_id = get_jwt_identity()
+
+            with get_db() as conn:
+                # 按用户索引取出所属分组（已按 group_id 排序），再按主键前缀连接各组成员计数，无需排序
+                cursor = conn.execute("""
+                    SELECT g.id, g.name, g.description, g.owner_id, g.created_at, gm.role,
+                           COUNT(*) as member_count
+                    FROM group_members gm
+                    JOIN groups g ON g.id = gm.group_id
+                    JOIN group_members m ON m.group_id = gm.group_id
+                    WHERE gm.user_id = ?
+                    GROUP BY gm.group_id
+                    ORDER BY gm.group_id
+                """, (user_id,))
+
+                groups = [dict(row) for row in cursor.fetchall()]
+                return jsonify({'groups': groups, 'total': len(groups)}), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/invitations', methods=['GET'])
+    @jwt_required()
+    def list_my_invitations():
+        """获取当前用户收到的待接受邀请"""
+        try:
+            user_id = get_jwt_identity()
+
+            with get_db() as conn:
+                cursor = conn.execute("""
+                    SELECT g.id as group_id, g.name, g.description, u.username as invited_by, i.created_at
+                    FROM group_invitations i
+                    JOIN groups g ON g.id = i.group_id
+                    JOIN users u ON u.id = i.invited_by
+                    WHERE i.user_id = ?
+                    ORDER BY i.group_id
+                """, (user_id,))
+
+                invitations = [dict(row) for row in cursor.fetchall()]
+                return jsonify({'invitations': invitations, 'total': len(invitations)}), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/invitations/<int:group_id>/accept', methods=['POST'])
+    @jwt_required()
+    def accept_invitation(group_id):
+        """接受分组邀请（加入分组），请求体可带 {"share_answers": true} 同时授权组长导出本人答题数据"""
+        try:
+            user_id = get_jwt_identity()
+            data = request.get_json(silent=True) or {}
+
+            with get_db() as conn:
+                cursor = conn.execute(
+                    "DELETE FROM group_invitations WHERE group_id = ? AND user_id = ?",
+                    (group_id, user_id)
+                )
+                if cursor.rowcount == 0:
+                    return jsonify({'error': '邀请不存在'}), 404
+                add_members(conn, group_id, [user_id])
+                set_export_consent(conn, group_id, user_id, bool(data.get('share_answers')))
+                conn.commit()
+
+                return jsonify({'message': '已加入分组', 'group_id': group_id}), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/invitations/<int:group_id>', methods=['DELETE'])
+    @jwt_required()
+    def decline_invitation(group_id):
+        """拒绝分组邀请"""
+        try:
+            user_id = get_jwt_identity()
+
+            with get_db() as conn:
+                cursor = conn.execute(
+                    "DELETE FROM group_invitations WHERE group_id = ? AND user_id = ?",
+                    (group_id, user_id)
+                )
+                conn.commit()
+
+                if cursor.rowcount == 0:
+                    return jsonify({'error': '邀请不存在'}), 404
+                return jsonify({'message': '已拒绝邀请'}), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/<int:group_id>', methods=['GET'])
+    @jwt_required()
+    def get_group_detail(group_id):
+        """获取分组详情与成员列表（仅成员可见；组长还可看到待接受的邀请）"""
+        try:
+            user_id = get_jwt_identity()
+
+            with get_db() as conn:
+                group = get_group(conn, group_id)
+                if not group:
+                    return jsonify({'error': '分组不存在'}), 404
+                role = get_member_role(conn, group_id, user_id)
+                if role is None:
+                    return jsonify({'error': '无权查看该分组'}), 403
+
+                cursor = conn.execute("""
+                    SELECT gm.user_id, u.username, gm.role, gm.joined_at
+                    FROM group_members gm
+                    JOIN users u ON u.id = gm.user_id
+                    WHERE gm.group_id = ?
+                    ORDER BY gm.role DESC, u.username
+                """, (group_id,))
+                members = [dict(row) for row in cursor.fetchall()]
+                cursor = conn.execute(
+                    "SELECT user_id FROM group_export_consents WHERE group_id = ?",
+                    (group_id,)
+                )
+                consents = {row['user_id'] for row in cursor.fetchall()}
+                for member in members:
+                    member['shares_answers'] = member['user_id'] in consents
+
+                result = dict(group)
+                result['members'] = members
+                result['member_count'] = len(members)
+                if role == 'owner':
+                    cursor = conn.execute("""
+                        SELECT i.user_id, u.username, i.created_at
+                        FROM group_invitations i
+                        JOIN users u ON u.id = i.user_id
+                        WHERE i.group_id = ?
+                        ORDER BY i.user_id
+                    """, (group_id,))
+                    result['invitations'] = [dict(row) for row in cursor.fetchall()]
+                return jsonify(result), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/<int:group_id>', methods=['DELETE'])
+    @jwt_required()
+    def delete_group(group_id):
+        """解散分组（仅组长）"""
+        try:
+            user_id = get_jwt_identity()
+
+            with get_db() as conn:
+                if not get_group(conn, group_id):
+                    return jsonify({'error': '分组不存在'}), 404
+                if get_member_role(conn, group_id, user_id) != 'owner':
+                    return jsonify({'error': '只有组长可以解散分组'}), 403
+
+                conn.execute("DELETE FROM group_invitations WHERE group_id = ?", (group_id,))
+                conn.execute("DELETE FROM group_export_consents WHERE group_id = ?", (group_id,))
+                conn.execute("DELETE FROM group_members WHERE group_id = ?", (group_id,))
+                conn.execute("DELETE FROM groups WHERE id = ?", (group_id,))
+                conn.commit()
+
+                return jsonify({'message': '分组已解散'}), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/<int:group_id>/members', methods=['POST'])
+    @jwt_required()
+    def add_group_members(group_id):
+        """按用户名邀请成员（仅组长），请求体为 {"usernames": [...]} 或 {"username": "..."}
+
+        被邀请人通过 POST /api/groups/invitations/<group_id>/accept 接受后才加入分组
+        """
+        try:
+            user_id = get_jwt_identity()
+            data = request.get_json() or {}
+            usernames = data.get('usernames') or ([data['username']] if data.get('username') else [])
+            usernames = list(dict.fromkeys(name.strip() for name in usernames if name and name.strip()))
+
+            if not usernames:
+                return jsonify({'error': '缺少用户名'}), 400
+            if len(usernames) > MAX_IMPORT_ROWS:
+                return jsonify({'error': f'单次最多添加 {MAX_IMPORT_ROWS} 人'}), 400
+
+            with get_db() as conn:
+                if not get_group(conn, group_id):
+                    return jsonify({'error': '分组不存在'}), 404
+                if get_member_role(conn, group_id, user_id) != 'owner':
+                    return jsonify({'error': '只有组长可以添加成员'}), 403
+
+                found = find_user_ids(conn, usernames)
+                invited, already_members = invite_members(conn, group_id, found.values(), user_id)
+                conn.commit()
+
+                return jsonify({
+                    'invited': invited,
+                    'already_members': already_members,
+                    'already_invited': len(found) - already_members - invited,
+                    'not_found': [name for name in usernames if name not in found]
+                }), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/<int:group_id>/members/import', methods=['POST'])
+    @jwt_required()
+    def import_group_members(group_id):
+        """CSV 批量导入成员（仅组长）
+
+        上传文件字段 file，或直接以 text/csv 作为请求体；不存在且提供了 password 的行注册新账号并直接加入，
+        已存在的用户只发出邀请（接受后才加入），整批在一个事务中完成
+        """
+        try:
+            user_id = get_jwt_identity()
+            upload = request.files.get('file')
+            raw = upload.read() if upload else request.get_data()
+            if not raw:
+                return jsonify({'error': '缺少 CSV 内容'}), 400
+
+            try:
+                rows, errors = parse_enrollment_csv(raw.decode('utf-8-sig'))
+            except UnicodeDecodeError:
+                return jsonify({'error': 'CSV 须为 UTF-8 编码'}), 400
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            with get_db() as conn:
+                if not get_group(conn, group_id):
+                    return jsonify({'error': '分组不存在'}), 404
+                if get_member_role(conn, group_id, user_id) != 'owner':
+                    return jsonify({'error': '只有组长可以导入成员'}), 403
+
+                found = find_user_ids(conn, (row[1] for row in rows))
+                created = {}
+                for line_no, username, password, email in rows:
+                    if username in found:
+                        continue
+                    # 新用户沿用注册接口的校验规则
+                    if len(username) < 3:
+                        errors.append({'line': line_no, 'username': username, 'error': '用户名至少需要3个字符'})
+                        continue
+                    if len(password) < 6:
+                        errors.append({'line': line_no, 'username': username,
+                                       'error': '用户不存在，且未提供至少6个字符的密码'})
+                        continue
+                    try:
+                        cursor = conn.execute(
+                            "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+                            (username, email or None, hash_password(password))
+                        )
+                    except sqlite3.IntegrityError:
+                        errors.append({'line': line_no, 'username': username, 'error': '邮箱已被注册'})
+                        continue
+                    created[username] = cursor.lastrowid
+
+                added = add_members(conn, group_id, created.values())
+                invited, already_members = invite_members(conn, group_id, found.values(), user_id)
+                conn.commit()
+
+                errors.sort(key=lambda e: e['line'])
+                return jsonify({
+                    'added': added,
+                    'invited': invited,
+                    'already_members': already_members,
+                    'already_invited': len(found) - already_members - invited,
+                    'created_users': list(created),
+                    'errors': errors
+                }), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/<int:group_id>/members/<int:member_id>', methods=['DELETE'])
+    @jwt_required()
+    def remove_group_member(group_id, member_id):
+        """移除成员（组长可移除他人，成员可自行退出；组长不能退出自己的分组）"""
+        try:
+            user_id = get_jwt_identity()
+
+            with get_db() as conn:
+                if not get_group(conn, group_id):
+                    return jsonify({'error': '分组不存在'}), 404
+                role = get_member_role(conn, group_id, user_id)
+                if member_id != user_id and role != 'owner':
+                    return jsonify({'error': '只有组长可以移除成员'}), 403
+                if get_member_role(conn, group_id, member_id) == 'owner':
+                    return jsonify({'error': '不能移除组长'}), 400
+
+                cursor = conn.execute(
+                    "DELETE FROM group_members WHERE group_id = ? AND user_id = ?",
+                    (group_id, member_id)
+                )
+                set_export_consent(conn, group_id, member_id, False)
+                conn.commit()
+
+                if cursor.rowcount == 0:
+                    return jsonify({'error': '该用户不是分组成员'}), 404
+                return jsonify({'message': '已移除'}), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/<int:group_id>/consent', methods=['PUT', 'DELETE'])
+    @jwt_required()
+    def update_export_consent(group_id):
+        """授权（PUT）或撤回（DELETE）组长导出本人在该分组中的答题数据（仅成员）"""
+        try:
+            user_id = get_jwt_identity()
+
+            with get_db() as conn:
+                if not get_group(conn, group_id):
+                    return jsonify({'error': '分组不存在'}), 404
+                if get_member_role(conn, group_id, user_id) is None:
+                    return jsonify({'error': '只有分组成员可以设置授权'}), 403
+
+                granted = request.method == 'PUT'
+                set_export_consent(conn, group_id, user_id, granted)
+                conn.commit()
+
+                return jsonify({'group_id': group_id, 'shares_answers': granted}), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/groups/<int:group_id>/leaderboard', methods=['GET'])
+    @jwt_required()
+    def get_group_leaderboard(group_id):
+        """获取分组排行榜（仅成员可见），参数 mode=speed|study，period=daily|weekly|all"""
+        try:
+            user_id = get_jwt_identity()
+            mode = request.args.get('mode', 'speed')
+            period = request.args.get('period', 'all')
+            limit = min(int(request.args.get('limit', 50)), TOP_N)  # 最多100条
+
+            if mode not in GROUP_BOARD_SQL:
+                return jsonify({'error': '无效的排行榜模式'}), 400
+            if period not in leaderboard_rollups.PERIODS:
+                return jsonify({'error': '无效的统计周期'}), 400
+
+            with get_db() as conn:
+                if not get_group(conn, group_id):
+                    return jsonify({'error': '分组不存在'}), 404
+                if get_member_role(conn, group_id, user_id) is None:
+                    return jsonify({'error': '无权查看该分组'}), 403
+
+                # 分片模式下各分片只有其中成员的成绩（成员表经附加的主库读取），各取前 limit 名再合并
+                boards = []
+                user_conns = get_user_dbs(conn)
+                try:
+                    for user_conn in user_conns:
+                        with user_conn:
+                            leaderboard_rollups.ensure_populated(user_conn)
+                            boards.append(load_group_leaderboard(user_conn, group_id, mode, period, limit))
+                finally:
+                    close_user_dbs(user_conns, conn)
+                leaderboard = merge_leaderboards(mode, boards, limit)
+
+                return jsonify({
+                    'group_id': group_id,
+                    'leaderboard': leaderboard,
+                    'mode': mode,
+                    'period': period,
+                    'total': len(leaderboard)
+                }), 200
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
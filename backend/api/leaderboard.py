@@ -4,72 +4,357 @@
 排行榜相关API
 """
 
-from flask import request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import request, jsonify, current_app, Response, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from db import get_user_db, get_user_dbs, close_user_dbs
+from services.leaderboard_cache import leaderboard_cache, conditional_json, rank_key, TOP_N
+from services.pubsub import hub, sse_frame
+from services import leaderboard_rollups
+from services.leaderboard_rollups import period_start
+from services.shards import router as shard_router
+from services.serialization import row_mapper
 import sqlite3
+import time
+import os
 
-def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect('../database/quiz_app.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+# 排行榜行 → 条目（按查询的列顺序取值，名次由调用方传入）
+SPEED_FIELDS = ('username', 'user_id', 'correct_answers', 'total_questions', 'time_spent', 'accuracy', 'created_at')
+STUDY_FIELDS = ('username', 'user_id', 'total_questions', 'time_spent', 'created_at')
+speed_entry = row_mapper(SPEED_FIELDS, keys=range(len(SPEED_FIELDS)), extra=('rank',))
+study_entry = row_mapper(STUDY_FIELDS, keys=range(len(STUDY_FIELDS)), extra=('rank',))
+
+def load_speed_leaderboard(conn, period='all', limit=TOP_N):
+    """查询速答模式排行榜（读取分时段汇总表，每个用户仅一条最佳成绩）"""
+    # 按部分索引顺序读取：正确数最多，其次用时最少，最后时间最近
+    cursor = conn.execute("""
+        SELECT 
+            u.username,
+            r.user_id,
+            r.correct_answers,
+            r.total_questions,
+            r.time_spent,
+            ROUND(r.correct_answers * 100.0 / r.total_questions, 2) as accuracy,
+            r.created_at
+        FROM leaderboard_rollups r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.period = ? AND r.period_start = ? AND r.mode = 'speed'
+        ORDER BY r.correct_answers DESC, r.time_spent ASC, r.created_at DESC
+        LIMIT ?
+    """, (period, period_start(period), limit))
+    
+    return [speed_entry(row, rank) for rank, row in enumerate(cursor.fetchall(), 1)]
+
+def load_study_leaderboard(conn, period='all', limit=TOP_N):
+    """查询学习模式排行榜（读取分时段汇总表，每个用户仅一条最佳成绩）"""
+    cursor = conn.execute("""
+        SELECT 
+            u.username,
+            r.user_id,
+            r.total_questions,
+            r.time_spent,
+            r.created_at
+        FROM leaderboard_rollups r
+        JOIN users u ON r.user_id = u.id
+        WHERE r.period = ? AND r.period_start = ? AND r.mode = 'study'
+        ORDER BY r.total_questions DESC, r.time_spent DESC, r.created_at DESC
+        LIMIT ?
+    """, (period, period_start(period), limit))
+    
+    return [study_entry(row, rank) for rank, row in enumerate(cursor.fetchall(), 1)]
+
+BOARD_LOADERS = {
+    'speed': load_speed_leaderboard,
+    'study': load_study_leaderboard,
+}
+
+def merge_leaderboards(mode, boards, limit=TOP_N):
+    """合并各分片的榜单（每个分片已按名次排序且用户互不重复），按排行榜顺序取前 limit 名并重新编号"""
+    if len(boards) == 1:
+        return boards[0][:limit]
+    rows = sorted(
+        (row for board in boards for row in board),
+        key=lambda row: (rank_key(mode, row.get('correct_answers'), row['total_questions'], row['time_spent']),
+                         row['created_at'] or ''),
+        reverse=True,
+    )[:limit]
+    return [dict(row, rank=rank) for rank, row in enumerate(rows, 1)]
+
+# 比给定成绩更好的已完成答题数（与排行榜视图的排序一致），分片模式下用于计算跨分片名次
+BETTER_RESULTS_SQL = {
+    'speed': """
+        SELECT COUNT(*) FROM quiz_records
+        WHERE mode = 'speed' AND completed = TRUE
+          AND (correct_answers > ? OR (correct_answers = ? AND time_spent < ?))
+    """,
+    'study': """
+        SELECT COUNT(*) FROM quiz_records
+        WHERE mode = 'study' AND completed = TRUE
+          AND (total_questions > ? OR (total_questions = ? AND time_spent > ?))
+    """,
+}
+
+def load_leaderboard_stats(conn):
+    """查询排行榜统计信息（一个数据库文件）"""
+    # 速答模式统计
+    cursor = conn.execute("""
+        SELECT 
+            COUNT(*) as total_records,
+            AVG(correct_answers) as avg_correct,
+            AVG(accuracy) as avg_accuracy,
+            AVG(time_spent) as avg_time,
+            MAX(correct_answers) as max_correct,
+            MIN(time_spent) as min_time
+        FROM speed_leaderboard
+    """)
+    
+    speed_stats = cursor.fetchone()
+    
+    # 学习模式统计
+    cursor = conn.execute("""
+        SELECT 
+            COUNT(*) as total_records,
+            AVG(total_questions) as avg_questions,
+            AVG(time_spent) as avg_time,
+            MAX(total_questions) as max_questions,
+            MAX(time_spent) as max_time
+        FROM study_leaderboard
+    """)
+    
+    study_stats = cursor.fetchone()
+    
+    # 用户活跃度统计
+    cursor = conn.execute("""
+        SELECT 
+            COUNT(*) as total_users,
+            COUNT(CASE WHEN last_activity >= date('now', '-7 days') THEN 1 END) as weekly_active,
+            COUNT(CASE WHEN last_activity >= date('now', '-30 days') THEN 1 END) as monthly_active
+        FROM user_stats
+        WHERE total_sessions > 0
+    """)
+    
+    user_stats = cursor.fetchone()
+    
+    return {
+        'speed_mode': {
+            'total_records': speed_stats['total_records'],
+            'avg_correct_answers': round(speed_stats['avg_correct'] or 0, 1),
+            'avg_accuracy': round(speed_stats['avg_accuracy'] or 0, 1),
+            'avg_time_spent': round(speed_stats['avg_time'] or 0, 1),
+            'max_correct_answers': speed_stats['max_correct'] or 0,
+            'min_time_spent': speed_stats['min_time'] or 0
+        },
+        'study_mode': {
+            'total_records': study_stats['total_records'],
+            'avg_questions': round(study_stats['avg_questions'] or 0, 1),
+            'avg_time_spent': round(study_stats['avg_time'] or 0, 1),
+            'max_questions': study_stats['max_questions'] or 0,
+            'max_time_spent': study_stats['max_time'] or 0
+        },
+        'users': {
+            'total_active_users': user_stats['total_users'],
+            'weekly_active_users': user_stats['weekly_active'],
+            'monthly_active_users': user_stats['monthly_active']
+        }
+    }
+
+def count_better_results(mode, primary, time_spent):
+    """各分片中优于该成绩的已完成答题总数"""
+    conns = get_user_dbs()
+    try:
+        return sum(conn.execute(BETTER_RESULTS_SQL[mode], (primary, primary, time_spent)).fetchone()[0]
+                   for conn in conns)
+    finally:
+        close_user_dbs(conns)
+
+def merge_leaderboard_stats(parts):
+    """合并各分片的统计：计数相加，平均值按记录数加权，最值取最值"""
+    if len(parts) == 1:
+        return parts[0]
+
+    def weighted(section, field):
+        total = sum(part[section]['total_records'] for part in parts)
+        if not total:
+            return 0
+        return round(sum(part[section][field] * part[section]['total_records'] for part in parts) / total, 1)
+
+    speed_times = [part['speed_mode']['min_time_spent'] for part in parts if part['speed_mode']['total_records']]
+    return {
+        'speed_mode': {
+            'total_records': sum(part['speed_mode']['total_records'] for part in parts),
+            'avg_correct_answers': weighted('speed_mode', 'avg_correct_answers'),
+            'avg_accuracy': weighted('speed_mode', 'avg_accuracy'),
+            'avg_time_spent': weighted('speed_mode', 'avg_time_spent'),
+            'max_correct_answers': max(part['speed_mode']['max_correct_answers'] for part in parts),
+            'min_time_spent': min(speed_times) if speed_times else 0
+        },
+        'study_mode': {
+            'total_records': sum(part['study_mode']['total_records'] for part in parts),
+            'avg_questions': weighted('study_mode', 'avg_questions'),
+            'avg_time_spent': weighted('study_mode', 'avg_time_spent'),
+            'max_questions': max(part['study_mode']['max_questions'] for part in parts),
+            'max_time_spent': max(part['study_mode']['max_time_spent'] for part in parts)
+        },
+        'users': {
+            name: sum(part['users'][name] for part in parts)
+            for name in ('total_active_users', 'weekly_active_users', 'monthly_active_users')
+        }
+    }
+
+def board_key(mode, period='all'):
+    """榜单的缓存键（总榜沿用模式名）"""
+    return mode if period == 'all' else f'{mode}:{period}'
+
+def parse_board_key(key):
+    mode, _, period = key.partition(':')
+    return mode, period or 'all'
+
+def cached_board(mode, period='all'):
+    """取缓存的前 TOP_N 名榜单，未命中时查询汇总表"""
+    def loader():
+        # 分片模式下每个分片各取前 TOP_N 名再合并
+        boards = []
+        conns = get_user_dbs()
+        try:
+            for conn in conns:
+                with conn:
+                    leaderboard_rollups.ensure_populated(conn)
+                    boards.append(BOARD_LOADERS[mode](conn, period, TOP_N))
+        finally:
+            close_user_dbs(conns)
+        return merge_leaderboards(mode, boards, TOP_N)
+    # 分时段榜单在时段结束时自动过期
+    ttl = leaderboard_rollups.seconds_until_rollover(period)
+    if ttl is not None and leaderboard_cache.ttl:
+        ttl = min(ttl, leaderboard_cache.ttl)
+    return leaderboard_cache.get(board_key(mode, period), loader, ttl=ttl)
+
+def board_response(mode, period, limit):
+    """从缓存榜单截取前 limit 名，返回带 ETag 的响应"""
+    entry = cached_board(mode, period)
+    return conditional_json(entry, f'{mode}-{period}-{limit}', lambda: {
+        'leaderboard': entry['data'][:limit],
+        'mode': mode,
+        'period': period,
+        'total': len(entry['data'][:limit])
+    })
+
+def record_board_result(mode, user_id, correct_answers, total_questions, time_spent):
+    """答题结束后按各时段更新榜单缓存（仅新成绩进入前 TOP_N 的榜单失效）"""
+    for period in leaderboard_rollups.PERIODS:
+        leaderboard_cache.record_result(mode, user_id, correct_answers, total_questions, time_spent,
+                                        key=board_key(mode, period))
+
+def board_changes(old_rows, new_rows):
+    """计算两版榜单之间的差异：进入/名次或成绩变化的行整行下发，离榜的只下发 user_id"""
+    old_by_user = {row['user_id']: row for row in old_rows}
+    changes = []
+    for row in new_rows:
+        if old_by_user.pop(row['user_id'], None) != row:
+            changes.append({'op': 'upsert', 'row': row})
+    for user_id in old_by_user:
+        changes.append({'op': 'remove', 'user_id': user_id})
+    return changes
+
+def stream_topic(key):
+    return f'leaderboard:{key}'
+
+def snapshot_frame(key):
+    """当前榜单的完整快照帧（同一版本只序列化一次，所有订阅者共享）"""
+    mode, period = parse_board_key(key)
+    entry = cached_board(mode, period)
+    frame = entry['bodies'].get('sse-snapshot')
+    if frame is None:
+        data = current_app.json.dumps({'mode': mode, 'period': period, 'version': entry['version'],
+                                       'leaderboard': entry['data']})
+        frame = entry['bodies']['sse-snapshot'] = sse_frame('snapshot', data, entry['version'])
+    return frame
+
+def publish_board_change(key, old_rows):
+    """榜单因新成绩变化时向订阅者推送增量；没有订阅者时不做任何查询"""
+    topic = stream_topic(key)
+    if not hub.subscriber_count(topic):
+        return
+    if old_rows is None:
+        hub.publish(topic, snapshot_frame(key))
+        return
+    mode, period = parse_board_key(key)
+    entry = cached_board(mode, period)
+    changes = board_changes(old_rows, entry['data'])
+    if changes:
+        data = current_app.json.dumps({'mode': mode, 'period': period, 'version': entry['version'],
+                                       'changes': changes})
+        hub.publish(topic, sse_frame('delta', data, entry['version']))
+
+def request_period():
+    """解析 period 参数，无效时返回 None"""
+    period = request.args.get('period', 'all')
+    return period if period in leaderboard_rollups.PERIODS else None
 
 def register_leaderboard_routes(app):
     """注册排行榜相关路由"""
     
+    app.config.setdefault('SSE_HEARTBEAT_SECONDS', 15)
+    # 本进程 SSE 连接总数上限（排行榜与对战房间共用）
+    app.config.setdefault('SSE_MAX_SUBSCRIBERS', int(os.environ.get('QUIZ_SSE_MAX_SUBSCRIBERS', hub.max_subscribers)))
+    hub.max_subscribers = app.config['SSE_MAX_SUBSCRIBERS']
+    leaderboard_cache.add_listener(publish_board_change)
+    
+    @app.route('/api/leaderboard/stream', methods=['GET'])
+    @jwt_required(locations=['headers', 'query_string'])  # EventSource 无法设置请求头，可用 ?jwt=<token>
+    def stream_leaderboard():
+        """排行榜实时推送（SSE）：先发完整快照，之后只推送名次变化"""
+        mode = request.args.get('mode', 'speed')
+        if mode not in BOARD_LOADERS:
+            return jsonify({'error': '无效的排行榜模式'}), 400
+        period = request_period()
+        if period is None:
+            return jsonify({'error': '无效的统计周期'}), 400
+        key = board_key(mode, period)
+        
+        # 同一用户重连时取代旧连接，旧连接随即结束并释放其工作线程
+        subscriber = hub.subscribe(stream_topic(key), owner=get_jwt_identity())
+        if subscriber is None:
+            return jsonify({'error': '订阅连接数已满，请稍后重试'}), 503
+        
+        heartbeat = current_app.config['SSE_HEARTBEAT_SECONDS']
+        token_expires = get_jwt()['exp']
+        
+        @stream_with_context
+        def generate():
+            try:
+                yield b'retry: 3000\n\n'
+                yield snapshot_frame(key)
+                # 令牌过期后结束推送，客户端会带新令牌重连
+                while time.time() < token_expires:
+                    message = subscriber.get(heartbeat)
+                    if subscriber.superseded:
+                        break
+                    if subscriber.lagging:
+                        # 消费过慢导致队列溢出：丢弃积压，改发一次完整快照
+                        subscriber.drain()
+                        yield snapshot_frame(key)
+                    elif message is None:
+                        yield b': ping\n\n'
+                    else:
+                        yield message
+            finally:
+                hub.unsubscribe(subscriber)
+        
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # 关闭反向代理缓冲
+        })
+    
     @app.route('/api/leaderboard/speed', methods=['GET'])
     @jwt_required()
     def get_speed_leaderboard():
         """获取速答模式排行榜"""
         try:
-            limit = min(int(request.args.get('limit', 50)), 100)  # 最多100条
-            
-            with get_db() as conn:
-                # 取每个用户的最佳成绩：正确数最多，其次用时最少，最后时间最近
-                cursor = conn.execute("""
-                    SELECT 
-                        ROW_NUMBER() OVER (ORDER BY t.correct_answers DESC, t.time_spent ASC, t.created_at DESC) as rank,
-                        t.username, t.user_id, t.correct_answers, t.total_questions, t.time_spent, t.accuracy, t.created_at
-                    FROM (
-                        SELECT 
-                            u.username,
-                            u.id as user_id,
-                            qr.correct_answers,
-                            qr.total_questions,
-                            qr.time_spent,
-                            ROUND(qr.correct_answers * 100.0 / qr.total_questions, 2) as accuracy,
-                            qr.created_at,
-                            ROW_NUMBER() OVER (
-                                PARTITION BY u.id
-                                ORDER BY qr.correct_answers DESC, qr.time_spent ASC, qr.created_at DESC
-                            ) as rn
-                        FROM quiz_records qr
-                        JOIN users u ON qr.user_id = u.id
-                        WHERE qr.mode = 'speed' AND qr.completed = TRUE
-                    ) t
-                    WHERE t.rn = 1
-                    ORDER BY t.correct_answers DESC, t.time_spent ASC, t.created_at DESC
-                    LIMIT ?
-                """, (limit,))
-                
-                leaderboard = []
-                for row in cursor.fetchall():
-                    leaderboard.append({
-                        'rank': row['rank'],
-                        'username': row['username'],
-                        'user_id': row['user_id'],
-                        'correct_answers': row['correct_answers'],
-                        'total_questions': row['total_questions'],
-                        'accuracy': row['accuracy'],
-                        'time_spent': row['time_spent'],
-                        'created_at': row['created_at']
-                    })
-                
-                return jsonify({
-                    'leaderboard': leaderboard,
-                    'mode': 'speed',
-                    'total': len(leaderboard)
-                }), 200
+            limit = min(int(request.args.get('limit', 50)), TOP_N)  # 最多100条
+            period = request_period()  # daily / weekly / all（默认总榜）
+            if period is None:
+                return jsonify({'error': '无效的统计周期'}), 400
+            return board_response('speed', period, limit)
                 
         except Exception as e:
             return jsonify({'error': f'服务器错误: {str(e)}'}), 500
@@ -79,49 +364,11 @@ def register_leaderboard_routes(app):
     def get_study_leaderboard():
         """获取学习模式排行榜"""
         try:
-            limit = min(int(request.args.get('limit', 50)), 100)  # 最多100条
-            
-            with get_db() as conn:
-                cursor = conn.execute("""
-                    SELECT 
-                        ROW_NUMBER() OVER (ORDER BY t.total_questions DESC, t.time_spent DESC, t.created_at DESC) as rank,
-                        t.username, t.user_id, t.total_questions, t.time_spent, t.created_at
-                    FROM (
-                        SELECT 
-                            u.username,
-                            u.id as user_id,
-                            qr.total_questions,
-                            qr.time_spent,
-                            qr.created_at,
-                            ROW_NUMBER() OVER (
-                                PARTITION BY u.id
-                                ORDER BY qr.total_questions DESC, qr.time_spent DESC, qr.created_at DESC
-                            ) as rn
-                        FROM quiz_records qr
-                        JOIN users u ON qr.user_id = u.id
-                        WHERE qr.mode = 'study' AND qr.completed = TRUE
-                    ) t
-                    WHERE t.rn = 1
-                    ORDER BY t.total_questions DESC, t.time_spent DESC, t.created_at DESC
-                    LIMIT ?
-                """, (limit,))
-                
-                leaderboard = []
-                for row in cursor.fetchall():
-                    leaderboard.append({
-                        'rank': row['rank'],
-                        'username': row['username'],
-                        'user_id': row['user_id'],
-                        'total_questions': row['total_questions'],
-                        'time_spent': row['time_spent'],
-                        'created_at': row['created_at']
-                    })
-                
-                return jsonify({
-                    'leaderboard': leaderboard,
-                    'mode': 'study',
-                    'total': len(leaderboard)
-                }), 200
+            limit = min(int(request.args.get('limit', 50)), TOP_N)  # 最多100条
+            period = request_period()  # daily / weekly / all（默认总榜）
+            if period is None:
+                return jsonify({'error': '无效的统计周期'}), 400
+            return board_response('study', period, limit)
                 
         except Exception as e:
             return jsonify({'error': f'服务器错误: {str(e)}'}), 500
@@ -133,7 +380,7 @@ def register_leaderboard_routes(app):
         try:
             user_id = get_jwt_identity()
             
-            with get_db() as conn:
+            with get_user_db(user_id) as conn:
                 # 获取速答模式最佳成绩
                 cursor = conn.execute("""
                     SELECT correct_answers, total_questions, time_spent, accuracy, 
@@ -173,6 +420,15 @@ def register_leaderboard_routes(app):
                     'overall_stats': None
                 }
                 
+                # 分片模式：视图中的名次只在本分片内，改为按全部分片中更好的成绩数计算
+                if shard_router.enabled:
+                    if speed_best:
+                        speed_best = dict(speed_best, rank=1 + count_better_results(
+                            'speed', speed_best['correct_answers'], speed_best['time_spent']))
+                    if study_best:
+                        study_best = dict(study_best, rank=1 + count_better_results(
+                            'study', study_best['total_questions'], study_best['time_spent']))
+                
                 if speed_best:
                     result['speed_best'] = {
                         'rank': speed_best['rank'],
@@ -210,68 +466,15 @@ def register_leaderboard_routes(app):
     def get_leaderboard_stats():
         """获取排行榜统计信息"""
         try:
-            with get_db() as conn:
-                # 速答模式统计
-                cursor = conn.execute("""
-                    SELECT 
-                        COUNT(*) as total_records,
-                        AVG(correct_answers) as avg_correct,
-                        AVG(accuracy) as avg_accuracy,
-                        AVG(time_spent) as avg_time,
-                        MAX(correct_answers) as max_correct,
-                        MIN(time_spent) as min_time
-                    FROM speed_leaderboard
-                """)
-                
-                speed_stats = cursor.fetchone()
-                
-                # 学习模式统计
-                cursor = conn.execute("""
-                    SELECT 
-                        COUNT(*) as total_records,
-                        AVG(total_questions) as avg_questions,
-                        AVG(time_spent) as avg_time,
-                        MAX(total_questions) as max_questions,
-                        MAX(time_spent) as max_time
-                    FROM study_leaderboard
-                """)
-                
-                study_stats = cursor.fetchone()
-                
-                # 用户活跃度统计
-                cursor = conn.execute("""
-                    SELECT 
-                        COUNT(*) as total_users,
-                        COUNT(CASE WHEN last_activity >= date('now', '-7 days') THEN 1 END) as weekly_active,
-                        COUNT(CASE WHEN last_activity >= date('now', '-30 days') THEN 1 END) as monthly_active
-                    FROM user_stats
-                    WHERE total_sessions > 0
-                """)
-                
-                user_stats = cursor.fetchone()
-                
-                return jsonify({
-                    'speed_mode': {
-                        'total_records': speed_stats['total_records'],
-                        'avg_correct_answers': round(speed_stats['avg_correct'] or 0, 1),
-                        'avg_accuracy': round(speed_stats['avg_accuracy'] or 0, 1),
-                        'avg_time_spent': round(speed_stats['avg_time'] or 0, 1),
-                        'max_correct_answers': speed_stats['max_correct'] or 0,
-                        'min_time_spent': speed_stats['min_time'] or 0
-                    },
-                    'study_mode': {
-                        'total_records': study_stats['total_records'],
-                        'avg_questions': round(study_stats['avg_questions'] or 0, 1),
-                        'avg_time_spent': round(study_stats['avg_time'] or 0, 1),
-                        'max_questions': study_stats['max_questions'] or 0,
-                        'max_time_spent': study_stats['max_time'] or 0
-                    },
-                    'users': {
-                        'total_active_users': user_stats['total_users'],
-                        'weekly_active_users': user_stats['weekly_active'],
-                        'monthly_active_users': user_stats['monthly_active']
-                    }
-                }), 200
+            def loader():
+                conns = get_user_dbs()
+                try:
+                    return merge_leaderboard_stats([load_leaderboard_stats(conn) for conn in conns])
+                finally:
+                    close_user_dbs(conns)
+            
+            entry = leaderboard_cache.get('stats', loader, ttl=leaderboard_cache.stats_ttl)
+            return conditional_json(entry, 'stats', lambda: entry['data'])
                 
         except Exception as e:
             return jsonify({'error': f'服务器错误: {str(e)}'}), 500
\ No newline at end of file
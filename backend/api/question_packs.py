@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线题库包API
+客户端缓存题库包，出题时只向 /api/questions/random?ids_only=1 请求题目ID与顺序
+"""
+
+from flask import request, jsonify, Response
+from flask_jwt_extended import jwt_required
+from db import get_db
+from services.question_bank import question_bank
+from services.question_packs import question_packs, load_manifest
+
+# 同一版本的题库包内容不变：允许客户端永久缓存（带登录凭据请求，仅限私有缓存）
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+
+def pack_url(subject_name, version):
+    return f'/api/question-packs/{subject_name}/{version}'
+
+def register_question_pack_routes(app):
+    """注册题库包相关路由"""
+
+    @app.route('/api/question-packs/<subject>', methods=['GET'])
+    @jwt_required()
+    def get_question_pack_manifest(subject):
+        """当前版本信息（版本号、题目数、题库包地址），不缓存，支持 If-None-Match"""
+        try:
+            with get_db() as conn:
+                bank = question_bank.get(conn, subject)
+                if not bank.questions:
+                    return jsonify({'error': '学科不存在'}), 404
+                pack = question_packs.get(conn, bank)
+
+            response = jsonify({
+                'subject': subject,
+                'version': pack.version,
+                'total': len(pack.questions),
+                'url': pack_url(subject, pack.version),
+            })
+            response.set_etag(pack.version)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/question-packs/<subject>/<version>', methods=['GET'])
+    @jwt_required()
+    def get_question_pack(subject, version):
+        """整包下载（只提供当前版本），内容按版本号寻址，可永久缓存"""
+        try:
+            with get_db() as conn:
+                pack = question_packs.get(conn, question_bank.get(conn, subject))
+
+            if not pack.questions or pack.version != version:
+                return jsonify({'error': '题库包版本不存在或已过期', 'version': pack.version}), 404
+
+            response = Response(pack.body, mimetype='application/json')
+            response.set_etag(pack.version)
+            response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+            return response.make_conditional(request)
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+    @app.route('/api/question-packs/<subject>/delta', methods=['GET'])
+    @jwt_required()
+    def get_question_pack_delta(subject):
+        """从 since 版本更新到当前版本：只返回变化的题目与删除的题目ID
+
+        since 版本未记录（过旧或无效）时返回整包（full 为 true，客户端应丢弃本地题目）
+        """
+        since = request.args.get('since', '')
+        try:
+            with get_db() as conn:
+                bank = question_bank.get(conn, subject)
+                if not bank.questions:
+                    return jsonify({'error': '学科不存在'}), 404
+                pack = question_packs.get(conn, bank)
+                since_manifest = {} if since == pack.version else load_manifest(conn, subject, since)
+
+            if since == pack.version:
+                changed, removed = [], []
+            elif since_manifest is not None:
+                changed, removed = pack.delta(since_manifest)
+            else:
+                changed, removed = pack.questions, []
+
+            response = jsonify({
+                'subject': subject,
+                'version': pack.version,
+                'since': since,
+                'full': since_manifest is None,
+                'changed': changed,
+                'removed': removed,
+            })
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+
+        except Exception as e:
+            return jsonify({'error': f'服务器错误: {str(e)}'}), 500
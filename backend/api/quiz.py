@@ -4,43 +4,176 @@
 答题相关API
 """
 
-from flask import request, jsonify
+from flask import request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from db import get_user_db
+from services.shards import router as shard_router
+from services.maintenance import MaintenanceScheduler, connect as maintenance_connect, on_database
+from services import leaderboard_rollups, mastery, archive, projection, answer_journal, idempotency
+from services.quiz_sessions import QuizSession, sessions, DEFAULT_TTL as SESSION_TTL
+from services.quiz_sweeper import finalize_abandoned
+from services.serialization import row_mapper
+from api.leaderboard import record_board_result
+import functools
 import sqlite3
 import datetime
 import json
+import base64
+import os
 
-def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect('../database/quiz_app.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+
+def encode_history_cursor(created_at, record_id):
+    """将 (created_at, id) 编码为不透明的分页游标"""
+    raw = json.dumps([created_at, record_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_history_cursor(cursor):
+    """解析分页游标，格式错误时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, record_id = json.loads(raw.decode('utf-8'))
+    except Exception:
+        raise ValueError('invalid cursor')
+    if not isinstance(created_at, str) or not isinstance(record_id, int):
+        raise ValueError('invalid cursor')
+    return created_at, record_id
+
+HISTORY_ALWAYS = ('id', 'created_at')  # 分页游标总要 id 与 created_at
+
+def history_accuracy(row):
+    total = row['total_questions']
+    if total and total > 0:
+        return round(row['correct_answers'] * 100.0 / total, 2)
+    return 0
+
+@functools.lru_cache(maxsize=128)
+def history_mapper(fields):
+    """答题历史的行转换函数（每种字段组合编译一次，按列序号取值）"""
+    keys = projection.column_positions(projection.HISTORY_COLUMNS, fields, always=HISTORY_ALWAYS)
+    return row_mapper(fields, keys, converters={'completed': bool}, computed={'accuracy': history_accuracy})
+
+@functools.lru_cache(maxsize=128)
+def detail_mapper(fields):
+    """答题详情的行转换函数（每种字段组合编译一次，按列序号取值）"""
+    keys = projection.column_positions(projection.DETAIL_COLUMNS, fields)
+    return row_mapper(fields, keys, converters={'is_correct': bool})
 
 def register_quiz_routes(app):
     """注册答题相关路由"""
     
+    # 活动答题会话的淘汰时间（秒），默认 0 表示不缓存；仅单进程或按答题记录粘性路由时可开启
+    app.config.setdefault('ACTIVE_SESSION_TTL', int(os.environ.get('QUIZ_ACTIVE_SESSION_TTL', SESSION_TTL)))
+    sessions.ttl = app.config['ACTIVE_SESSION_TTL']
+    
+    # 答题相关的后台任务在独立的线程中运行，不受 MAINTENANCE_ENABLED 影响（默认开启）：
+    # 任务都是幂等的集合式更新，多进程同时执行只是重复检查，不会重复计入
+    app.config.setdefault('QUIZ_TASKS_ENABLED', os.environ.get('QUIZ_TASKS_ENABLED', '1') == '1')
+    # 自动结束被放弃的答题（间隔秒数，0 表示关闭）
+    app.config.setdefault('QUIZ_SWEEP_INTERVAL', int(os.environ.get('QUIZ_SWEEP_INTERVAL', 300)))
+    
+    def on_quizzes_finalized(results):
+        # 在后台线程中调用：向排行榜订阅者推送时要查询榜单、编码 JSON，需要应用上下文
+        with app.app_context():
+            for user_id, mode, quiz_record_id, correct_answers, total_questions, time_spent, _, _ in results:
+                sessions.discard(quiz_record_id)
+                record_board_result(mode, user_id, correct_answers, total_questions, time_spent)
+    
+    def sweep_quizzes(conn):
+        if not shard_router.enabled:
+            return finalize_abandoned(conn, on_finalized=on_quizzes_finalized)
+        # 分片模式：答题记录在各分片中，逐个分片结束
+        finalized = 0
+        for path in shard_router.shard_paths:
+            shard_conn = maintenance_connect(path)
+            try:
+                finalized += finalize_abandoned(shard_conn, on_finalized=on_quizzes_finalized)
+            finally:
+                shard_conn.close()
+        return finalized
+    
+    # 只追加的作答日志：提交答案只写入 answer_events，由后台压缩（间隔秒数）与结束答题合并到单题记录
+    app.config.setdefault('ANSWER_JOURNAL', os.environ.get('QUIZ_ANSWER_JOURNAL', '0') == '1')
+    app.config.setdefault('ANSWER_JOURNAL_COMPACT_INTERVAL',
+                          int(os.environ.get('QUIZ_ANSWER_JOURNAL_COMPACT_INTERVAL', answer_journal.DEFAULT_COMPACT_INTERVAL)))
+    # 提交答案的幂等记录保留秒数（到期由答题后台任务每小时清理）与进程内重放缓存的有效期
+    app.config.setdefault('IDEMPOTENCY_RETENTION',
+                          int(os.environ.get('QUIZ_IDEMPOTENCY_RETENTION', idempotency.DEFAULT_RETENTION)))
+    app.config.setdefault('IDEMPOTENCY_CACHE_TTL',
+                          int(os.environ.get('QUIZ_IDEMPOTENCY_CACHE_TTL', idempotency.DEFAULT_CACHE_TTL)))
+    idempotency.replays.ttl = app.config['IDEMPOTENCY_CACHE_TTL']
+    
+    # 日志表与幂等记录表在主库与各分片中都要存在：关闭日志后，遗留的事件仍需合并
+    for path in shard_router.user_paths():
+        user_conn = maintenance_connect(path)
+        try:
+            answer_journal.ensure_journal(user_conn)
+            idempotency.ensure_submissions(user_conn)
+        finally:
+            user_conn.close()
+    
+    def purge_submissions(conn):
+        return idempotency.purge_submissions(conn, app.config['IDEMPOTENCY_RETENTION'])
+    
+    quiz_tasks = MaintenanceScheduler(app.config['DATABASE_PATH'], [], log=app.logger.warning, name='quiz-tasks')
+    quiz_tasks.add_task('sweep_quizzes', app.config['QUIZ_SWEEP_INTERVAL'], sweep_quizzes)
+    if shard_router.enabled:
+        for index, path in enumerate(shard_router.shard_paths):
+            quiz_tasks.add_task(f'purge_submissions:shard{index}', 3600, on_database(path, purge_submissions))
+    else:
+        quiz_tasks.add_task('purge_submissions', 3600, purge_submissions)
+    app.extensions['quiz_tasks'] = quiz_tasks
+    if app.config['QUIZ_TASKS_ENABLED']:
+        # 与维护线程相同，首个请求时才启动，避免调试模式下重载器的父进程也执行
+        @app.before_request
+        def _start_quiz_tasks():
+            quiz_tasks.start()
+    
+    scheduler = app.extensions.get('db_maintenance')
+    if scheduler is not None:
+        if shard_router.enabled:
+            for index, path in enumerate(shard_router.shard_paths):
+                scheduler.add_task(f'compact_answers:shard{index}', app.config['ANSWER_JOURNAL_COMPACT_INTERVAL'],
+                                   on_database(path, answer_journal.compact))
+        else:
+            scheduler.add_task('compact_answers', app.config['ANSWER_JOURNAL_COMPACT_INTERVAL'],
+                               answer_journal.compact)
+    if app.config['ANSWER_JOURNAL'] and not app.config.get('MAINTENANCE_ENABLED'):
+        app.logger.warning('作答日志已启用但后台维护未启用：进行中与被放弃答题的事件需由 '
+                           'database/maintenance.py compact 合并（结束答题时会合并本轮的事件）')
+    
     @app.route('/api/quiz/start', methods=['POST'])
     @jwt_required()
     def start_quiz():
-        """开始答题"""
+        """开始答题
+
+        可选参数 question_ids：本轮下发的题目顺序，登记后只接受这些题目的答案
+        """
         try:
             user_id = get_jwt_identity()
             data = request.get_json()
             mode = data.get('mode')  # 'speed' 或 'study'
+            question_ids = data.get('question_ids') or []
             
             if mode not in ['speed', 'study']:
                 return jsonify({'error': '无效的答题模式'}), 400
+            if not isinstance(question_ids, list) or not all(isinstance(q, int) for q in question_ids):
+                return jsonify({'error': '无效的题目列表'}), 400
             
-            with get_db() as conn:
+            with get_user_db(user_id) as conn:
                 # 创建答题记录
+                start_time = datetime.datetime.now()
                 cursor = conn.execute("""
                     INSERT INTO quiz_records (user_id, mode, start_time)
                     VALUES (?, ?, ?)
-                """, (user_id, mode, datetime.datetime.now()))
+                    RETURNING id, created_at
+                """, (user_id, mode, start_time))
                 
-                quiz_record_id = cursor.lastrowid
+                quiz_record_id, created_at = cursor.fetchone()
                 conn.commit()
                 
+                # 登记活动会话，之后的提交与结束不再查询答题记录
+                sessions.put(QuizSession(quiz_record_id, user_id, mode, start_time, created_at, question_ids))
+                
                 return jsonify({
                     'quiz_record_id': quiz_record_id,
                     'mode': mode,
@@ -50,10 +183,20 @@ def register_quiz_routes(app):
         except Exception as e:
             return jsonify({'error': f'服务器错误: {str(e)}'}), 500
     
+    def replay_submission(request_fingerprint, saved):
+        """重放已保存的提交结果；同一个幂等键用于内容不同的请求时拒绝"""
+        saved_fingerprint, response = saved
+        if saved_fingerprint != request_fingerprint:
+            return jsonify({'error': '幂等键已用于其他请求'}), 409
+        return jsonify(response), 200, {'Idempotent-Replayed': 'true'}
+    
     @app.route('/api/quiz/submit-answer', methods=['POST'])
     @jwt_required()
     def submit_answer():
-        """提交答案"""
+        """提交答案
+
+        可选请求头 Idempotency-Key：网络重试时沿用同一个键，重复的请求直接返回首次的结果，不再重复累计
+        """
         try:
             user_id = get_jwt_identity()
             data = request.get_json()
@@ -67,22 +210,43 @@ def register_quiz_routes(app):
             if not all([quiz_record_id, question_id, selected_option_id]):
                 return jsonify({'error': '缺少必要参数'}), 400
             
-            with get_db() as conn:
-                # 验证答题记录所有权
-                cursor = conn.execute(
-                    "SELECT user_id FROM quiz_records WHERE id = ?",
-                    (quiz_record_id,)
-                )
-                record = cursor.fetchone()
+            key = request.headers.get('Idempotency-Key')
+            if key is not None:
+                if not idempotency.valid_key(key):
+                    return jsonify({'error': '无效的幂等键'}), 400
+                request_fingerprint = idempotency.fingerprint(quiz_record_id, question_id, selected_option_id,
+                                                              time_taken, attempt_count)
+                saved = idempotency.replays.get(user_id, key)
+                if saved is not None:
+                    return replay_submission(request_fingerprint, saved)
+            
+            with get_user_db(user_id) as conn:
+                if key is not None:
+                    # 缓存未命中（已淘汰、其他进程处理或重启）时查幂等记录表
+                    saved = idempotency.load_submission(conn, user_id, key)
+                    if saved is not None:
+                        idempotency.replays.put(user_id, key, *saved)
+                        return replay_submission(request_fingerprint, saved)
                 
-                if not record or record['user_id'] != user_id:
+                # 验证答题记录所有权（活动会话在内存中，未命中时从数据库重建）
+                session = sessions.get(conn, quiz_record_id)
+                
+                if not session or session.user_id != user_id:
                     return jsonify({'error': '无效的答题记录'}), 403
+                if session.completed:
+                    return jsonify({'error': '答题已结束'}), 409
+                if not session.allows(question_id):
+                    return jsonify({'error': '题目不属于本轮答题'}), 400
                 
-                # 检查选项是否正确
-                cursor = conn.execute(
-                    "SELECT is_correct FROM options WHERE id = ? AND question_id = ?",
-                    (selected_option_id, question_id)
-                )
+                # 检查选项是否正确（同时取出正确选项与详解：题库包不含答案，作答后由服务端揭示）
+                cursor = conn.execute("""
+                    SELECT o.is_correct, q.explanation, c.id as correct_option_id
+                    FROM options o
+                    JOIN questions q ON q.id = o.question_id
+                    LEFT JOIN options c ON c.question_id = o.question_id AND c.is_correct
+                    WHERE o.id = ? AND o.question_id = ?
+                    LIMIT 1
+                """, (selected_option_id, question_id))
                 option = cursor.fetchone()
                 
                 if not option:
@@ -90,38 +254,67 @@ def register_quiz_routes(app):
                 
                 is_correct = bool(option['is_correct'])
                 # 记录答题（同一题目在同一次答题记录中只保留一行，累计尝试次数与用时）
-                existing = conn.execute(
-                    "SELECT id, attempt_count, time_taken FROM question_answers WHERE quiz_record_id = ? AND question_id = ?",
-                    (quiz_record_id, question_id)
-                ).fetchone()
+                existing = session.existing_answer(question_id)
 
                 if existing:
-                    new_attempts = (existing['attempt_count'] or 0) + 1
-                    new_time = (existing['time_taken'] or 0) + (time_taken or 0)
+                    answer_id, previous_attempts, previous_time = existing
+                    new_attempts = (previous_attempts or 0) + 1
+                    new_time = (previous_time or 0) + (time_taken or 0)
+                else:
+                    answer_id = None
+                    new_attempts = max(1, int(attempt_count or 1))
+                    new_time = time_taken
+
+                # 日志模式只追加一行作答事件；本题已有未压缩的事件（日志刚关闭）时也写入日志，保持事件顺序
+                journaled = current_app.config['ANSWER_JOURNAL'] or bool(existing and answer_id is None)
+                if journaled:
+                    answer_journal.append_event(conn, quiz_record_id, user_id, question_id, selected_option_id,
+                                                is_correct, 1 if existing else new_attempts, time_taken)
+                elif existing:
                     conn.execute(
                         """
                         UPDATE question_answers
                         SET selected_option_id = ?, is_correct = ?, attempt_count = ?, time_taken = ?
                         WHERE id = ?
                         """,
-                        (selected_option_id, is_correct, new_attempts, new_time, existing['id'])
+                        (selected_option_id, is_correct, new_attempts, new_time, answer_id)
                     )
                 else:
-                    conn.execute(
+                    cursor = conn.execute(
                         """
                         INSERT INTO question_answers 
                         (quiz_record_id, question_id, selected_option_id, is_correct, attempt_count, time_taken)
                         VALUES (?, ?, ?, ?, ?, ?)
                         """,
-                        (quiz_record_id, question_id, selected_option_id, is_correct, max(1, int(attempt_count or 1)), time_taken)
+                        (quiz_record_id, question_id, selected_option_id, is_correct, new_attempts, time_taken)
                     )
+                    answer_id = cursor.lastrowid
 
-                conn.commit()
-                
-                return jsonify({
+                # 更新逐题掌握度（自适应出题使用；写入日志的作答在压缩时更新）
+                if not journaled:
+                    mastery.record_answer(conn, user_id, question_id, is_correct, time_taken)
+
+                result = {
                     'is_correct': is_correct,
+                    'correct_option_id': option['correct_option_id'],
+                    'explanation': option['explanation'],
                     'message': '答案已提交'
-                }), 200
+                }
+                if key is not None:
+                    # 与作答写入同一事务保存结果；并发的同键请求已先提交时放弃本次写入，重放其结果
+                    try:
+                        idempotency.store_submission(conn, user_id, key, request_fingerprint, result)
+                    except sqlite3.IntegrityError:
+                        conn.rollback()
+                        saved = idempotency.load_submission(conn, user_id, key)
+                        return replay_submission(request_fingerprint, saved)
+
+                conn.commit()
+                session.apply_answer(question_id, answer_id, is_correct, new_attempts, new_time)
+                if key is not None:
+                    idempotency.replays.put(user_id, key, request_fingerprint, result)
+                
+                return jsonify(result), 200
                 
         except Exception as e:
             return jsonify({'error': f'服务器错误: {str(e)}'}), 500
@@ -138,56 +331,65 @@ def register_quiz_routes(app):
             if not quiz_record_id:
                 return jsonify({'error': '缺少答题记录ID'}), 400
             
-            with get_db() as conn:
-                # 验证答题记录所有权
-                cursor = conn.execute(
-                    "SELECT user_id, start_time, mode FROM quiz_records WHERE id = ?",
-                    (quiz_record_id,)
-                )
-                record = cursor.fetchone()
+            with get_user_db(user_id) as conn:
+                # 验证答题记录所有权（活动会话在内存中，未命中时从数据库重建）
+                session = sessions.get(conn, quiz_record_id)
                 
-                if not record or record['user_id'] != user_id:
+                if not session or session.user_id != user_id:
                     return jsonify({'error': '无效的答题记录'}), 403
-                
-                # 计算统计信息
-                cursor = conn.execute("""
-                    SELECT 
-                        COUNT(DISTINCT question_id) as total_questions,
-                        SUM(CASE WHEN is_correct THEN 1 ELSE 0 END) as correct_answers
-                    FROM question_answers 
-                    WHERE quiz_record_id = ?
-                """, (quiz_record_id,))
-                
-                stats = cursor.fetchone()
+                if session.completed:
+                    return jsonify({'error': '答题已结束'}), 409
                 
                 # 计算用时（秒）
-                # 兼容 SQLite 默认格式（空格/"T" 分隔）
-                start_time = datetime.datetime.fromisoformat(str(record['start_time']).replace(' ', 'T'))
                 end_time = datetime.datetime.now()
-                time_spent = int((end_time - start_time).total_seconds())
+                time_spent = int((end_time - session.start_time).total_seconds())
                 
-                # 更新答题记录
-                conn.execute("""
+                # 标记结束（同时取得写锁；已被其他请求或自动结束任务结束时不再重复计入）
+                cursor = conn.execute("""
                     UPDATE quiz_records 
-                    SET end_time = ?, total_questions = ?, correct_answers = ?, 
-                        time_spent = ?, completed = TRUE
-                    WHERE id = ?
-                """, (end_time, stats['total_questions'], stats['correct_answers'], 
-                      time_spent, quiz_record_id))
+                    SET end_time = ?, time_spent = ?, completed = TRUE
+                    WHERE id = ? AND completed = FALSE
+                """, (end_time, time_spent, quiz_record_id))
+                if cursor.rowcount == 0:
+                    conn.rollback()
+                    sessions.discard(quiz_record_id)
+                    return jsonify({'error': '答题已结束'}), 409
+                
+                # 把本轮尚未压缩的作答事件合并到单题记录（上面的 UPDATE 已取得写锁，期间不会有新事件插入）
+                answer_journal.compact_quizzes(conn, [quiz_record_id])
+                
+                # 统计以单题记录为准（按 quiz_record_id 索引聚合；进程内会话可能不含其他进程处理的作答）
+                total_questions, correct_answers = conn.execute("""
+                    SELECT COUNT(*), COALESCE(SUM(is_correct), 0)
+                    FROM question_answers WHERE quiz_record_id = ?
+                """, (quiz_record_id,)).fetchone()
+                conn.execute(
+                    "UPDATE quiz_records SET total_questions = ?, correct_answers = ? WHERE id = ?",
+                    (total_questions, correct_answers, quiz_record_id)
+                )
+                
+                # 更新当日/本周/总榜的最佳成绩汇总
+                leaderboard_rollups.record_result(conn, user_id, session.mode, quiz_record_id,
+                                                  correct_answers, total_questions,
+                                                  time_spent, session.created_at, end_time)
                 
                 conn.commit()
+                sessions.discard(quiz_record_id)
+                
+                # 排行榜缓存：仅当新成绩进入榜单时失效
+                record_board_result(session.mode, user_id, correct_answers, total_questions, time_spent)
                 
                 # 计算准确率
                 accuracy = 0
-                if stats['total_questions'] > 0:
-                    accuracy = round(stats['correct_answers'] * 100.0 / stats['total_questions'], 2)
+                if total_questions > 0:
+                    accuracy = round(correct_answers * 100.0 / total_questions, 2)
                 
                 return jsonify({
-                    'total_questions': stats['total_questions'],
-                    'correct_answers': stats['correct_answers'],
+                    'total_questions': total_questions,
+                    'correct_answers': correct_answers,
                     'accuracy': accuracy,
                     'time_spent': time_spent,
-                    'mode': record['mode'],
+                    'mode': session.mode,
                     'end_time': end_time.isoformat()
                 }), 200
                 
@@ -201,48 +403,57 @@ def register_quiz_routes(app):
         try:
             user_id = get_jwt_identity()
             mode = request.args.get('mode')  # 可选的模式筛选
-            limit = min(int(request.args.get('limit', 20)), 100)  # 最多100条
+            limit = max(1, min(int(request.args.get('limit', 20)), 100))  # 最多100条
+            page_cursor = request.args.get('cursor')  # 上一页返回的 next_cursor
+            try:
+                fields = projection.HISTORY.parse(request.args.get('fields'), request.args.get('view'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            with get_db() as conn:
-                query = """
-                    SELECT id, mode, start_time, end_time, total_questions, 
-                           correct_answers, time_spent, completed, created_at
+            after = None
+            if page_cursor:
+                try:
+                    after = decode_history_cursor(page_cursor)
+                except ValueError:
+                    return jsonify({'error': '无效的分页游标'}), 400
+            
+            with get_user_db(user_id) as conn:
+                # 键集分页：(user_id, [mode,] created_at, id) 由覆盖索引直接定位，
+                # 翻到任意深度都不需要排序或跳过前面的行；只查询所选字段需要的列（分页游标总要 id 与 created_at）
+                columns = projection.select_columns(projection.HISTORY_COLUMNS, fields, always=HISTORY_ALWAYS)
+                query = f"""
+                    SELECT {columns}
                     FROM quiz_records 
                     WHERE user_id = ?
                 """
                 params = [user_id]
                 
-                if mode and mode in ['speed', 'study']:
+                if mode and mode in ['speed', 'study', 'battle']:
                     query += " AND mode = ?"
                     params.append(mode)
                 
-                query += " ORDER BY created_at DESC LIMIT ?"
-                params.append(limit)
-                
-                cursor = conn.execute(query, params)
-                records = []
-                
-                for row in cursor.fetchall():
-                    accuracy = 0
-                    if row['total_questions'] and row['total_questions'] > 0:
-                        accuracy = round(row['correct_answers'] * 100.0 / row['total_questions'], 2)
-                    
-                    records.append({
-                        'id': row['id'],
-                        'mode': row['mode'],
-                        'start_time': row['start_time'],
-                        'end_time': row['end_time'],
-                        'total_questions': row['total_questions'],
-                        'correct_answers': row['correct_answers'],
-                        'accuracy': accuracy,
-                        'time_spent': row['time_spent'],
-                        'completed': bool(row['completed']),
-                        'created_at': row['created_at']
-                    })
+                if after:
+                    query += " AND (created_at, id) < (?, ?)"
+                    params.extend(after)
+                
+                # 多取一条用于判断是否还有下一页
+                query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+                params.append(limit + 1)
+                
+                rows = conn.execute(query, params).fetchall()
+                has_more = len(rows) > limit
+                rows = rows[:limit]
+                map_row = history_mapper(fields)
+                records = [map_row(row) for row in rows]
+                
+                next_cursor = None
+                if has_more:
+                    next_cursor = encode_history_cursor(rows[-1]['created_at'], rows[-1]['id'])
                 
                 return jsonify({
                     'records': records,
-                    'total': len(records)
+                    'total': len(records),
+                    'next_cursor': next_cursor
                 }), 200
                 
         except Exception as e:
@@ -250,13 +461,16 @@ def register_quiz_routes(app):
     
     @app.route('/api/quiz/<int:quiz_record_id>/details', methods=['GET'])
     @jwt_required()
-    def get_quiz_details():
-        """获取答题详情"""
+    def get_quiz_details(quiz_record_id):
+        """获取答题详情（单题记录已归档时透明地附加归档库查询）"""
         try:
             user_id = get_jwt_identity()
-            quiz_record_id = request.view_args['quiz_record_id']
+            try:
+                fields = projection.DETAILS.parse(request.args.get('fields'), request.args.get('view'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
-            with get_db() as conn:
+            with get_user_db(user_id) as conn:
                 # 验证答题记录所有权
                 cursor = conn.execute(
                     "SELECT user_id FROM quiz_records WHERE id = ?",
@@ -267,32 +481,30 @@ def register_quiz_routes(app):
                 if not record or record['user_id'] != user_id:
                     return jsonify({'error': '无权访问此答题记录'}), 403
                 
-                # 获取答题详情
-                cursor = conn.execute("""
-                    SELECT qa.*, q.title, q.content, q.explanation, q.correct_answer,
-                           o.option_text as selected_text, co.option_text as correct_text
-                    FROM question_answers qa
-                    JOIN questions q ON qa.question_id = q.id
-                    LEFT JOIN options o ON qa.selected_option_id = o.id
-                    LEFT JOIN options co ON q.id = co.question_id AND co.is_correct = 1
+                # 单题记录所在的表：近期在主库，超过保留期的已移入归档库
+                answers_table = 'question_answers'
+                if archive.is_archived(conn, quiz_record_id):
+                    if not archive.attach_archive(conn, current_app.config['ARCHIVE_DATABASE_PATH']):
+                        return jsonify({'error': '归档数据暂不可用'}), 503
+                    answers_table = f'{archive.ARCHIVE_ALIAS}.question_answers'
+                
+                # 获取答题详情：只查询所选字段需要的列，选项文本的连接按需加入
+                columns = projection.select_columns(projection.DETAIL_COLUMNS, fields)
+                joins = ''
+                if 'selected_text' in fields:
+                    joins += ' LEFT JOIN options o ON qa.selected_option_id = o.id'
+                if 'correct_text' in fields:
+                    joins += ' LEFT JOIN options co ON q.id = co.question_id AND co.is_correct = 1'
+                cursor = conn.execute(f"""
+                    SELECT {columns or 'qa.id'}
+                    FROM {answers_table} qa
+                    JOIN questions q ON qa.question_id = q.id{joins}
                     WHERE qa.quiz_record_id = ?
                     ORDER BY qa.answered_at
                 """, (quiz_record_id,))
                 
-                details = []
-                for row in cursor.fetchall():
-                    details.append({
-                        'question_id': row['question_id'],
-                        'question_title': row['title'],
-                        'question_content': row['content'],
-                        'selected_text': row['selected_text'],
-                        'correct_text': row['correct_text'],
-                        'is_correct': bool(row['is_correct']),
-                        'attempt_count': row['attempt_count'],
-                        'time_taken': row['time_taken'],
-                        'explanation': row['explanation'],
-                        'answered_at': row['answered_at']
-                    })
+                map_row = detail_mapper(fields)
+                details = [map_row(row) for row in cursor.fetchall()]
                 
                 return jsonify({
                     'quiz_record_id': quiz_record_id,
@@ -6,13 +6,27 @@
 
 from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity, get_jwt
 import sqlite3
-import hashlib
+import contextlib
 import datetime
 import secrets
+import random
 import os
 from functools import wraps
+from db import init_db, get_db, get_user_db, get_user_dbs, close_user_dbs
+from passwords import hash_password, verify_password
+from services.question_bank import question_bank
+from services.question_packs import question_packs
+from services.quiz_sessions import sessions as quiz_sessions
+from services import projection
+from services.mastery import load_user_stats, adaptive_sample
+from services.archive import default_archive_path
+from services.bank_snapshot import default_snapshot_path, write_snapshot
+from services import auth_tokens
+from services.shards import router as shard_router, ensure_user_mirror
+from services.serialization import init_json
+from services.schema import upgrade_databases
 
 # 创建Flask应用
 app = Flask(__name__, static_folder=None, static_url_path=None)
@@ -20,46 +34,63 @@ app = Flask(__name__, static_folder=None, static_url_path=None)
 # 配置
 app.config['SECRET_KEY'] = 'your-secret-key-change-this'  # 在生产环境中使用随机生成的密钥
 app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-change-this'  # 在生产环境中使用随机生成的密钥
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(hours=24)
+# 短期访问令牌 + 轮换刷新令牌（/api/token/refresh），令牌过期不必重新登录
+app.config['JWT_ACCESS_TOKEN_EXPIRES'] = datetime.timedelta(minutes=int(os.environ.get('QUIZ_ACCESS_TOKEN_MINUTES', 15)))
+app.config['JWT_REFRESH_TOKEN_EXPIRES'] = datetime.timedelta(days=int(os.environ.get('QUIZ_REFRESH_TOKEN_DAYS', 30)))
+# 访问令牌校验时会话状态的缓存时间（秒），为 0 时每次请求都查询数据库
+auth_tokens.session_status.recheck_seconds = int(os.environ.get('QUIZ_SESSION_RECHECK_SECONDS', auth_tokens.DEFAULT_RECHECK_SECONDS))
+# 刷新令牌轮换后仍接受上一个刷新令牌的秒数（并发刷新、响应丢失后重试），为 0 时任何重用都注销会话
+app.config['REFRESH_GRACE_SECONDS'] = int(os.environ.get('QUIZ_REFRESH_GRACE_SECONDS', auth_tokens.DEFAULT_GRACE_SECONDS))
 
 # 初始化扩展
 CORS(app)  # 允许跨域请求
 jwt = JWTManager(app)
+# API 响应的 JSON 编码（QUIZ_JSON_BACKEND=auto|orjson|stdlib，auto 在已安装 orjson 时使用 orjson）
+init_json(app)
 
-# 数据库路径
+# 数据库路径（可通过环境变量 QUIZ_DB_PATH 指定，例如基准测试使用的合成数据库）
 DATABASE_PATH = '../database/quiz_app.db' if not os.path.exists('database/quiz_app.db') else 'database/quiz_app.db'
-
-def get_db():
-    """获取数据库连接"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row  # 使查询结果可以像字典一样访问
-    return conn
-
-def hash_password(password):
-    """密码哈希"""
-    return hashlib.sha256(password.encode()).hexdigest()
-
-def verify_password(password, hashed):
-    """验证密码"""
-    return hashlib.sha256(password.encode()).hexdigest() == hashed
+DATABASE_PATH = os.environ.get('QUIZ_DB_PATH', DATABASE_PATH)
+app.config['DATABASE_PATH'] = DATABASE_PATH
+# 归档库路径（超过保留期的单题记录，见 database/archive_answers.py）
+app.config['ARCHIVE_DATABASE_PATH'] = os.environ.get('QUIZ_ARCHIVE_DB_PATH', default_archive_path(DATABASE_PATH))
+# 题库快照路径（导入题目时生成，各进程只读映射共享；不存在时从数据库加载题库）
+app.config['BANK_SNAPSHOT_PATH'] = os.environ.get('QUIZ_BANK_SNAPSHOT', default_snapshot_path(DATABASE_PATH))
+question_bank.snapshot_path = app.config['BANK_SNAPSHOT_PATH']
+# 按用户分片的数据库文件数（0 表示不分片，全部数据在主库；分片由 database/reshard.py 创建）
+app.config['DATABASE_SHARDS'] = int(os.environ.get('QUIZ_SHARDS', 0))
+shard_router.configure(DATABASE_PATH, app.config['DATABASE_SHARDS'])
+# 旧库升级：按扩展架构补建新功能引入的表（已存在时不变，不必重新运行 init_database.py）
+if os.path.exists(DATABASE_PATH):
+    upgraded = upgrade_databases([DATABASE_PATH] + shard_router.shard_paths, app.logger)
+    # 刚补建题库修订号时，之前生成的快照不带修订号（不会被使用），按当前题库重新生成
+    if 'bank_revision' in upgraded[DATABASE_PATH] and os.path.exists(app.config['BANK_SNAPSHOT_PATH']):
+        with contextlib.closing(sqlite3.connect(DATABASE_PATH)) as conn:
+            write_snapshot(conn, app.config['BANK_SNAPSHOT_PATH'])
 
 # JWT相关处理
 @jwt.token_in_blocklist_loader
 def check_if_token_revoked(jwt_header, jwt_payload):
     """检查JWT令牌是否被撤销"""
-    jti = jwt_payload['jti']
+    session_id = jwt_payload.get('sid')
+    user_id = jwt_payload[app.config['JWT_IDENTITY_CLAIM']]
+    if session_id is None:
+        # 旧版令牌（不带会话ID）：按令牌 jti 查询会话
+        with get_user_db(user_id) as conn:
+            result = conn.execute(
+                "SELECT is_active FROM user_sessions WHERE token_jti = ?",
+                (jwt_payload['jti'],)
+            ).fetchone()
+        return result is None or not result['is_active']
     
-    with get_db() as conn:
-        cursor = conn.execute(
-            "SELECT is_active FROM user_sessions WHERE token_jti = ?",
-            (jti,)
-        )
-        result = cursor.fetchone()
-        
-        if result is None:
-            return True  # 令牌不存在，视为已撤销
-        
-        return not result['is_active']
+    if jwt_payload.get('type') == 'refresh':
+        return False  # 刷新令牌在 /api/token/refresh 中按数据库校验（含重放检测）
+    
+    def load(sid):
+        with get_user_db(user_id) as conn:
+            return auth_tokens.load_session_active(conn, sid)
+    
+    return not auth_tokens.session_status.is_active(session_id, load)
 
 # 错误处理
 @app.errorhandler(404)
@@ -195,32 +226,33 @@ def login():
             if not user or not verify_password(password, user['password_hash']):
                 return jsonify({'error': '用户名或密码错误'}), 401
             
-            # 创建JWT令牌
-            access_token = create_access_token(identity=user['id'])
-            
-            # 获取JWT信息
-            from flask_jwt_extended import decode_token
-            decoded_token = decode_token(access_token)
-            jti = decoded_token['jti']
-            expires_at = datetime.datetime.fromtimestamp(decoded_token['exp'])
-            
-            # 保存会话信息
-            conn.execute(
-                "INSERT INTO user_sessions (user_id, token_jti, expires_at) VALUES (?, ?, ?)",
-                (user['id'], jti, expires_at)
-            )
-            
-            # 更新最后登录时间
-            conn.execute(
-                "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?",
-                (user['id'],)
-            )
-            
-            conn.commit()
+            # 创建登录会话并签发访问令牌与刷新令牌（会话在用户所在的分片中）
+            user_conn = get_user_db(user['id'], conn)
+            try:
+                if user_conn is not conn:
+                    ensure_user_mirror(user_conn, user['id'], user['username'])
+                session_id, refresh_jti = auth_tokens.start_session(
+                    user_conn, user['id'], app.config['JWT_REFRESH_TOKEN_EXPIRES']
+                )
+                tokens = auth_tokens.issue_tokens(user['id'], session_id, refresh_jti)
+                
+                # 更新最后登录时间
+                conn.execute(
+                    "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = ?",
+                    (user['id'],)
+                )
+                
+                if user_conn is not conn:
+                    user_conn.commit()
+                conn.commit()
+            finally:
+                close_user_dbs([user_conn], conn)
             
             return jsonify({
                 'message': '登录成功',
-                'access_token': access_token,
+                'access_token': tokens['access_token'],
+                'refresh_token': tokens['refresh_token'],
+                'expires_in': int(app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()),
                 'user_id': user['id'],
                 'username': user['username']
             }), 200
@@ -228,19 +260,54 @@ def login():
     except Exception as e:
         return jsonify({'error': f'服务器错误: {str(e)}'}), 500
 
+@app.route('/api/token/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_token():
+    """用刷新令牌换取新的访问令牌与刷新令牌（旧刷新令牌随即失效，重放时注销整个会话）"""
+    try:
+        claims = get_jwt()
+        session_id = claims.get('sid')
+        if session_id is None:
+            return jsonify({'error': '无效的刷新令牌'}), 401
+        
+        with get_user_db(get_jwt_identity()) as conn:
+            result, refresh_jti = auth_tokens.rotate_refresh_token(
+                conn, session_id, claims['jti'], app.config['JWT_REFRESH_TOKEN_EXPIRES'],
+                app.config['REFRESH_GRACE_SECONDS']
+            )
+        
+        if result == auth_tokens.REUSED:
+            app.logger.warning(f'刷新令牌被重复使用，已注销会话 {session_id}')
+            return jsonify({'error': '刷新令牌已被使用，请重新登录'}), 401
+        if result == auth_tokens.REVOKED:
+            return jsonify({'error': '会话已失效，请重新登录'}), 401
+        
+        tokens = auth_tokens.issue_tokens(get_jwt_identity(), session_id, refresh_jti)
+        return jsonify({
+            'access_token': tokens['access_token'],
+            'refresh_token': tokens['refresh_token'],
+            'expires_in': int(app.config['JWT_ACCESS_TOKEN_EXPIRES'].total_seconds()),
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
 @app.route('/api/logout', methods=['POST'])
 @jwt_required()
 def logout():
-    """用户登出"""
+    """用户登出（注销整个登录会话，刷新令牌一并失效）"""
     try:
-        jti = get_jwt()['jti']
+        claims = get_jwt()
         
-        with get_db() as conn:
-            conn.execute(
-                "UPDATE user_sessions SET is_active = FALSE WHERE token_jti = ?",
-                (jti,)
-            )
-            conn.commit()
+        with get_user_db(get_jwt_identity()) as conn:
+            if claims.get('sid') is None:
+                conn.execute(
+                    "UPDATE user_sessions SET is_active = FALSE WHERE token_jti = ?",
+                    (claims['jti'],)
+                )
+                conn.commit()
+            else:
+                auth_tokens.revoke_session(conn, claims['sid'])
             
         return jsonify({'message': '登出成功'}), 200
         
@@ -254,7 +321,8 @@ def get_profile():
     try:
         user_id = get_jwt_identity()
         
-        with get_db() as conn:
+        # 答题累计与统计在用户所在的分片中（未分片时即主库）
+        with get_user_db(user_id) as conn:
             cursor = conn.execute("""
                 SELECT u.*, 
                        COALESCE(us.overall_accuracy, 0) as overall_accuracy, 
@@ -272,12 +340,20 @@ def get_profile():
             if not user:
                 return jsonify({'error': '用户不存在'}), 404
             
+            account = user
+            if shard_router.enabled:
+                # 分片中的用户行只是镜像，账号信息取自主库
+                account = conn.execute(
+                    "SELECT email, created_at, last_login FROM shared.users WHERE id = ?",
+                    (user_id,)
+                ).fetchone()
+            
             return jsonify({
                 'id': user['id'],
                 'username': user['username'],
-                'email': user['email'],
-                'created_at': user['created_at'],
-                'last_login': user['last_login'],
+                'email': account['email'],
+                'created_at': account['created_at'],
+                'last_login': account['last_login'],
                 'total_questions_answered': user['total_questions_answered'],
                 'total_correct_answers': user['total_correct_answers'],
                 'overall_accuracy': user['overall_accuracy'],
@@ -302,6 +378,14 @@ def get_random_questions():
         subject_name = request.args.get('subject', '语文')
         limit = int(request.args.get('limit', 0))  # 0表示获取所有题目
         exclude_ids = request.args.get('exclude_ids', '')
+        tag = request.args.get('tag')  # 可选：只出带有该标签的题目
+        # 客户端已缓存题库包（/api/question-packs）时只需题目ID与顺序
+        ids_only = request.args.get('ids_only', '').lower() in ('1', 'true')
+        # 输出字段：fields=id,title,... 或 view=speed|study|full（默认 full）
+        try:
+            fields = projection.QUESTIONS.parse(request.args.get('fields'), request.args.get('view'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # 解析排除的题目ID
         excluded_question_ids = []
@@ -311,71 +395,43 @@ def get_random_questions():
             except ValueError:
                 pass
         
+        strategy = request.args.get('strategy', 'random')  # random / adaptive（按掌握度加权）
+        if strategy not in ('random', 'adaptive'):
+            return jsonify({'error': '无效的出题策略'}), 400
+        
         with get_db() as conn:
-            # 构建查询
-            query = """
-                SELECT q.id, q.title, q.content, q.correct_answer, q.explanation,
-                       q.difficulty_level, q.tags, q.source,
-                       s.name as subject_name, qt.name as question_type_name
-                FROM questions q
-                JOIN subjects s ON q.subject_id = s.id
-                JOIN question_types qt ON q.question_type_id = qt.id
-                WHERE s.name = ?
-            """
-            params = [subject_name]
-            
+            bank = question_bank.get(conn, subject_name)
+            candidates = bank.with_tag(tag) if tag else bank.questions
             if excluded_question_ids:
-                placeholders = ','.join(['?'] * len(excluded_question_ids))
-                query += f" AND q.id NOT IN ({placeholders})"
-                params.extend(excluded_question_ids)
+                excluded = set(excluded_question_ids)
+                candidates = [q for q in candidates if q['id'] not in excluded]
             
-            query += " ORDER BY RANDOM()"
-            if limit > 0:
-                query += " LIMIT ?"
-                params.append(limit)
+            if strategy == 'adaptive':
+                user_id = get_jwt_identity()
+                user_conn = get_user_db(user_id, conn)
+                try:
+                    user_stats = load_user_stats(user_conn, user_id)
+                finally:
+                    close_user_dbs([user_conn], conn)
+                picked = adaptive_sample(candidates, user_stats, limit)
+            elif 0 < limit < len(candidates):
+                picked = random.sample(candidates, limit)
+            else:
+                picked = random.sample(candidates, len(candidates))
             
-            cursor = conn.execute(query, params)
-            questions = []
+            if ids_only:
+                return jsonify({
+                    'question_ids': [q['id'] for q in picked],
+                    'pack_version': question_packs.get(conn, bank).version,
+                    'total': len(picked)
+                }), 200
             
-            for row in cursor.fetchall():
-                # 获取题目的选项
-                options_cursor = conn.execute("""
-                    SELECT id, option_text, is_correct, option_order 
-                    FROM options 
-                    WHERE question_id = ? 
-                    ORDER BY RANDOM()
-                """, (row['id'],))
-                
-                options = []
-                correct_option = None
-                
-                for opt_row in options_cursor.fetchall():
-                    option = {
-                        'id': opt_row['id'],
-                        'text': opt_row['option_text'],
-                        'is_correct': bool(opt_row['is_correct'])
-                    }
-                    options.append(option)
-                    
-                    if option['is_correct']:
-                        correct_option = option
-                
-                import json
-                question = {
-                    'id': row['id'],
-                    'title': row['title'],
-                    'content': row['content'],
-                    'correct_answer': row['correct_answer'],
-                    'explanation': row['explanation'],
-                    'difficulty_level': row['difficulty_level'],
-                    'tags': json.loads(row['tags']) if row['tags'] else [],
-                    'source': row['source'],
-                    'subject_name': row['subject_name'],
-                    'question_type_name': row['question_type_name'],
-                    'options': options,
-                    'correct_option': correct_option
-                }
-                
+            questions = []
+            for cached in picked:
+                # 缓存的题目只读：按所选字段复制一份并打乱选项顺序
+                question = projection.project_question(cached, fields)
+                if 'options' in question:
+                    random.shuffle(question['options'])
                 questions.append(question)
             
             return jsonify({
@@ -386,13 +442,133 @@ def get_random_questions():
     except Exception as e:
         return jsonify({'error': f'服务器错误: {str(e)}'}), 500
 
+@app.route('/api/questions/<int:question_id>/explanation', methods=['GET'])
+@jwt_required()
+def get_question_explanation(question_id):
+    """按需获取详解（学习模式揭示答案后加载）：须在本人的答题记录 quiz_record_id 中已作答该题"""
+    try:
+        quiz_record_id = request.args.get('quiz_record_id', type=int)
+        if not quiz_record_id:
+            return jsonify({'error': '缺少答题记录ID'}), 400
+        
+        with get_user_db(get_jwt_identity()) as conn:
+            session = quiz_sessions.get(conn, quiz_record_id)
+            if not session or session.user_id != get_jwt_identity():
+                return jsonify({'error': '无效的答题记录'}), 403
+            if session.existing_answer(question_id) is None:
+                return jsonify({'error': '作答后才能查看详解'}), 403
+            
+            row = conn.execute("SELECT explanation FROM questions WHERE id = ?", (question_id,)).fetchone()
+            if not row:
+                return jsonify({'error': '题目不存在'}), 404
+            
+            return jsonify({
+                'question_id': question_id,
+                'explanation': row['explanation']
+            }), 200
+            
+    except Exception as e:
+        return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
+@app.route('/api/questions/<int:question_id>/stats', methods=['GET'])
+@jwt_required()
+def get_question_stats(question_id):
+    """获取题目统计（答题次数、一次答对率、中位用时、选项分布），读取增量维护的汇总表"""
+    try:
+        with get_db() as conn:
+            options = conn.execute(
+                "SELECT id, option_text, is_correct FROM options WHERE question_id = ? ORDER BY option_order",
+                (question_id,)
+            ).fetchall()
+            
+            if not options:
+                return jsonify({'error': '题目不存在'}), 404
+            
+            # 统计表随单题记录保存在各分片中（未分片时只有主库），逐项相加
+            stats = {'answers': 0, 'attempts': 0, 'first_try_correct': 0, 'total_time_taken': 0}
+            buckets = {}
+            picks = {}
+            user_conns = get_user_dbs(conn)
+            try:
+                for user_conn in user_conns:
+                    row = user_conn.execute(
+                        "SELECT answers, attempts, first_try_correct, total_time_taken FROM question_stats WHERE question_id = ?",
+                        (question_id,)
+                    ).fetchone()
+                    if row:
+                        for key in stats:
+                            stats[key] += row[key]
+                    for row in user_conn.execute(
+                        "SELECT bucket, answers FROM question_time_buckets WHERE question_id = ? AND answers > 0",
+                        (question_id,)
+                    ):
+                        buckets[row['bucket']] = buckets.get(row['bucket'], 0) + row['answers']
+                    for row in user_conn.execute(
+                        "SELECT option_id, picks FROM question_option_picks WHERE question_id = ?",
+                        (question_id,)
+                    ):
+                        picks[row['option_id']] = picks.get(row['option_id'], 0) + row['picks']
+            finally:
+                close_user_dbs(user_conns, conn)
+            
+            answers = stats['answers']
+            # 中位用时：取累计计数过半的用时分档的中点（每档 500 毫秒）
+            median_time = None
+            seen = 0
+            for bucket in sorted(buckets):
+                seen += buckets[bucket]
+                if seen * 2 >= answers:
+                    median_time = bucket * 500 + 250
+                    break
+            
+            return jsonify({
+                'question_id': question_id,
+                'answers': answers,
+                'attempts': stats['attempts'],
+                'first_try_correct_rate': round(stats['first_try_correct'] * 100.0 / answers, 2) if answers else None,
+                'avg_time_taken': round(stats['total_time_taken'] / answers) if answers else None,
+                'median_time_taken': median_time,
+                'options': [{
+                    'id': row['id'],
+                    'text': row['option_text'],
+                    'is_correct': bool(row['is_correct']),
+                    'picks': picks.get(row['id'], 0)
+                } for row in options]
+            }), 200
+            
+    except Exception as e:
+        return jsonify({'error': f'服务器错误: {str(e)}'}), 500
+
 # 注册API模块
+from services.instrumentation import init_instrumentation
+from services.maintenance import init_maintenance
+from services.warmup import init_warmup
 from api.quiz import register_quiz_routes
 from api.leaderboard import register_leaderboard_routes
+from api.groups import register_group_routes
+from api.export import register_export_routes
+from api.question_packs import register_question_pack_routes
+from api.battle import register_battle_routes
+
+# 请求结束时关闭其间打开的分片连接
+init_db(app)
+
+# 请求/SQL计时、N+1 检测与 /metrics
+init_instrumentation(app)
+
+# 数据库容量指标与可选的后台维护（检查点、optimize/ANALYZE、在线备份）
+init_maintenance(app)
 
 # 注册路由
 register_quiz_routes(app)
 register_leaderboard_routes(app)
+register_group_routes(app)
+register_export_routes(app)
+register_question_pack_routes(app)
+register_battle_routes(app)
+
+# /healthz、/readyz 与启动预热（题库与答案、热点索引、前端构建产物），预热完成后才就绪
+init_warmup(app, static_root=_dist_root)
 
 if __name__ == '__main__':
     # 检查数据库是否存在
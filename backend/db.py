@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库连接
+分片连接（get_user_db / get_user_dbs 在分片模式下打开）登记在应用上下文中，上下文结束时统一关闭；
+逐个分片循环的调用方用 close_user_dbs 在用完后立即关闭
+"""
+
+import sqlite3
+from flask import current_app, g
+
+from services.shards import router
+
+def _connect(path):
+    factory = current_app.config.get('DB_CONNECTION_FACTORY', sqlite3.Connection)
+    conn = sqlite3.connect(path, factory=factory)
+    conn.row_factory = sqlite3.Row  # 使查询结果可以像字典一样访问
+    return conn
+
+def get_db():
+    """获取数据库连接（路径取自 app.config['DATABASE_PATH']）"""
+    return _connect(current_app.config['DATABASE_PATH'])
+
+def get_user_db(user_id, conn=None):
+    """获取 user_id 的数据（答题记录、会话等）所在的连接
+
+    未启用分片时返回主库连接（传入 conn 时直接复用）；分片连接已附加主库，题库表可直接访问
+    """
+    if not router.enabled:
+        return conn if conn is not None else get_db()
+    return _connect_shard(router.path_for_user(user_id))
+
+def get_user_dbs(conn=None):
+    """保存用户数据的全部连接（排行榜、统计等跨分片汇总使用；未启用分片时只有主库）"""
+    if not router.enabled:
+        return [conn if conn is not None else get_db()]
+    return [_connect_shard(path) for path in router.shard_paths]
+
+def _connect_shard(path):
+    conn = router.attach_shared(_connect(path))
+    g.setdefault('shard_connections', []).append(conn)
+    return conn
+
+def close_user_dbs(conns, conn=None):
+    """关闭 get_user_db / get_user_dbs 打开的连接（其中复用的主库连接 conn 由调用方管理）"""
+    for user_conn in conns:
+        if user_conn is not conn:
+            user_conn.close()
+
+def close_shard_connections(exception=None):
+    """关闭本次请求（应用上下文）中打开的分片连接（已关闭的连接再次关闭无影响）"""
+    for conn in g.pop('shard_connections', ()):
+        conn.close()
+
+def init_db(app):
+    app.teardown_appcontext(close_shard_connections)
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+密码哈希（主应用与批量导入用户共用）
+"""
+
+import hashlib
+
+def hash_password(password):
+    """密码哈希"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def verify_password(password, hashed):
+    """验证密码"""
+    return hashlib.sha256(password.encode()).hexdigest() == hashed
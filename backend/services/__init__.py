@@ -0,0 +1 @@
+# 服务模块初始化文件（与路由无关的进程内组件）
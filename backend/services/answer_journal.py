@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单题作答日志（只追加）
+启用后提交答案只向 answer_events 追加一行（顺序插入，表上没有触发器），不再就地读改写 question_answers、
+用户累计、逐题统计与掌握度。压缩按 id 顺序分批读取日志，同一答题记录同一题目的事件先在内存中合并，
+再写入 question_answers（由原有触发器更新用户累计与逐题统计）并更新掌握度，已合并的事件在同一事务中删除。
+需要最新结果的读取合并日志尾部：重建活动会话时把未压缩的事件叠加到单题记录上，
+结束答题与自动结束放弃的答题先在各自的事务中压缩本轮的事件。不依赖 Flask
+"""
+
+import datetime
+
+from services import mastery
+
+DEFAULT_BATCH_SIZE = 2000
+DEFAULT_COMPACT_INTERVAL = 5  # 后台压缩间隔（秒）
+
+# 事件中的尝试次数与用时为本次提交的增量（首次作答为客户端给出的尝试次数，之后每次加 1）
+JOURNAL_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS answer_events (
+        id INTEGER PRIMARY KEY,
+        quiz_record_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        selected_option_id INTEGER,
+        is_correct BOOLEAN NOT NULL,
+        attempt_count INTEGER NOT NULL,
+        time_taken INTEGER,
+        answered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS idx_answer_events_quiz_record_id ON answer_events(quiz_record_id);
+"""
+
+def ensure_journal(conn):
+    """创建日志表（已存在时不变）"""
+    conn.executescript(JOURNAL_SCHEMA)
+
+def append_event(conn, quiz_record_id, user_id, question_id, selected_option_id, is_correct,
+                 attempt_count, time_taken):
+    """追加一次作答（由调用方提交）"""
+    conn.execute("""
+        INSERT INTO answer_events
+            (quiz_record_id, user_id, question_id, selected_option_id, is_correct, attempt_count, time_taken)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (quiz_record_id, user_id, question_id, selected_option_id, is_correct, attempt_count, time_taken))
+
+def _local_time(answered_at):
+    """日志中的 UTC 时间转换为本地时间（掌握度的复习时间按本地时间计算）"""
+    moment = datetime.datetime.fromisoformat(str(answered_at).replace(' ', 'T'))
+    return moment.replace(tzinfo=datetime.timezone.utc).astimezone().replace(tzinfo=None)
+
+def fold_events(conn, events):
+    """把一批事件（按 id 升序）写入 question_answers 与掌握度，返回涉及的单题记录数（由调用方提交）
+
+    与逐次提交的结果一致：新的单题记录以首次作答插入（插入触发器按首次结果累计用户答对数），
+    之后的事件合并为一次 UPDATE（更新触发器先减旧值再加新值）
+    """
+    mastery.record_answers(conn, ((user_id, question_id, is_correct, time_taken, _local_time(answered_at))
+                                  for _, _, user_id, question_id, _, is_correct, _, time_taken, answered_at in events))
+
+    first = {}  # (quiz_record_id, question_id) -> 首次作答的插入参数
+    later = {}  # (quiz_record_id, question_id) -> [selected_option_id, is_correct, 增加的尝试次数, 增加的用时]
+    for (_, quiz_record_id, _, question_id, selected_option_id, is_correct,
+         attempt_count, time_taken, answered_at) in events:
+        key = (quiz_record_id, question_id)
+        if key not in first:
+            first[key] = (quiz_record_id, question_id, selected_option_id, is_correct, attempt_count,
+                          time_taken, answered_at)
+            continue
+        update = later.setdefault(key, [None, None, 0, 0])
+        update[0], update[1] = selected_option_id, is_correct
+        update[2] += attempt_count
+        update[3] += time_taken or 0
+
+    quiz_record_ids = sorted({quiz_record_id for quiz_record_id, _ in first})
+    placeholders = ','.join('?' * len(quiz_record_ids))
+    existing = {tuple(row) for row in conn.execute(
+        f"SELECT quiz_record_id, question_id FROM question_answers WHERE quiz_record_id IN ({placeholders})",
+        quiz_record_ids
+    )}
+    for key in existing & first.keys():
+        # 已有单题记录：首次事件也作为更新合并
+        _, _, selected_option_id, is_correct, attempt_count, time_taken, _ = first.pop(key)
+        update = later.get(key)
+        if update is None:
+            later[key] = [selected_option_id, is_correct, attempt_count, time_taken or 0]
+        else:
+            update[2] += attempt_count
+            update[3] += time_taken or 0
+
+    conn.executemany("""
+        INSERT INTO question_answers
+        (quiz_record_id, question_id, selected_option_id, is_correct, attempt_count, time_taken, answered_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, first.values())
+    conn.executemany("""
+        UPDATE question_answers
+        SET selected_option_id = ?, is_correct = ?, attempt_count = attempt_count + ?,
+            time_taken = COALESCE(time_taken, 0) + ?
+        WHERE quiz_record_id = ? AND question_id = ?
+    """, [(selected_option_id, is_correct, attempt_count, time_taken) + key
+          for key, (selected_option_id, is_correct, attempt_count, time_taken) in later.items()])
+    return len(first.keys() | later.keys())
+
+_EVENT_COLUMNS = """id, quiz_record_id, user_id, question_id, selected_option_id, is_correct,
+                    attempt_count, time_taken, answered_at"""
+
+def compact_quizzes(conn, quiz_record_ids):
+    """压缩指定答题记录的全部事件，返回事件数（须在调用方已持有写锁的事务中调用，由调用方提交）"""
+    if not quiz_record_ids:
+        return 0
+    placeholders = ','.join('?' * len(quiz_record_ids))
+    events = conn.execute(
+        f"SELECT {_EVENT_COLUMNS} FROM answer_events WHERE quiz_record_id IN ({placeholders}) ORDER BY id",
+        list(quiz_record_ids)
+    ).fetchall()
+    if events:
+        fold_events(conn, events)
+        conn.execute(f"DELETE FROM answer_events WHERE quiz_record_id IN ({placeholders}) AND id <= ?",
+                     list(quiz_record_ids) + [events[-1][0]])
+    return len(events)
+
+def compact(conn, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """按 id 顺序分批压缩日志，每批一个事务，返回压缩的事件数"""
+    compacted = batches = 0
+    while max_batches is None or batches < max_batches:
+        # 显式开启事务：维护连接为自动提交模式；持有写锁期间不会有新事件插入到已读范围之前
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            events = conn.execute(
+                f"SELECT {_EVENT_COLUMNS} FROM answer_events ORDER BY id LIMIT ?", (batch_size,)
+            ).fetchall()
+            if events:
+                fold_events(conn, events)
+                conn.execute("DELETE FROM answer_events WHERE id <= ?", (events[-1][0],))
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        batches += 1
+        compacted += len(events)
+        if len(events) < batch_size:
+            break
+    return compacted
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单题记录冷热分离
+超过保留期的答题记录，其单题记录分批移入独立的归档库（同表结构、保留原ID），
+主库只保留近期数据；archived_quizzes 记录哪些答题记录已归档，查询时按需 ATTACH 归档库。
+移出的行不会触发统计触发器（均为 INSERT/UPDATE 触发），逐题统计与用户累计不受影响。
+不依赖 Flask，后端与命令行工具（database/archive_answers.py）共用
+"""
+
+import datetime
+import os
+import time
+
+ARCHIVE_ALIAS = 'archive'
+DEFAULT_RETENTION_DAYS = 180
+DEFAULT_BATCH_SIZE = 200  # 每个事务归档的答题记录数
+
+ARCHIVE_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS {ARCHIVE_ALIAS}.question_answers (
+        id INTEGER PRIMARY KEY,
+        quiz_record_id INTEGER NOT NULL,
+        question_id INTEGER NOT NULL,
+        selected_option_id INTEGER,
+        is_correct BOOLEAN NOT NULL,
+        attempt_count INTEGER DEFAULT 1,
+        time_taken INTEGER,
+        answered_at TIMESTAMP
+    );
+    CREATE INDEX IF NOT EXISTS {ARCHIVE_ALIAS}.idx_archive_question_answers_quiz_record_id
+        ON question_answers(quiz_record_id);
+"""
+
+ANSWER_COLUMNS = 'id, quiz_record_id, question_id, selected_option_id, is_correct, attempt_count, time_taken, answered_at'
+
+def default_archive_path(db_path):
+    """默认归档库路径：与主库同目录，如 quiz_app.db -> quiz_app.archive.db"""
+    root, ext = os.path.splitext(db_path)
+    return f'{root}.archive{ext or ".db"}'
+
+def attach_archive(conn, archive_path, create=False):
+    """附加归档库；归档库不存在且 create=False 时返回 False"""
+    attached = any(row[1] == ARCHIVE_ALIAS for row in conn.execute("PRAGMA database_list"))
+    if attached:
+        return True
+    if not create and not os.path.exists(archive_path):
+        return False
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS}", (archive_path,))
+    if create:
+        conn.executescript(ARCHIVE_SCHEMA)
+    return True
+
+def detach_archive(conn):
+    """分离归档库（已分离时忽略）"""
+    if any(row[1] == ARCHIVE_ALIAS for row in conn.execute("PRAGMA database_list")):
+        conn.execute(f"DETACH DATABASE {ARCHIVE_ALIAS}")
+
+def is_archived(conn, quiz_record_id):
+    """答题记录的单题记录是否已归档"""
+    cursor = conn.execute("SELECT 1 FROM archived_quizzes WHERE quiz_record_id = ?", (quiz_record_id,))
+    return cursor.fetchone() is not None
+
+def archive_old_answers(conn, archive_path, retention_days=DEFAULT_RETENTION_DAYS,
+                        batch_size=DEFAULT_BATCH_SIZE, max_batches=None, pause=0.0, log=print):
+    """把早于保留期、已完成的答题记录的单题记录移入归档库
+
+    每批 batch_size 条答题记录一个事务（复制 -> 删除 -> 登记），批间可暂停 pause 秒让出写锁；
+    中途中断后重新运行会从未登记的记录继续（复制使用 INSERT OR REPLACE，可重复执行）。
+    返回 (归档的答题记录数, 移出的单题记录数)
+    """
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=retention_days)).strftime('%Y-%m-%d %H:%M:%S')
+    attach_archive(conn, archive_path, create=True)
+    quizzes = moved = batches = 0
+    last_id = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            # 按主键从上一批之后顺序读取（+completed 使其不走 (completed, start_time) 索引，免去按 id 排序）；
+            # id 随时间递增，越过截止时间后只在最后一批读到表尾
+            ids = [row[0] for row in conn.execute("""
+                SELECT qr.id
+                FROM quiz_records qr
+                LEFT JOIN archived_quizzes a ON a.quiz_record_id = qr.id
+                WHERE qr.id > ? AND +qr.completed = TRUE AND qr.created_at < ?
+                  AND a.quiz_record_id IS NULL
+                ORDER BY qr.id
+                LIMIT ?
+            """, (last_id, cutoff, batch_size))]
+            if not ids:
+                break
+            last_id = ids[-1]
+            placeholders = ','.join('?' * len(ids))
+            with conn:
+                conn.execute(f"""
+                    INSERT OR REPLACE INTO {ARCHIVE_ALIAS}.question_answers ({ANSWER_COLUMNS})
+                    SELECT {ANSWER_COLUMNS} FROM main.question_answers WHERE quiz_record_id IN ({placeholders})
+                """, ids)
+                cursor = conn.execute(
+                    f"DELETE FROM main.question_answers WHERE quiz_record_id IN ({placeholders})", ids
+                )
+                moved += cursor.rowcount
+                conn.executemany(
+                    "INSERT INTO archived_quizzes (quiz_record_id) VALUES (?)",
+                    [(quiz_id,) for quiz_id in ids]
+                )
+            quizzes += len(ids)
+            batches += 1
+            log(f"已归档 {quizzes} 条答题记录，移出 {moved} 条单题记录")
+            if pause:
+                time.sleep(pause)
+    finally:
+        detach_archive(conn)
+    return quizzes, moved
+
+def incremental_vacuum(conn, max_pages=None):
+    """归还空闲页给文件系统（需要 auto_vacuum=INCREMENTAL），返回归还前的空闲页数
+
+    max_pages 为 None 时归还全部空闲页
+    """
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return freelist
+    # 通过 sqlite3 模块的 execute 只会执行一步（归还一页），executescript 才会执行到底
+    if max_pages is None:
+        conn.executescript("PRAGMA incremental_vacuum;")
+    else:
+        conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+    return freelist
+
+def enable_incremental_vacuum(conn):
+    """把已有数据库转换为 auto_vacuum=INCREMENTAL（需要一次完整 VACUUM，期间独占数据库）"""
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
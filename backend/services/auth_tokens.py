@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+访问令牌与轮换刷新令牌
+登录时创建一条 user_sessions 记录（一个登录会话），签发短期访问令牌与长期刷新令牌，两者都带会话ID（sid）；
+user_sessions.token_jti 保存该会话当前有效的刷新令牌。刷新时用一条按主键的条件 UPDATE 轮换刷新令牌，
+已被轮换过的旧刷新令牌再次出现（被窃取后重放）时整个会话被注销。
+新 jti 由旧 jti 确定地派生（uuid5），轮换后 grace_seconds 秒内再次出示上一个刷新令牌（多个标签页同时刷新、
+刷新响应丢失后重试）时返回同一个当前令牌，而不是注销会话；轮换时刻由 expires_at 减去刷新令牌有效期得到。
+访问令牌的校验只查进程内的会话状态缓存，每个会话最多每 recheck_seconds 秒查一次数据库
+"""
+
+import datetime
+import threading
+import time
+import uuid
+
+from flask_jwt_extended import create_access_token, create_refresh_token
+
+DEFAULT_RECHECK_SECONDS = 30  # 会话状态缓存的有效期（秒），注销在其他进程中最迟于此生效
+DEFAULT_MAX_ENTRIES = 100000
+DEFAULT_GRACE_SECONDS = 30  # 轮换后仍接受上一个刷新令牌的秒数
+
+# 派生下一个 jti 的命名空间（jti 不是秘密：没有签名密钥无法伪造令牌）
+ROTATION_NAMESPACE = uuid.UUID('6f1c2a4e-8d3b-4f5a-9c7e-2b1d0e9a8f61')
+
+# 刷新结果
+ROTATED = 'rotated'
+REUSED = 'reused'
+REVOKED = 'revoked'
+
+def _expires_at(delta):
+    """与 SQLite datetime('now') 同格式的 UTC 过期时间，供清理过期会话的触发器比较"""
+    return (datetime.datetime.now(datetime.timezone.utc) + delta).strftime('%Y-%m-%d %H:%M:%S')
+
+def next_jti(refresh_jti):
+    """轮换后的刷新令牌 jti（由上一个 jti 确定，同一令牌的重复刷新得到同一个新令牌）"""
+    return str(uuid.uuid5(ROTATION_NAMESPACE, refresh_jti))
+
+def _rotated_within(expires_at, refresh_expires, grace_seconds):
+    """会话最近一次轮换（expires_at - 有效期）是否在 grace_seconds 秒内"""
+    expires = datetime.datetime.strptime(str(expires_at), '%Y-%m-%d %H:%M:%S').replace(tzinfo=datetime.timezone.utc)
+    elapsed = datetime.datetime.now(datetime.timezone.utc) - (expires - refresh_expires)
+    return elapsed.total_seconds() <= grace_seconds
+
+def issue_tokens(user_id, session_id, refresh_jti):
+    """签发访问令牌与刷新令牌（需在应用上下文中调用）"""
+    claims = {'sid': session_id}
+    return {
+        'access_token': create_access_token(identity=user_id, additional_claims=claims),
+        'refresh_token': create_refresh_token(identity=user_id, additional_claims=dict(claims, jti=refresh_jti)),
+    }
+
+def start_session(conn, user_id, refresh_expires):
+    """创建登录会话，返回 (会话ID, 刷新令牌 jti)；由调用方提交"""
+    refresh_jti = str(uuid.uuid4())
+    session_id = conn.execute(
+        "INSERT INTO user_sessions (user_id, token_jti, expires_at) VALUES (?, ?, ?) RETURNING id",
+        (user_id, refresh_jti, _expires_at(refresh_expires))
+    ).fetchone()[0]
+    return session_id, refresh_jti
+
+def rotate_refresh_token(conn, session_id, refresh_jti, refresh_expires, grace_seconds=DEFAULT_GRACE_SECONDS):
+    """用当前刷新令牌换取新的刷新令牌 jti，返回 (结果, 新 jti)
+
+    结果为 ROTATED 时已提交（出示的是刚被轮换的上一个令牌且仍在宽限期内时，返回当前 jti 而不再轮换）；
+    REUSED 表示出示的是已轮换过的旧令牌，会话随即被注销；REVOKED 表示会话已注销或不存在
+    """
+    new_jti = next_jti(refresh_jti)
+    cursor = conn.execute(
+        "UPDATE user_sessions SET token_jti = ?, expires_at = ? WHERE id = ? AND token_jti = ? AND is_active",
+        (new_jti, _expires_at(refresh_expires), session_id, refresh_jti)
+    )
+    if cursor.rowcount == 1:
+        conn.commit()
+        return ROTATED, new_jti
+    session = conn.execute(
+        "SELECT is_active, token_jti, expires_at FROM user_sessions WHERE id = ?", (session_id,)
+    ).fetchone()
+    if session is None or not session['is_active']:
+        return REVOKED, None
+    if session['token_jti'] == new_jti and _rotated_within(session['expires_at'], refresh_expires, grace_seconds):
+        return ROTATED, new_jti
+    revoke_session(conn, session_id)
+    return REUSED, None
+
+def revoke_session(conn, session_id):
+    """注销会话（之后该会话的访问令牌与刷新令牌都失效）"""
+    conn.execute("UPDATE user_sessions SET is_active = FALSE WHERE id = ?", (session_id,))
+    conn.commit()
+    session_status.forget(session_id)
+
+class SessionStatusCache:
+    """会话是否有效的进程内缓存：session_id -> (是否有效, 查询时刻)"""
+
+    def __init__(self, recheck_seconds=DEFAULT_RECHECK_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.recheck_seconds = recheck_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def is_active(self, session_id, load):
+        """会话是否有效；缓存过期或未命中时调用 load(session_id) 查询数据库"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(session_id)
+        if entry is not None and now - entry[1] < self.recheck_seconds:
+            return entry[0]
+        active = bool(load(session_id))
+        if self.recheck_seconds > 0:
+            with self.lock:
+                if len(self.entries) >= self.max_entries:
+                    self.entries.clear()
+                self.entries[session_id] = (active, now)
+        return active
+
+    def forget(self, session_id):
+        """本进程注销会话后立即生效（其他进程等待缓存过期）"""
+        with self.lock:
+            self.entries[session_id] = (False, time.monotonic())
+
+def load_session_active(conn, session_id):
+    row = conn.execute("SELECT is_active FROM user_sessions WHERE id = ?", (session_id,)).fetchone()
+    return row is not None and bool(row['is_active'])
+
+# 全局会话状态缓存（每个进程一份）
+session_status = SessionStatusCache()
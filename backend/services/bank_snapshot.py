@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+题库二进制快照
+导入题目（及难度校准）后把全部题库写成一个带版本的紧凑二进制文件：
+字符串表（偏移索引 + UTF-8 数据）、定长的学科 / 题目 / 选项记录、题目标签与标签倒排表。
+各工作进程以只读 mmap 打开同一个文件，页面由操作系统在进程间共享；
+题目按需从映射中解码，不再在每个进程里常驻一份题库字典，增加进程几乎不增加内存。
+快照头记录生成时题库的修订号（bank_revision，由题目 / 选项表上的触发器递增），
+与数据库不一致（题库在生成快照后被修改过）时不使用快照。
+不依赖 Flask，后端与导入 / 校准工具共用
+
+文件布局（小端）：
+    头部 HEADER，之后为 SECTIONS 中各段，每段的偏移与条目数记录在头部的段表中
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import sqlite3
+import struct
+from collections.abc import Mapping, Sequence
+
+MAGIC = b'QQBK'
+FORMAT_VERSION = 1
+NONE = 0xFFFFFFFF  # 字符串ID / 数值为空
+NO_REVISION = 0xFFFFFFFFFFFFFFFF  # 数据库没有修订号（未应用扩展架构），快照永远视为过期
+
+SECTIONS = ('string_offsets', 'string_data', 'subjects', 'questions', 'options', 'question_tags', 'tags', 'postings')
+
+# 头部：魔数、格式版本、保留、内容哈希、题库修订号、段表（各段偏移与条目数）
+HEADER = struct.Struct('<4sHH16sQ' + 'II' * len(SECTIONS))
+U32 = struct.Struct('<I')
+# 学科：名称、题目起始下标、题目数
+SUBJECT = struct.Struct('<III')
+# 题目：ID、标题、题干、正确答案、详解、来源、学科名、题型名（均为字符串ID）、
+#       选项起始下标、标签起始下标、选项数、标签数、难度（-1 为空）、保留
+QUESTION = struct.Struct('<IIIIIIIIIIHHhH')
+# 选项：ID、文本（字符串ID）、是否正确
+OPTION = struct.Struct('<IIB3x')
+# 标签：名称（字符串ID）、倒排表起始下标、题目数
+TAG = struct.Struct('<III')
+
+QUESTION_FIELDS = ('id', 'title', 'content', 'correct_answer', 'explanation', 'difficulty_level', 'tags', 'source',
+                   'subject_name', 'question_type_name', 'options', 'correct_option')
+
+def default_snapshot_path(db_path):
+    """默认快照路径：与主库同目录，如 quiz_app.db -> quiz_app.bank"""
+    return f'{os.path.splitext(db_path)[0]}.bank'
+
+def bank_revision(conn):
+    """题库修订号（题目或选项的任何增删改都会使其递增），没有修订号表时返回 None"""
+    try:
+        row = conn.execute("SELECT revision FROM bank_revision WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+# =============================================================================
+# 写入
+# =============================================================================
+
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.data = bytearray()
+        self.offsets = [0]
+
+    def add(self, text):
+        if text is None:
+            return NONE
+        sid = self.ids.get(text)
+        if sid is None:
+            sid = self.ids[text] = len(self.offsets) - 1
+            self.data += text.encode('utf-8')
+            self.offsets.append(len(self.data))
+        return sid
+
+def build_snapshot(conn):
+    """从数据库生成快照内容（bytes）"""
+    revision = bank_revision(conn)
+    strings = _StringTable()
+
+    rows = conn.execute("""
+        SELECT q.id, q.title, q.content, q.correct_answer, q.explanation, q.difficulty_level, q.tags, q.source,
+               s.name as subject_name, qt.name as question_type_name
+        FROM questions q
+        JOIN subjects s ON q.subject_id = s.id
+        JOIN question_types qt ON q.question_type_id = qt.id
+        ORDER BY s.name, q.id
+    """).fetchall()
+    options_by_question = {}
+    # 以题目为外层循环，按 (question_id, option_order) 索引逐题取出已排好序的选项
+    for row in conn.execute("""
+        SELECT o.id, o.question_id, o.option_text, o.is_correct
+        FROM questions q
+        CROSS JOIN options o
+        WHERE o.question_id = q.id
+        ORDER BY q.id, o.option_order
+    """):
+        options_by_question.setdefault(row[1], []).append((row[0], row[2], row[3]))
+
+    subjects, questions, options, question_tags = [], bytearray(), bytearray(), bytearray()
+    tag_index, tag_postings = {}, []
+    for index, row in enumerate(rows):
+        (question_id, title, content, correct_answer, explanation, difficulty, tags_json, source,
+         subject_name, type_name) = row
+        if not subjects or subjects[-1][0] != subject_name:
+            subjects.append([subject_name, index, 0])
+        subjects[-1][2] += 1
+
+        question_options = options_by_question.get(question_id, [])
+        option_start = len(options) // OPTION.size
+        for option_id, text, is_correct in question_options:
+            options += OPTION.pack(option_id, strings.add(text), 1 if is_correct else 0)
+
+        tags = json.loads(tags_json) if tags_json else []
+        tag_start = len(question_tags) // U32.size
+        for tag in tags:
+            if tag not in tag_index:
+                tag_index[tag] = len(tag_postings)
+                tag_postings.append([])
+            if not tag_postings[tag_index[tag]] or tag_postings[tag_index[tag]][-1] != index:
+                tag_postings[tag_index[tag]].append(index)
+            question_tags += U32.pack(tag_index[tag])
+
+        questions += QUESTION.pack(
+            question_id, strings.add(title), strings.add(content), strings.add(correct_answer),
+            strings.add(explanation), strings.add(source), strings.add(subject_name), strings.add(type_name),
+            option_start, tag_start, len(question_options), len(tags),
+            -1 if difficulty is None else difficulty, 0,
+        )
+
+    subject_records = b''.join(SUBJECT.pack(strings.add(name), start, count) for name, start, count in subjects)
+    tag_records, postings = bytearray(), bytearray()
+    for tag, position in tag_index.items():
+        tag_records += TAG.pack(strings.add(tag), len(postings) // U32.size, len(tag_postings[position]))
+        postings += b''.join(U32.pack(i) for i in tag_postings[position])
+
+    sections = {
+        'string_offsets': (b''.join(U32.pack(offset) for offset in strings.offsets), len(strings.offsets)),
+        'string_data': (bytes(strings.data), len(strings.data)),
+        'subjects': (subject_records, len(subjects)),
+        'questions': (bytes(questions), len(rows)),
+        'options': (bytes(options), len(options) // OPTION.size),
+        'question_tags': (bytes(question_tags), len(question_tags) // U32.size),
+        'tags': (bytes(tag_records), len(tag_index)),
+        'postings': (bytes(postings), len(postings) // U32.size),
+    }
+    body, table, offset = bytearray(), [], HEADER.size
+    for name in SECTIONS:
+        data, count = sections[name]
+        # 各段按 4 字节对齐
+        padding = -offset % 4
+        body += b'\0' * padding
+        offset += padding
+        table += [offset, count]
+        body += data
+        offset += len(data)
+    content_hash = hashlib.sha256(bytes(body)).digest()[:16]
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, 0, content_hash,
+                         NO_REVISION if revision is None else revision, *table)
+    return header + bytes(body)
+
+def write_snapshot(conn, path):
+    """生成快照并原子替换到 path（已映射旧文件的进程不受影响），返回快照版本"""
+    data = build_snapshot(conn)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return HEADER.unpack_from(data)[3].hex()
+
+# =============================================================================
+# 读取
+# =============================================================================
+
+class BankSnapshot:
+    """只读映射的题库快照"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = HEADER.unpack_from(self.buffer)
+        magic, format_version, _, content_hash, revision = header[:5]
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            self.buffer.close()
+            raise ValueError(f'不支持的题库快照格式: {magic!r} v{format_version}')
+        self.version = content_hash.hex()
+        self.revision = None if revision == NO_REVISION else revision
+        table = header[5:]
+        self.sections = {name: (table[2 * i], table[2 * i + 1]) for i, name in enumerate(SECTIONS)}
+        self._string_base = self.sections['string_data'][0]
+        self.subjects = {}
+        offset, count = self.sections['subjects']
+        for i in range(count):
+            name_sid, start, total = SUBJECT.unpack_from(self.buffer, offset + i * SUBJECT.size)
+            self.subjects[self.string(name_sid)] = SnapshotSubjectBank(self, self.string(name_sid), start, total)
+        offset, count = self.sections['tags']
+        self.tags = {}
+        for i in range(count):
+            name_sid, start, total = TAG.unpack_from(self.buffer, offset + i * TAG.size)
+            self.tags[self.string(name_sid)] = (start, total)
+
+    def close(self):
+        self.buffer.close()
+
+    def string(self, sid):
+        """按字符串ID解码（NONE 为 None）"""
+        if sid == NONE:
+            return None
+        offsets = self.sections['string_offsets'][0]
+        start, end = struct.unpack_from('<II', self.buffer, offsets + sid * U32.size)
+        return self.buffer[self._string_base + start:self._string_base + end].decode('utf-8')
+
+    def question_record(self, index):
+        return QUESTION.unpack_from(self.buffer, self.sections['questions'][0] + index * QUESTION.size)
+
+    def question_id(self, index):
+        return U32.unpack_from(self.buffer, self.sections['questions'][0] + index * QUESTION.size)[0]
+
+    def options(self, start, count):
+        base = self.sections['options'][0]
+        return [
+            {'id': option_id, 'text': self.string(text_sid), 'is_correct': bool(is_correct)}
+            for option_id, text_sid, is_correct in (
+                OPTION.unpack_from(self.buffer, base + (start + i) * OPTION.size) for i in range(count)
+            )
+        ]
+
+    def question_tags(self, start, count):
+        base = self.sections['question_tags'][0]
+        tag_base = self.sections['tags'][0]
+        return [
+            self.string(TAG.unpack_from(self.buffer, tag_base + U32.unpack_from(self.buffer, base + (start + i) * 4)[0]
+                                        * TAG.size)[0])
+            for i in range(count)
+        ]
+
+    def tag_postings(self, tag):
+        """带有该标签的题目下标（全局，升序）"""
+        start, count = self.tags.get(tag, (0, 0))
+        base = self.sections['postings'][0]
+        return struct.unpack_from(f'<{count}I', self.buffer, base + start * U32.size) if count else ()
+
+    def subject(self, subject_name):
+        """学科题库视图，学科不存在时返回空视图"""
+        return self.subjects.get(subject_name) or SnapshotSubjectBank(self, subject_name, 0, 0)
+
+class QuestionView(Mapping):
+    """快照中的一道题目：按字段按需解码，用法同题库缓存中的题目字典"""
+
+    __slots__ = ('snapshot', 'index')
+
+    def __init__(self, snapshot, index):
+        self.snapshot = snapshot
+        self.index = index
+
+    def __getitem__(self, key):
+        if key == 'id':
+            return self.snapshot.question_id(self.index)
+        record = self.snapshot.question_record(self.index)
+        (question_id, title, content, correct_answer, explanation, source, subject_name, type_name,
+         option_start, tag_start, option_count, tag_count, difficulty, _) = record
+        if key == 'options':
+            return self.snapshot.options(option_start, option_count)
+        if key == 'correct_option':
+            return next((o for o in self.snapshot.options(option_start, option_count) if o['is_correct']), None)
+        if key == 'tags':
+            return self.snapshot.question_tags(tag_start, tag_count)
+        if key == 'difficulty_level':
+            return None if difficulty < 0 else difficulty
+        sids = {'title': title, 'content': content, 'correct_answer': correct_answer, 'explanation': explanation,
+                'source': source, 'subject_name': subject_name, 'question_type_name': type_name}
+        if key not in sids:
+            raise KeyError(key)
+        return self.snapshot.string(sids[key])
+
+    def __iter__(self):
+        return iter(QUESTION_FIELDS)
+
+    def __len__(self):
+        return len(QUESTION_FIELDS)
+
+    def to_dict(self):
+        """一次解码全部字段（correct_option 与 options 中的对应项为同一对象）"""
+        record = self.snapshot.question_record(self.index)
+        (question_id, title, content, correct_answer, explanation, source, subject_name, type_name,
+         option_start, tag_start, option_count, tag_count, difficulty, _) = record
+        string = self.snapshot.string
+        options = self.snapshot.options(option_start, option_count)
+        return {
+            'id': question_id,
+            'title': string(title),
+            'content': string(content),
+            'correct_answer': string(correct_answer),
+            'explanation': string(explanation),
+            'difficulty_level': None if difficulty < 0 else difficulty,
+            'tags': self.snapshot.question_tags(tag_start, tag_count),
+            'source': string(source),
+            'subject_name': string(subject_name),
+            'question_type_name': string(type_name),
+            'options': options,
+            'correct_option': next((o for o in options if o['is_correct']), None),
+        }
+
+class _QuestionSequence(Sequence):
+    """学科内题目的惰性序列（按题目ID升序）"""
+
+    __slots__ = ('snapshot', 'start', 'count')
+
+    def __init__(self, snapshot, start, count):
+        self.snapshot = snapshot
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.count))]
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return QuestionView(self.snapshot, self.start + i)
+
+class _QuestionIndex(Mapping):
+    """题目ID -> QuestionView（在学科范围内二分查找）"""
+
+    __slots__ = ('snapshot', 'start', 'count')
+
+    def __init__(self, snapshot, start, count):
+        self.snapshot = snapshot
+        self.start = start
+        self.count = count
+
+    def __getitem__(self, question_id):
+        lo, hi = self.start, self.start + self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.snapshot.question_id(mid) < question_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.start + self.count and self.snapshot.question_id(lo) == question_id:
+            return QuestionView(self.snapshot, lo)
+        raise KeyError(question_id)
+
+    def __iter__(self):
+        return (self.snapshot.question_id(i) for i in range(self.start, self.start + self.count))
+
+    def __len__(self):
+        return self.count
+
+class SnapshotSubjectBank:
+    """快照中的一个学科，接口同 SubjectBank（questions / by_id），另支持按标签取题"""
+
+    def __init__(self, snapshot, subject_name, start, count):
+        self.subject_name = subject_name
+        self.snapshot = snapshot
+        self.start = start
+        self.count = count
+        self.questions = _QuestionSequence(snapshot, start, count)
+        self.by_id = _QuestionIndex(snapshot, start, count)
+
+    def with_tag(self, tag):
+        """本学科中带有该标签的题目（倒排表按下标升序，直接截取本学科的范围）"""
+        end = self.start + self.count
+        return [QuestionView(self.snapshot, i) for i in self.snapshot.tag_postings(tag) if self.start <= i < end]
+
+def open_snapshot(path):
+    """打开快照，文件不存在或格式不符时返回 None"""
+    try:
+        return BankSnapshot(path)
+    except (OSError, ValueError, struct.error):
+        return None
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多人对战房间（进程内）
+房间状态、共享的题目顺序、答案与比分全部在内存中：作答按建房时从题库缓存取出的答案表判分，
+对战过程不读写数据库，只在结束时由回调把每位玩家的成绩写成一条 battle 模式的答题记录。
+所有房间的计时由一个后台线程中的 asyncio 事件循环驱动（每个进行中的房间一个协程，
+超时或全员作答后揭晓并进入下一题），事件序列化一次后经发布/订阅中心推送给房间内的 SSE 连接。
+单个进程可同时承载数百个房间；房间只存在于创建它的进程中，多进程部署需按房间号粘性路由。不依赖 Flask
+"""
+
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from services.pubsub import hub, sse_frame
+
+MIN_PLAYERS = 2
+MAX_PLAYERS = 30
+DEFAULT_QUESTION_COUNT = 10
+MAX_QUESTION_COUNT = 50
+DEFAULT_TIME_LIMIT = 15  # 每题作答时限（秒）
+MIN_TIME_LIMIT, MAX_TIME_LIMIT = 5, 120
+DEFAULT_REVEAL_SECONDS = 3  # 揭晓答案后进入下一题前的停留秒数
+DEFAULT_MAX_ROOMS = 500
+DEFAULT_MAX_STREAMS = 600  # 对战房间 SSE 连接数上限（每个连接占用一个工作线程）
+DEFAULT_IDLE_TIMEOUT = 1800  # 等待中的房间无人操作超过该秒数即关闭
+DEFAULT_FINISHED_TTL = 300  # 结束后保留房间（供查询最终比分）的秒数
+BASE_POINTS = 500  # 答对的基础分
+SPEED_POINTS = 500  # 按剩余时间比例追加的速度分
+
+ROOM_CODE_ALPHABET = '23456789ABCDEFGHJKLMNPQRSTUVWXYZ'  # 去掉易混淆的 0/O、1/I
+ROOM_CODE_LENGTH = 6
+
+WAITING, RUNNING, FINISHED, CLOSED = 'waiting', 'running', 'finished', 'closed'
+
+# 旧库中 quiz_records.mode 的约束（新库的架构已包含 battle）
+_OLD_MODE_CHECK = re.compile(r"CHECK\s*\(\s*mode\s+IN\s*\(\s*'speed'\s*,\s*'study'\s*\)\s*\)", re.IGNORECASE)
+MODE_CHECK = "CHECK (mode IN ('speed', 'study', 'battle'))"
+
+def ensure_battle_mode(conn):
+    """允许 quiz_records.mode 为 battle，返回是否修改了架构（conn 须为自动提交模式）
+
+    放宽 CHECK 约束不影响已有数据与文件格式，按 SQLite 文档的简化流程直接改写表定义，不重建表
+    """
+    row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'quiz_records'").fetchone()
+    if row is None or "'battle'" in row[0]:
+        return False
+    sql, replaced = _OLD_MODE_CHECK.subn(MODE_CHECK, row[0])
+    if replaced != 1:
+        raise RuntimeError('无法识别 quiz_records.mode 的约束，请手动迁移以允许 battle 模式')
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        conn.execute("PRAGMA writable_schema = ON")
+        conn.execute("UPDATE sqlite_master SET sql = ? WHERE type = 'table' AND name = 'quiz_records'", (sql,))
+        conn.execute(f"PRAGMA schema_version = {version + 1}")
+        conn.execute("PRAGMA writable_schema = OFF")
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+class BattleError(Exception):
+    """对战操作失败（status 为对应的 HTTP 状态码）"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+class Player:
+    __slots__ = ('user_id', 'username', 'score', 'correct', 'time_taken', 'answers', 'left')
+
+    def __init__(self, user_id, username):
+        self.user_id = user_id
+        self.username = username
+        self.score = 0
+        self.correct = 0
+        self.time_taken = 0  # 答对题目的累计用时（毫秒），同分时用时少者在前
+        self.answers = {}  # 题目序号 -> (选项ID, 是否正确, 得分)
+        self.left = False
+
+class BattleRoom:
+    """一个对战房间；除 code 等只读字段外，读写都须持有 lock"""
+
+    def __init__(self, code, host_id, subject, questions, answer_key, time_limit):
+        self.code = code
+        self.host_id = host_id
+        self.subject = subject
+        self.questions = questions  # 下发给玩家的题目（不含答案），所有玩家顺序相同
+        self.answer_key = answer_key  # 题目ID -> (正确选项ID, 详解)
+        self.time_limit = time_limit
+        self.lock = threading.Lock()
+        self.players = {}  # user_id -> Player（按加入顺序）
+        self.state = WAITING
+        self.index = -1  # 当前题目序号
+        self.accepting = False  # 当前题目是否仍接受作答
+        self.round_started = None  # 当前题目开始的时刻（monotonic）
+        self.round_done = None  # 全员作答时置位的 asyncio.Event（由事件循环线程创建）
+        self.version = 0  # 事件序号，即 SSE 的 id
+        self.started_at = None
+        self.finished_at = None
+        self.last_activity = time.monotonic()
+
+    @property
+    def topic(self):
+        return f'battle:{self.code}'
+
+    @property
+    def closed(self):
+        return self.state in (FINISHED, CLOSED)
+
+    def active_players(self):
+        return [player for player in self.players.values() if not player.left]
+
+    def scoreboard(self):
+        ranked = sorted(self.players.values(), key=lambda p: (-p.score, -p.correct, p.time_taken))
+        return [{
+            'rank': rank,
+            'user_id': player.user_id,
+            'username': player.username,
+            'score': player.score,
+            'correct_answers': player.correct,
+            'left': player.left,
+        } for rank, player in enumerate(ranked, 1)]
+
+    def current_question(self):
+        """当前题目及剩余毫秒数（未在作答阶段时为 None）"""
+        if not self.accepting:
+            return None
+        remaining = self.time_limit - (time.monotonic() - self.round_started)
+        return {
+            'index': self.index,
+            'question': self.questions[self.index],
+            'remaining_ms': max(0, int(remaining * 1000)),
+        }
+
+    def snapshot(self):
+        """完整状态（新连接与落后的订阅者重新同步时发送）"""
+        return {
+            'code': self.code,
+            'host_id': self.host_id,
+            'subject': self.subject,
+            'state': self.state,
+            'time_limit': self.time_limit,
+            'question_count': len(self.questions),
+            'index': self.index,
+            'current': self.current_question(),
+            'answered': [player.user_id for player in self.players.values() if self.index in player.answers],
+            'players': self.scoreboard(),
+            'version': self.version,
+        }
+
+    def results(self):
+        """每位玩家的最终成绩：(user_id, 开始时间, 结束时间, 题目数, 答对数, 用时秒数)"""
+        time_spent = int((self.finished_at - self.started_at).total_seconds())
+        return [(player.user_id, self.started_at, self.finished_at, len(self.questions), player.correct, time_spent)
+                for player in self.players.values()]
+
+def pick_questions(bank, count, tag=None):
+    """从学科题库中随机抽题，返回 (下发的题目, 答案表)；选项顺序打乱一次，所有玩家相同"""
+    candidates = [q for q in (bank.with_tag(tag) if tag else bank.questions) if q['correct_option'] is not None]
+    picked = random.sample(candidates, min(count, len(candidates)))
+    questions, answer_key = [], {}
+    for question in picked:
+        options = [{'id': option['id'], 'text': option['text']} for option in question['options']]
+        random.shuffle(options)
+        questions.append({'id': question['id'], 'title': question['title'], 'content': question['content'],
+                          'options': options})
+        answer_key[question['id']] = (question['correct_option']['id'], question['explanation'])
+    return questions, answer_key
+
+class BattleEngine:
+    """管理本进程的全部房间
+
+    on_finished(room) 在对战结束后由单独的写入线程依次调用（保存成绩）：不阻塞事件循环，
+    大量房间同时结束时也不会彼此争抢数据库写锁
+    """
+
+    def __init__(self, hub, max_rooms=DEFAULT_MAX_ROOMS, reveal_seconds=DEFAULT_REVEAL_SECONDS,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT, finished_ttl=DEFAULT_FINISHED_TTL, on_finished=None):
+        self.hub = hub
+        self.max_rooms = max_rooms
+        self.reveal_seconds = reveal_seconds
+        self.idle_timeout = idle_timeout
+        self.finished_ttl = finished_ttl
+        self.on_finished = on_finished
+        self.lock = threading.Lock()
+        self.rooms = {}  # code -> BattleRoom
+        self.loop = None
+        self.pid = None
+        self.writer = None
+
+    # ------------------------------------------------------------------
+    # 事件循环
+    # ------------------------------------------------------------------
+
+    def _event_loop(self):
+        """后台事件循环（首次使用时启动；fork 出的子进程重新启动自己的循环）"""
+        with self.lock:
+            if self.loop is None or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.loop = asyncio.new_event_loop()
+                self.writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='battle-results')
+                threading.Thread(target=self._run_loop, args=(self.loop,), name='battle-rooms',
+                                 daemon=True).start()
+            return self.loop
+
+    def _run_loop(self, loop):
+        asyncio.set_event_loop(loop)
+        loop.create_task(self._sweep_idle())
+        loop.run_forever()
+
+    async def _sweep_idle(self):
+        """定期关闭长时间无人操作的等待中房间"""
+        while True:
+            await asyncio.sleep(60)
+            now = time.monotonic()
+            with self.lock:
+                idle = [room for room in self.rooms.values()
+                        if room.state == WAITING and now - room.last_activity > self.idle_timeout]
+            for room in idle:
+                with room.lock:
+                    if room.state != WAITING:
+                        continue
+                    room.state = CLOSED
+                    self._publish(room, 'closed', {'reason': 'idle'})
+                self._remove(room)
+
+    async def _play(self, room):
+        """进行一场对战：逐题开放作答，时限到或全员作答后揭晓，最后结算"""
+        loop = asyncio.get_running_loop()
+        try:
+            for index in range(len(room.questions)):
+                with room.lock:
+                    if not room.active_players():
+                        break
+                    room.round_done = asyncio.Event()
+                    self._open_round(room, index)
+                    done = room.round_done
+                try:
+                    await asyncio.wait_for(done.wait(), room.time_limit)
+                except asyncio.TimeoutError:
+                    pass
+                with room.lock:
+                    self._reveal(room, index)
+                await asyncio.sleep(self.reveal_seconds)
+            with room.lock:
+                room.state = FINISHED
+                room.accepting = False
+                room.finished_at = datetime.datetime.now()
+                self._publish(room, 'finished', {'players': room.scoreboard()})
+            if self.on_finished is not None:
+                loop.run_in_executor(self.writer, self.on_finished, room)
+            await asyncio.sleep(self.finished_ttl)
+        finally:
+            self._remove(room)
+
+    def _open_round(self, room, index):
+        room.index = index
+        room.accepting = True
+        room.round_started = time.monotonic()
+        self._publish(room, 'question', room.current_question())
+
+    def _reveal(self, room, index):
+        room.accepting = False
+        question_id = room.questions[index]['id']
+        correct_option_id, explanation = room.answer_key[question_id]
+        self._publish(room, 'reveal', {
+            'index': index,
+            'question_id': question_id,
+            'correct_option_id': correct_option_id,
+            'explanation': explanation,
+            'players': room.scoreboard(),
+        })
+
+    # ------------------------------------------------------------------
+    # 事件推送
+    # ------------------------------------------------------------------
+
+    def _publish(self, room, event, data):
+        """推送一条房间事件（须持有 room.lock，保证事件序号与发生顺序一致）"""
+        room.version += 1
+        payload = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+        self.hub.publish(room.topic, sse_frame(event, payload, room.version))
+
+    def snapshot_frame(self, room):
+        with room.lock:
+            payload = json.dumps(room.snapshot(), ensure_ascii=False, separators=(',', ':'), default=str)
+            return sse_frame('snapshot', payload, room.version)
+
+    # ------------------------------------------------------------------
+    # 房间操作（由请求线程调用）
+    # ------------------------------------------------------------------
+
+    def _new_code(self):
+        while True:
+            code = ''.join(random.choices(ROOM_CODE_ALPHABET, k=ROOM_CODE_LENGTH))
+            if code not in self.rooms:
+                return code
+
+    def _remove(self, room):
+        with self.lock:
+            if self.rooms.get(room.code) is room:
+                del self.rooms[room.code]
+
+    def get(self, code):
+        """房间，不存在时抛出 BattleError"""
+        with self.lock:
+            room = self.rooms.get(str(code).upper())
+        if room is None:
+            raise BattleError('房间不存在或已关闭', 404)
+        return room
+
+    def room_count(self):
+        with self.lock:
+            return len(self.rooms)
+
+    def create_room(self, host_id, username, subject, questions, answer_key, time_limit=DEFAULT_TIME_LIMIT):
+        """创建房间，房主自动加入"""
+        if not questions:
+            raise BattleError('没有可用的题目')
+        with self.lock:
+            if len(self.rooms) >= self.max_rooms:
+                raise BattleError('房间数已满，请稍后重试', 503)
+            room = BattleRoom(self._new_code(), host_id, subject, questions, answer_key, time_limit)
+            room.players[host_id] = Player(host_id, username)
+            self.rooms[room.code] = room
+        return room
+
+    def join(self, code, user_id, username):
+        room = self.get(code)
+        with room.lock:
+            player = room.players.get(user_id)
+            if player is not None and not player.left:
+                return room
+            if player is not None and room.state == RUNNING:
+                # 对战中断线离开的玩家可以回来继续作答
+                player.left = False
+                self._publish(room, 'player_joined', {'user_id': user_id, 'username': username,
+                                                      'players': room.scoreboard()})
+                return room
+            if room.state != WAITING:
+                raise BattleError('对战已开始，无法加入', 409)
+            if len(room.active_players()) >= MAX_PLAYERS:
+                raise BattleError(f'房间已满（最多 {MAX_PLAYERS} 人）', 409)
+            room.players[user_id] = Player(user_id, username)
+            room.last_activity = time.monotonic()
+            self._publish(room, 'player_joined', {'user_id': user_id, 'username': username,
+                                                  'players': room.scoreboard()})
+        return room
+
+    def leave(self, code, user_id):
+        """离开房间：等待中直接移除（房主离开则解散房间），对战中保留已得分数"""
+        room = self.get(code)
+        close = False
+        with room.lock:
+            player = room.players.get(user_id)
+            if player is None or player.left:
+                return room
+            room.last_activity = time.monotonic()
+            if room.state == WAITING:
+                del room.players[user_id]
+                if user_id == room.host_id:
+                    room.state = CLOSED
+                    close = True
+                    self._publish(room, 'closed', {'reason': 'host_left'})
+                else:
+                    self._publish(room, 'player_left', {'user_id': user_id, 'players': room.scoreboard()})
+            else:
+                player.left = True
+                self._publish(room, 'player_left', {'user_id': user_id, 'players': room.scoreboard()})
+                self._signal_if_all_answered(room)
+        if close:
+            self._remove(room)
+        return room
+
+    def start(self, code, user_id):
+        """房主开始对战"""
+        room = self.get(code)
+        with room.lock:
+            if user_id != room.host_id:
+                raise BattleError('只有房主可以开始对战', 403)
+            if room.state != WAITING:
+                raise BattleError('对战已开始', 409)
+            if len(room.players) < MIN_PLAYERS:
+                raise BattleError(f'至少需要 {MIN_PLAYERS} 名玩家', 409)
+            room.state = RUNNING
+            room.started_at = datetime.datetime.now()
+            room.last_activity = time.monotonic()
+            self._publish(room, 'started', {'question_count': len(room.questions),
+                                            'time_limit': room.time_limit})
+        asyncio.run_coroutine_threadsafe(self._play(room), self._event_loop())
+        return room
+
+    def answer(self, code, user_id, question_id, option_id):
+        """作答当前题目（每题只计第一次），返回 (是否正确, 本题得分, 总分)"""
+        room = self.get(code)
+        with room.lock:
+            player = room.players.get(user_id)
+            if player is None or player.left:
+                raise BattleError('不在该房间中', 403)
+            if not room.accepting or room.questions[room.index]['id'] != question_id:
+                raise BattleError('当前不接受该题的作答', 409)
+            if room.index in player.answers:
+                raise BattleError('本题已作答', 409)
+            elapsed = time.monotonic() - room.round_started
+            correct_option_id, _ = room.answer_key[question_id]
+            is_correct = option_id == correct_option_id
+            points = 0
+            if is_correct:
+                points = BASE_POINTS + int(SPEED_POINTS * max(0.0, 1 - elapsed / room.time_limit))
+                player.score += points
+                player.correct += 1
+                player.time_taken += int(elapsed * 1000)
+            player.answers[room.index] = (option_id, is_correct, points)
+            # 只公布谁已作答，对错在揭晓时统一公布
+            self._publish(room, 'answered', {'index': room.index, 'user_id': user_id})
+            self._signal_if_all_answered(room)
+            return is_correct, points, player.score
+
+    def _signal_if_all_answered(self, room):
+        """在场玩家都已作答当前题目时提前揭晓（须持有 room.lock）"""
+        if room.accepting and all(room.index in player.answers for player in room.active_players()):
+            room.accepting = False
+            done = room.round_done
+            self.loop.call_soon_threadsafe(done.set)
+
+# 全局对战引擎（每个进程一份）
+engine = BattleEngine(hub)
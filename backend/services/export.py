@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+答题数据流式导出（NDJSON / CSV）
+按主键键集分批读取，每批一条独立查询并立即编码输出，内存占用与导出总量无关；
+不依赖 Flask，导出接口与命令行工具（database/export_data.py）共用
+"""
+
+import csv
+import datetime
+import io
+import itertools
+import json
+
+DEFAULT_BATCH_SIZE = 500
+
+DATASETS = ('quiz_records', 'question_answers')
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+COLUMNS = {
+    'quiz_records': ('id', 'user_id', 'username', 'mode', 'start_time', 'end_time', 'total_questions',
+                     'correct_answers', 'time_spent', 'completed', 'created_at'),
+    'question_answers': ('id', 'quiz_record_id', 'user_id', 'username', 'mode', 'question_id',
+                         'selected_option_id', 'is_correct', 'attempt_count', 'time_taken', 'answered_at'),
+}
+
+def parse_filters(user_id=None, group_id=None, mode=None, date_from=None, date_to=None):
+    """校验并规范化筛选条件（日期为 YYYY-MM-DD，date_to 包含当天），无效时抛出 ValueError"""
+    filters = {}
+    if user_id not in (None, ''):
+        filters['user_id'] = int(user_id)
+    if group_id not in (None, ''):
+        filters['group_id'] = int(group_id)
+    if mode:
+        if mode not in ('speed', 'study', 'battle'):
+            raise ValueError('无效的答题模式')
+        filters['mode'] = mode
+    if date_from:
+        filters['date_from'] = datetime.date.fromisoformat(date_from).isoformat()
+    if date_to:
+        filters['date_to'] = (datetime.date.fromisoformat(date_to) + datetime.timedelta(days=1)).isoformat()
+    return filters
+
+def _record_conditions(filters):
+    """答题记录的筛选条件（表别名 qr）"""
+    conditions, params = [], []
+    if 'user_id' in filters:
+        conditions.append("qr.user_id = ?")
+        params.append(filters['user_id'])
+    if 'group_id' in filters:
+        # 分组数据只包含组长本人与已授权共享的成员
+        conditions.append("qr.user_id IN (SELECT user_id FROM group_export_consents WHERE group_id = ?"
+                          " UNION SELECT owner_id FROM groups WHERE id = ?)")
+        params.extend([filters['group_id'], filters['group_id']])
+    if 'mode' in filters:
+        conditions.append("qr.mode = ?")
+        params.append(filters['mode'])
+    if 'date_from' in filters:
+        conditions.append("qr.created_at >= ?")
+        params.append(filters['date_from'])
+    if 'date_to' in filters:
+        conditions.append("qr.created_at < ?")
+        params.append(filters['date_to'])
+    return ''.join(f" AND {condition}" for condition in conditions), params
+
+def iter_quiz_records(conn, filters, batch_size=DEFAULT_BATCH_SIZE):
+    """逐批产出符合条件的答题记录（每批为元组列表，列顺序同 COLUMNS['quiz_records']）"""
+    where, params = _record_conditions(filters)
+    last_id = 0
+    while True:
+        rows = conn.execute(f"""
+            SELECT qr.id, qr.user_id, u.username, qr.mode, qr.start_time, qr.end_time,
+                   qr.total_questions, qr.correct_answers, qr.time_spent, qr.completed, qr.created_at
+            FROM quiz_records qr
+            JOIN users u ON u.id = qr.user_id
+            WHERE qr.id > ?{where}
+            ORDER BY qr.id
+            LIMIT ?
+        """, [last_id] + params + [batch_size]).fetchall()
+        if not rows:
+            return
+        yield [tuple(row) for row in rows]
+        last_id = rows[-1][0]
+
+def iter_question_answers(conn, filters, batch_size=DEFAULT_BATCH_SIZE):
+    """逐批产出符合条件的单题记录：先按键集取一批答题记录，再按 quiz_record_id 索引取其单题记录
+
+    连接上已附加归档库（别名 archive）时同时读取已归档的单题记录
+    """
+    tables = ['question_answers']
+    if any(row[1] == 'archive' for row in conn.execute("PRAGMA database_list")):
+        tables.append('archive.question_answers')
+    for records in iter_quiz_records(conn, filters, batch_size):
+        owners = {record[0]: (record[1], record[2], record[3]) for record in records}
+        placeholders = ','.join('?' * len(owners))
+        selects = ' UNION ALL '.join(f"""
+            SELECT id, quiz_record_id, question_id, selected_option_id, is_correct,
+                   attempt_count, time_taken, answered_at
+            FROM {table}
+            WHERE quiz_record_id IN ({placeholders})
+        """ for table in tables)
+        rows = conn.execute(f"{selects} ORDER BY quiz_record_id, id", list(owners) * len(tables)).fetchall()
+        if rows:
+            yield [(row[0], row[1]) + owners[row[1]] + tuple(row[2:]) for row in rows]
+
+ITERATORS = {
+    'quiz_records': iter_quiz_records,
+    'question_answers': iter_question_answers,
+}
+
+def _json_value(column, value):
+    if column in ('completed', 'is_correct') and value is not None:
+        return bool(value)
+    return value
+
+def encode_ndjson(dataset, batches):
+    """把批次编码为 NDJSON 字节块（每批一块）"""
+    columns = COLUMNS[dataset]
+    for batch in batches:
+        lines = [
+            json.dumps({column: _json_value(column, value) for column, value in zip(columns, row)},
+                       ensure_ascii=False, default=str)
+            for row in batch
+        ]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+def encode_csv(dataset, batches):
+    """把批次编码为 CSV 字节块：先输出表头（带 BOM 便于 Excel 识别 UTF-8），之后每批一块"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS[dataset])
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+
+ENCODERS = {
+    'ndjson': encode_ndjson,
+    'csv': encode_csv,
+}
+
+def export_chunks(conn, dataset, fmt, filters, batch_size=DEFAULT_BATCH_SIZE):
+    """按数据集与格式产出导出内容的字节块
+
+    conn 也可以是连接列表（分片模式下的各分片），依次导出，表头只输出一次
+    """
+    conns = conn if isinstance(conn, (list, tuple)) else [conn]
+    batches = itertools.chain.from_iterable(ITERATORS[dataset](c, filters, batch_size) for c in conns)
+    return ENCODERS[fmt](dataset, batches)
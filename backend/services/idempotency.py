@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+提交答案的幂等处理
+客户端为每次作答生成一个 Idempotency-Key 请求头，网络重试时沿用同一个键。首次处理时把响应与请求指纹
+和作答写入放在同一事务中保存到 answer_submissions（主键 (user_id, idempotency_key)），
+重放的请求先查进程内的有界缓存、再查该表，直接返回保存的响应，不再校验、判分或写入，
+尝试次数与用时不会被重试累加。并发的同键请求由主键约束保证只有一个写入成功。不依赖 Flask
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+MAX_KEY_LENGTH = 128
+DEFAULT_CACHE_TTL = 600  # 进程内缓存的有效期（秒）
+DEFAULT_MAX_ENTRIES = 50000
+DEFAULT_RETENTION = 86400  # answer_submissions 保留秒数，超过后由维护任务清理
+
+SUBMISSIONS_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS answer_submissions (
+        user_id INTEGER NOT NULL,
+        idempotency_key TEXT NOT NULL,
+        fingerprint TEXT NOT NULL,
+        response TEXT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, idempotency_key)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_answer_submissions_created_at ON answer_submissions(created_at);
+"""
+
+def ensure_submissions(conn):
+    """创建幂等记录表（已存在时不变）"""
+    conn.executescript(SUBMISSIONS_SCHEMA)
+
+def valid_key(key):
+    return 0 < len(key) <= MAX_KEY_LENGTH and key.isascii() and key.isprintable()
+
+def fingerprint(*values):
+    """请求指纹：同一个键只能用于内容相同的请求"""
+    return json.dumps(values, separators=(',', ':'))
+
+def load_submission(conn, user_id, key):
+    """已保存的 (指纹, 响应)，不存在时返回 None"""
+    row = conn.execute(
+        "SELECT fingerprint, response FROM answer_submissions WHERE user_id = ? AND idempotency_key = ?",
+        (user_id, key)
+    ).fetchone()
+    return None if row is None else (row[0], json.loads(row[1]))
+
+def store_submission(conn, user_id, key, request_fingerprint, response):
+    """在作答写入的事务中保存响应（由调用方提交）；同键已保存时抛出 sqlite3.IntegrityError"""
+    conn.execute(
+        "INSERT INTO answer_submissions (user_id, idempotency_key, fingerprint, response) VALUES (?, ?, ?, ?)",
+        (user_id, key, request_fingerprint, json.dumps(response, ensure_ascii=False))
+    )
+
+def purge_submissions(conn, retention=DEFAULT_RETENTION):
+    """删除超过保留期的幂等记录，返回删除数"""
+    cursor = conn.execute(
+        "DELETE FROM answer_submissions WHERE created_at < datetime('now', ?)",
+        (f'-{int(retention)} seconds',)
+    )
+    return cursor.rowcount
+
+class ReplayCache:
+    """最近提交的响应：(user_id, 键) -> (指纹, 响应, 保存时刻)，按 LRU 与 ttl 淘汰"""
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, user_id, key):
+        """(指纹, 响应)，未命中或已过期时返回 None"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get((user_id, key))
+            if entry is None:
+                return None
+            if now - entry[2] >= self.ttl:
+                del self.entries[(user_id, key)]
+                return None
+            self.entries.move_to_end((user_id, key))
+            return entry[0], entry[1]
+
+    def put(self, user_id, key, request_fingerprint, response):
+        if not self.ttl:
+            return
+        with self.lock:
+            self.entries[(user_id, key)] = (request_fingerprint, response, time.monotonic())
+            self.entries.move_to_end((user_id, key))
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+# 全局重放缓存（每个进程一份）
+replays = ReplayCache()
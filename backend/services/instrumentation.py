@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求与SQL计时、N+1 检测、Prometheus 指标导出、慢请求采样 profiling
+"""
+
+import cProfile
+import datetime
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from flask import g, request, has_request_context, Response
+
+# 请求耗时分桶（秒）
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# SQL语句耗时分桶（秒）
+SQL_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# 每请求SQL条数分桶
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+_TABLE_PATTERN = re.compile(r'\b(?:FROM|INTO|UPDATE|JOIN)\s+([A-Za-z_][A-Za-z0-9_.]*)', re.IGNORECASE)
+
+def statement_label(sql):
+    """将SQL归类为低基数的标签，如 'SELECT user_sessions'"""
+    text = sql.strip()
+    if not text:
+        return 'EMPTY'
+    operation = text.split(None, 1)[0].upper()
+    match = _TABLE_PATTERN.search(text)
+    return f'{operation} {match.group(1)}' if match else operation
+
+def normalize_sql(sql):
+    """压缩空白，用于判断同一语句是否被重复执行"""
+    return ' '.join(sql.split())
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape_label(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class CounterMetric:
+    """带标签的计数器"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self.lock:
+            self.values[labelvalues] = self.values.get(labelvalues, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+class GaugeMetric:
+    """取值时回调计算的仪表"""
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} gauge']
+        try:
+            values = self.callback()
+        except Exception:
+            return lines
+        if isinstance(values, dict):
+            for labels, value in sorted(values.items()):
+                lines.append(f'{self.name}{labels} {value}')
+        elif values is not None:
+            lines.append(f'{self.name} {values}')
+        return lines
+
+class HistogramMetric:
+    """带标签的直方图"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {}  # labels -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self.lock:
+            series = self.series.get(labelvalues)
+            if series is None:
+                series = self.series[labelvalues] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            for labels, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}')
+                le = 'le="+Inf"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {series[-1]}')
+                lines.append(f'{self.name}_sum{_format_labels(self.labelnames, labels)} {round(series[-2], 6)}')
+                lines.append(f'{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}')
+        return lines
+
+class MetricsRegistry:
+    """进程内指标注册表，按 Prometheus 文本格式导出"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(CounterMetric(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        return self._register(HistogramMetric(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, callback):
+        return self._register(GaugeMetric(name, documentation, callback))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+# 全局注册表（每个进程一份）
+registry = MetricsRegistry()
+
+http_requests_total = registry.counter(
+    'quickqa_http_requests_total', 'HTTP请求数', ('method', 'endpoint', 'status'))
+http_request_duration = registry.histogram(
+    'quickqa_http_request_duration_seconds', 'HTTP请求耗时', ('method', 'endpoint'))
+sql_query_duration = registry.histogram(
+    'quickqa_sql_query_duration_seconds', 'SQL语句耗时', ('statement',), SQL_BUCKETS)
+sql_queries_per_request = registry.histogram(
+    'quickqa_sql_queries_per_request', '每个请求执行的SQL语句数', ('endpoint',), QUERY_COUNT_BUCKETS)
+n_plus_one_total = registry.counter(
+    'quickqa_sql_n_plus_one_total', '同一请求内重复执行同一语句超过阈值的次数', ('endpoint', 'statement'))
+profiles_total = registry.counter(
+    'quickqa_profiles_dumped_total', '已导出的慢请求 profile 数', ('endpoint',))
+
+sql_fetch_seconds = registry.counter(
+    'quickqa_sql_fetch_seconds_total', 'SQL结果集读取（fetch/迭代）累计耗时', ('statement',))
+
+# 语句监听器：callback(sql, parameters)，供查询计划检查等工具收集实际执行的SQL
+statement_listeners = []
+
+def _record_statement(sql, elapsed, parameters=None):
+    """记录一条SQL的执行耗时，并累加到当前请求的统计中"""
+    label = statement_label(sql)
+    sql_query_duration.observe(elapsed, label)
+    for listener in statement_listeners:
+        listener(sql, parameters)
+    if has_request_context():
+        stats = g.get('sql_stats')
+        if stats is not None:
+            stats['count'] += 1
+            stats['time'] += elapsed
+            stats['statements'][normalize_sql(sql)] += 1
+
+def _record_fetch(sql, elapsed):
+    """记录读取结果集的耗时（不计入语句条数）"""
+    sql_fetch_seconds.inc(statement_label(sql or ''), amount=elapsed)
+    if has_request_context():
+        stats = g.get('sql_stats')
+        if stats is not None:
+            stats['time'] += elapsed
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """计时的游标：execute 记一次语句，后续 fetch 的耗时也记到该语句上"""
+
+    statement = None
+
+    def execute(self, sql, parameters=(), /):
+        self.statement = sql
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_statement(sql, time.perf_counter() - started, parameters)
+
+    def executemany(self, sql, parameters, /):
+        self.statement = sql
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            _record_statement(sql, time.perf_counter() - started)
+
+    def fetchone(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            _record_fetch(self.statement, time.perf_counter() - started)
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            _record_fetch(self.statement, time.perf_counter() - started)
+
+    def fetchall(self):
+        started = time.perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            _record_fetch(self.statement, time.perf_counter() - started)
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            _record_fetch(self.statement, time.perf_counter() - started)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """对每条语句计时的连接，作为 sqlite3.connect 的 factory 使用"""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or InstrumentedCursor)
+
+    def execute(self, sql, parameters=(), /):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, parameters, /):
+        return self.cursor().executemany(sql, parameters)
+
+    def executescript(self, sql_script, /):
+        started = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _record_statement('SCRIPT', time.perf_counter() - started)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _record_statement('COMMIT', time.perf_counter() - started)
+
+def _endpoint_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+def init_instrumentation(app):
+    """在应用上挂载计时钩子、/metrics 端点与可选的慢请求 profiler
+
+    相关配置（均可用同名 QUIZ_ 前缀环境变量覆盖）:
+        N_PLUS_ONE_THRESHOLD  同一请求内同一语句执行次数达到该值视为 N+1（默认 10）
+        PROFILE_SAMPLE_RATE   请求被 cProfile 采样的概率，0 表示关闭（默认 0）
+        PROFILE_SLOW_MS       采样请求耗时超过该值才导出 pstats（默认 500）
+        PROFILE_DIR           pstats 文件输出目录
+    """
+    app.config.setdefault('N_PLUS_ONE_THRESHOLD', int(os.environ.get('QUIZ_N_PLUS_ONE_THRESHOLD', 10)))
+    app.config.setdefault('PROFILE_SAMPLE_RATE', float(os.environ.get('QUIZ_PROFILE_SAMPLE_RATE', 0)))
+    app.config.setdefault('PROFILE_SLOW_MS', float(os.environ.get('QUIZ_PROFILE_SLOW_MS', 500)))
+    app.config.setdefault('PROFILE_DIR', os.environ.get('QUIZ_PROFILE_DIR', 'profiles'))
+    app.config['DB_CONNECTION_FACTORY'] = InstrumentedConnection
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_started = time.perf_counter()
+        g.sql_stats = {'count': 0, 'time': 0.0, 'statements': Counter()}
+        g.profiler = None
+        rate = app.config['PROFILE_SAMPLE_RATE']
+        if rate > 0 and random.random() < rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+                g.profiler = profiler
+            except ValueError:
+                # 已有其他 profiler 在运行，跳过本次采样
+                pass
+
+    @app.after_request
+    def _finish_request_timer(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = _endpoint_label()
+        stats = g.sql_stats
+
+        http_requests_total.inc(request.method, endpoint, str(response.status_code))
+        http_request_duration.observe(elapsed, request.method, endpoint)
+        sql_queries_per_request.observe(stats['count'], endpoint)
+        response.headers['Server-Timing'] = (
+            f'app;dur={elapsed * 1000:.2f}, db;dur={stats["time"] * 1000:.2f};desc="{stats["count"]} queries"'
+        )
+
+        threshold = app.config['N_PLUS_ONE_THRESHOLD']
+        for sql, count in stats['statements'].items():
+            if count >= threshold:
+                n_plus_one_total.inc(endpoint, statement_label(sql))
+                app.logger.warning('疑似 N+1 查询: %s 在 %s 中执行了 %d 次', statement_label(sql), endpoint, count)
+
+        profiler = g.get('profiler')
+        if profiler is not None:
+            profiler.disable()
+            g.profiler = None
+            if elapsed * 1000 >= app.config['PROFILE_SLOW_MS']:
+                _dump_profile(app, profiler, endpoint, elapsed)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus 文本格式指标"""
+        return Response(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def _dump_profile(app, profiler, endpoint, elapsed):
+    """把慢请求的 profile 写成 pstats 文件"""
+    directory = app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    safe_endpoint = re.sub(r'[^A-Za-z0-9]+', '_', endpoint).strip('_') or 'root'
+    stamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = os.path.join(directory, f'{stamp}-{request.method}-{safe_endpoint}-{int(elapsed * 1000)}ms.prof')
+    profiler.dump_stats(path)
+    profiles_total.inc(endpoint)
+    app.logger.info('慢请求 profile 已写入 %s', path)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+排行榜响应缓存
+缓存各模式前 TOP_N 名与统计信息（含序列化后的响应体），仅当新成绩进入榜单时失效，
+并以 ETag/304 响应轮询请求
+"""
+
+import os
+import threading
+import time
+
+from flask import current_app, request
+
+TOP_N = 100  # 与接口允许的最大 limit 一致
+
+def rank_key(mode, correct_answers, total_questions, time_spent):
+    """成绩的排序键，越大越靠前（与排行榜SQL的 ORDER BY 一致，created_at 更新者并列时胜出）"""
+    if mode == 'speed':
+        return (correct_answers or 0, -(time_spent or 0))
+    return (total_questions or 0, time_spent or 0)
+
+class LeaderboardCache:
+    """进程内排行榜缓存
+
+    多进程部署时其他进程的成绩不会触发本进程失效，因此保留 ttl 作为兜底（0 表示不过期）
+    """
+
+    def __init__(self, top_n=TOP_N, ttl=60, stats_ttl=60):
+        self.top_n = top_n
+        self.ttl = ttl
+        self.stats_ttl = stats_ttl  # 活跃用户数依赖当前日期，必须定期刷新
+        self.lock = threading.Lock()
+        self.entries = {}  # key -> {'data', 'version', 'expires', 'bodies'}
+        self.invalidations = {}  # key -> 失效次数，用于丢弃加载期间已过期的结果
+        self.boot_id = os.urandom(4).hex()
+        self.generation = 0
+        self.listeners = []  # callback(key, old_rows)，榜单因新成绩变化时调用
+
+    def add_listener(self, callback):
+        """注册榜单变化回调（key 为榜单缓存键，old_rows 为变化前缓存的榜单，未缓存时为 None）"""
+        self.listeners.append(callback)
+
+    def get(self, key, loader, ttl=None):
+        """返回缓存条目，未命中或过期时调用 loader() 重新加载"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now < entry['expires']:
+                return entry
+            seen = self.invalidations.get(key, 0)
+
+        data = loader()
+
+        ttl = self.ttl if ttl is None else ttl
+        with self.lock:
+            self.generation += 1
+            entry = {
+                'data': data,
+                'version': f'{self.boot_id}-{self.generation}',
+                'expires': now + ttl if ttl else float('inf'),
+                'bodies': {},
+            }
+            # 加载期间被失效过，说明结果可能已过时：本次照常返回但不写入缓存
+            if self.invalidations.get(key, 0) == seen:
+                self.entries[key] = entry
+        return entry
+
+    def invalidate(self, key):
+        """使某个条目失效"""
+        with self.lock:
+            self.entries.pop(key, None)
+            self.invalidations[key] = self.invalidations.get(key, 0) + 1
+
+    def record_result(self, mode, user_id, correct_answers, total_questions, time_spent, key=None):
+        """记录一次完成的答题：统计必然变化；榜单仅在新成绩进入前 top_n 时失效
+
+        key 为榜单的缓存键（默认即模式名，分时段榜单另有键），返回榜单是否发生变化
+        """
+        key = key or mode
+        self.invalidate('stats')
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            self._notify(key, None)
+            return True
+
+        rows = entry['data']
+        new_key = rank_key(mode, correct_answers, total_questions, time_spent)
+        for row in rows:
+            if row['user_id'] == user_id:
+                # 已在榜上：只有不差于其当前最佳成绩时才会替换
+                changed = new_key >= rank_key(mode, row.get('correct_answers'), row['total_questions'], row['time_spent'])
+                break
+        else:
+            last = rows[-1] if rows else None
+            changed = (len(rows) < self.top_n or last is None or
+                       new_key >= rank_key(mode, last.get('correct_answers'), last['total_questions'], last['time_spent']))
+        if changed:
+            self.invalidate(key)
+            self._notify(key, rows)
+        return changed
+
+    def _notify(self, mode, old_rows):
+        for callback in self.listeners:
+            callback(mode, old_rows)
+
+def conditional_json(entry, variant, build_payload):
+    """按缓存条目版本生成带 ETag 的 JSON 响应，客户端已持有相同版本时返回 304"""
+    etag = f"{entry['version']}-{variant}"
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        body = entry['bodies'].get(variant)
+        if body is None:
+            body = current_app.json.response(build_payload()).get_data()
+            entry['bodies'][variant] = body
+        response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# 全局缓存（每个进程一份）
+leaderboard_cache = LeaderboardCache()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分时段排行榜汇总表
+leaderboard_rollups 按 (period, period_start, mode, user_id) 保存每个用户在当日 / 本周 / 总榜中的最佳成绩，
+答题结束时增量更新，过期时段在跨日后清理；排行榜只读这张小表，不再扫描全部答题记录。
+时段按服务器本地时间划分（与 finish_quiz 写入的 end_time 一致），周从周一开始。
+"""
+
+import datetime
+import threading
+
+PERIODS = ('daily', 'weekly', 'all')
+
+# 新成绩优于已有成绩时才覆盖（与排行榜的排序一致，成绩相同则较新的记录胜出）
+BETTER_THAN_EXISTING = {
+    'speed': """(excluded.correct_answers, -excluded.time_spent, excluded.created_at)
+                > (leaderboard_rollups.correct_answers, -leaderboard_rollups.time_spent, leaderboard_rollups.created_at)""",
+    'study': """(excluded.total_questions, excluded.time_spent, excluded.created_at)
+                > (leaderboard_rollups.total_questions, leaderboard_rollups.time_spent, leaderboard_rollups.created_at)""",
+}
+
+_prune_lock = threading.Lock()
+_pruned_for = {}  # 数据库文件 -> 已清理到的日期（每个进程每个文件每天最多清理一次）
+_populated_checked = set()  # 已检查过的数据库文件（分片模式下每个分片各有一张汇总表）
+
+def _database_file(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+def period_start(period, now=None):
+    """某时段的起始日期字符串（总榜为空字符串）"""
+    if period == 'all':
+        return ''
+    today = (now or datetime.datetime.now()).date()
+    if period == 'weekly':
+        today -= datetime.timedelta(days=today.weekday())
+    return today.isoformat()
+
+def seconds_until_rollover(period, now=None):
+    """距离当前时段结束的秒数（总榜为 None）"""
+    if period == 'all':
+        return None
+    now = now or datetime.datetime.now()
+    start = datetime.date.fromisoformat(period_start(period, now))
+    days = 1 if period == 'daily' else 7
+    end = datetime.datetime.combine(start + datetime.timedelta(days=days), datetime.time())
+    return max(1, int((end - now).total_seconds()))
+
+def _upsert(conn, mode, rows):
+    conn.executemany(f"""
+        INSERT INTO leaderboard_rollups
+            (period, period_start, mode, user_id, quiz_record_id, correct_answers,
+             total_questions, time_spent, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (period, period_start, mode, user_id) DO UPDATE SET
+            quiz_record_id = excluded.quiz_record_id,
+            correct_answers = excluded.correct_answers,
+            total_questions = excluded.total_questions,
+            time_spent = excluded.time_spent,
+            created_at = excluded.created_at
+        WHERE {BETTER_THAN_EXISTING[mode]}
+    """, rows)
+
+def record_result(conn, user_id, mode, quiz_record_id, correct_answers, total_questions,
+                  time_spent, created_at, now=None):
+    """答题结束时更新各时段的最佳成绩（与答题记录的更新在同一事务中）"""
+    now = now or datetime.datetime.now()
+    ensure_populated(conn)
+    prune_expired(conn, now)
+    _upsert(conn, mode, [
+        (period, period_start(period, now), mode, user_id, quiz_record_id,
+         correct_answers or 0, total_questions or 0, time_spent or 0, created_at)
+        for period in PERIODS
+    ])
+
+def record_late_results(conn, results, now=None):
+    """批量登记结束时间可能早于当前时段的成绩（如自动结束的答题），只计入结束时间仍在时段内的榜单（与 rebuild 一致）
+
+    results 为 (user_id, mode, quiz_record_id, correct_answers, total_questions, time_spent, created_at, end_time)
+    """
+    now = now or datetime.datetime.now()
+    ensure_populated(conn)
+    prune_expired(conn, now)
+    for period in PERIODS:
+        start = period_start(period, now)
+        for mode in BETTER_THAN_EXISTING:
+            rows = [
+                (period, start, mode, user_id, quiz_record_id, correct or 0, total or 0, time_spent or 0, created_at)
+                for user_id, result_mode, quiz_record_id, correct, total, time_spent, created_at, end_time in results
+                if result_mode == mode and str(end_time) >= start
+            ]
+            if rows:
+                _upsert(conn, mode, rows)
+
+def prune_expired(conn, now=None, force=False):
+    """删除已结束时段的汇总行，返回删除的行数"""
+    now = now or datetime.datetime.now()
+    today = period_start('daily', now)
+    database = _database_file(conn)
+    with _prune_lock:
+        if _pruned_for.get(database) == today and not force:
+            return 0
+        _pruned_for[database] = today
+    deleted = 0
+    for period in ('daily', 'weekly'):
+        cursor = conn.execute(
+            "DELETE FROM leaderboard_rollups WHERE period = ? AND period_start < ?",
+            (period, period_start(period, now))
+        )
+        deleted += cursor.rowcount
+    return deleted
+
+def rebuild(conn, now=None):
+    """从答题记录重建汇总表（用于已有数据的首次迁移；可重复执行）"""
+    now = now or datetime.datetime.now()
+    prune_expired(conn, now, force=True)
+    order_by = {
+        'speed': 'correct_answers DESC, time_spent ASC, created_at DESC',
+        'study': 'total_questions DESC, time_spent DESC, created_at DESC',
+    }
+    for period in PERIODS:
+        start = period_start(period, now)
+        for mode, ordering in order_by.items():
+            cursor = conn.execute(f"""
+                SELECT user_id, id, correct_answers, total_questions, time_spent, created_at
+                FROM (
+                    SELECT user_id, id, correct_answers, total_questions, time_spent, created_at,
+                           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY {ordering}) as rn
+                    FROM quiz_records
+                    WHERE mode = ? AND completed = TRUE AND end_time >= ?
+                )
+                WHERE rn = 1
+            """, (mode, start))
+            _upsert(conn, mode, [
+                (period, start, mode, row[0], row[1], row[2] or 0, row[3] or 0, row[4] or 0, row[5])
+                for row in cursor.fetchall()
+            ])
+
+def ensure_populated(conn):
+    """汇总表为空而已有完成的答题记录时（旧库升级后）自动重建，每个进程每个数据库文件只检查一次
+
+    返回是否重建（由调用方提交事务）
+    """
+    database = _database_file(conn)
+    if database in _populated_checked:
+        return False
+    _populated_checked.add(database)
+    has_rollups = conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM leaderboard_rollups WHERE period = 'all')"
+    ).fetchone()[0]
+    if has_rollups:
+        return False
+    has_records = conn.execute(
+        "SELECT EXISTS (SELECT 1 FROM quiz_records WHERE completed = TRUE)"
+    ).fetchone()[0]
+    if not has_records:
+        return False
+    rebuild(conn)
+    return True
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库维护：在线备份、统计信息（ANALYZE / PRAGMA optimize）、WAL 检查点与容量报告
+备份使用 sqlite3 备份 API 按页分步复制，每步之间释放锁，不阻塞在线读写；
+所有维护操作使用独立连接与较短的忙等待，数据库繁忙时本轮跳过而不是排队等待。
+不依赖 Flask，后端的定时维护线程与命令行工具（database/maintenance.py）共用
+"""
+
+import datetime
+import glob
+import os
+import sqlite3
+import threading
+import time
+
+from services.shards import router as shard_router
+
+DEFAULT_BACKUP_PAGES = 256  # 每步复制的页数
+DEFAULT_BACKUP_SLEEP = 0.01  # 步间暂停秒数，让出锁给在线请求
+DEFAULT_BACKUP_KEEP = 7  # 保留最近的备份数
+DEFAULT_BACKUP_MAX_RESTARTS = 5  # 分步复制因写入重新开始的次数上限
+DEFAULT_ANALYSIS_LIMIT = 1000  # ANALYZE 每个索引最多采样的行数，限制大表的耗时
+DEFAULT_BUSY_TIMEOUT = 1.0  # 维护连接的忙等待秒数
+
+CHECKPOINT_MODES = ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE')
+
+def connect(db_path, timeout=DEFAULT_BUSY_TIMEOUT):
+    """打开维护用连接（自动提交模式，PRAGMA 立即生效）"""
+    return sqlite3.connect(db_path, timeout=timeout, isolation_level=None)
+
+def backup_filename(db_path, now=None):
+    """备份文件名，如 quiz_app.db -> quiz_app-20250901-030000.db"""
+    now = now or datetime.datetime.now()
+    root, ext = os.path.splitext(os.path.basename(db_path))
+    return f'{root}-{now.strftime("%Y%m%d-%H%M%S")}{ext or ".db"}'
+
+class _TooManyRestarts(Exception):
+    pass
+
+def online_backup(conn, dest_path, pages=DEFAULT_BACKUP_PAGES, sleep=DEFAULT_BACKUP_SLEEP, verify=True,
+                  max_restarts=DEFAULT_BACKUP_MAX_RESTARTS):
+    """用备份 API 把 conn 所在数据库在线复制到 dest_path
+
+    每步复制 pages 页后暂停 sleep 秒；复制期间其他连接写入时备份 API 会从头重新复制，
+    重新开始超过 max_restarts 次（写入持续不断）时改为一步复制完（WAL 模式下只持有读快照，不阻塞写入）。
+    先写入临时文件，校验通过后再原子替换为目标文件。
+    返回 {'path', 'pages', 'restarts', 'single_step', 'seconds', 'bytes'}
+    """
+    tmp_path = f'{dest_path}.tmp'
+    state = {'remaining': None, 'total': 0, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        # 一步成功复制后剩余页数没有减少，说明源库被其他连接修改、备份从头开始
+        if status == sqlite3.SQLITE_OK and state['remaining'] is not None and remaining >= state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > max_restarts:
+                raise _TooManyRestarts()
+        state['remaining'] = remaining
+        state['total'] = total
+        # backup() 的 sleep 参数只在源库忙时生效，步间让出锁的暂停放在进度回调里（此时不持有源库的锁）
+        if remaining and sleep:
+            time.sleep(sleep)
+
+    started = time.perf_counter()
+    single_step = False
+    target = sqlite3.connect(tmp_path)
+    try:
+        try:
+            conn.backup(target, pages=pages, progress=progress, sleep=sleep)
+        except _TooManyRestarts:
+            single_step = True
+            conn.backup(target)
+            state['total'] = conn.execute("PRAGMA page_count").fetchone()[0]
+        if verify:
+            result = target.execute("PRAGMA quick_check").fetchone()[0]
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f'备份校验失败: {result}')
+    except BaseException:
+        target.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    target.close()
+    os.replace(tmp_path, dest_path)
+    return {
+        'path': dest_path,
+        'pages': state['total'],
+        'restarts': state['restarts'],
+        'single_step': single_step,
+        'seconds': round(time.perf_counter() - started, 3),
+        'bytes': os.path.getsize(dest_path),
+    }
+
+def prune_backups(backup_dir, db_path, keep=DEFAULT_BACKUP_KEEP):
+    """只保留最近 keep 个备份，返回删除的文件列表"""
+    root, ext = os.path.splitext(os.path.basename(db_path))
+    backups = sorted(glob.glob(os.path.join(backup_dir, f'{glob.escape(root)}-*{ext or ".db"}')))
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+def backup_to_dir(conn, db_path, backup_dir, keep=DEFAULT_BACKUP_KEEP,
+                  pages=DEFAULT_BACKUP_PAGES, sleep=DEFAULT_BACKUP_SLEEP):
+    """备份到目录（文件名带时间戳）并清理旧备份"""
+    os.makedirs(backup_dir, exist_ok=True)
+    result = online_backup(conn, os.path.join(backup_dir, backup_filename(db_path)), pages, sleep)
+    result['removed'] = prune_backups(backup_dir, db_path, keep)
+    return result
+
+def analyze(conn, analysis_limit=DEFAULT_ANALYSIS_LIMIT):
+    """采样收集全部表与索引的统计信息（写入 sqlite_stat1），供查询规划器在多个索引间选择"""
+    conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    conn.execute("ANALYZE")
+
+def optimize(conn, analysis_limit=DEFAULT_ANALYSIS_LIMIT):
+    """PRAGMA optimize：只重新分析统计信息明显过时的表，开销很小，适合频繁执行
+
+    从未 ANALYZE 过的库先做一次完整的采样 ANALYZE（optimize 不会为没有统计信息的库建立基线）
+    """
+    has_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'"
+    ).fetchone()
+    if not has_stats:
+        analyze(conn, analysis_limit)
+        return 'analyze'
+    conn.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+    conn.execute("PRAGMA optimize")
+    return 'optimize'
+
+def checkpoint(conn, mode='PASSIVE'):
+    """WAL 检查点，返回 (busy, WAL 中的帧数, 已写回的帧数)；非 WAL 模式时后两项为 -1
+
+    PASSIVE 不等待读写连接，只写回当前可以写回的帧，不会阻塞在线请求
+    """
+    mode = mode.upper()
+    if mode not in CHECKPOINT_MODES:
+        raise ValueError(f'无效的检查点模式: {mode}')
+    return tuple(conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+
+def size_report(conn, db_path):
+    """数据库容量报告：文件大小、WAL 大小、页数与空闲页"""
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    wal_path = f'{db_path}-wal'
+    return {
+        'journal_mode': conn.execute("PRAGMA journal_mode").fetchone()[0],
+        'auto_vacuum': ('none', 'full', 'incremental')[conn.execute("PRAGMA auto_vacuum").fetchone()[0]],
+        'page_size': page_size,
+        'page_count': page_count,
+        'freelist_count': freelist,
+        'freelist_bytes': freelist * page_size,
+        'db_bytes': os.path.getsize(db_path) if os.path.exists(db_path) else 0,
+        'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+    }
+
+class MaintenanceScheduler:
+    """后台维护线程：按各自的间隔执行维护任务
+
+    任务为 (名称, 间隔秒数, callback(conn))，每次执行使用新的维护连接；
+    数据库繁忙（database is locked）时本轮跳过，等待下一个间隔。
+    多进程部署时只应在一个进程中启用（或改用 cron 调用 database/maintenance.py）
+    """
+
+    def __init__(self, db_path, tasks, busy_timeout=DEFAULT_BUSY_TIMEOUT, log=None, name='db-maintenance'):
+        self.db_path = db_path
+        self.name = name
+        self.tasks = [(name, interval, callback) for name, interval, callback in tasks if interval > 0]
+        self.busy_timeout = busy_timeout
+        self.log = log or (lambda message: None)
+        self.lock = threading.Lock()
+        self.status = {name: {'runs': 0, 'failures': 0, 'last_run': None, 'last_seconds': None,
+                              'last_result': None, 'last_error': None} for name, _, _ in self.tasks}
+        self.next_run = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def add_task(self, name, interval, callback):
+        """追加维护任务（须在 start 之前调用；间隔不大于 0 时忽略）"""
+        if interval <= 0:
+            return
+        with self.lock:
+            self.tasks.append((name, interval, callback))
+            self.status[name] = {'runs': 0, 'failures': 0, 'last_run': None, 'last_seconds': None,
+                                 'last_result': None, 'last_error': None}
+
+    def start(self):
+        """启动后台线程（已启动时忽略）"""
+        if self.thread is not None or not self.tasks:
+            return
+        now = time.monotonic()
+        # 首轮错开到各自间隔之后执行，避免进程启动时集中做维护
+        self.next_run = {name: now + interval for name, interval, _ in self.tasks}
+        self.thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def run_task(self, name):
+        """立即执行一个任务，返回其结果（失败时记录错误并返回 None）"""
+        callback = next(callback for task_name, _, callback in self.tasks if task_name == name)
+        started = time.perf_counter()
+        result = error = None
+        try:
+            conn = connect(self.db_path, self.busy_timeout)
+            try:
+                result = callback(conn)
+            finally:
+                conn.close()
+        except Exception as e:
+            error = str(e)
+            self.log(f'维护任务 {name} 失败: {error}')
+        with self.lock:
+            status = self.status[name]
+            status['runs'] += 1
+            status['failures'] += error is not None
+            status['last_run'] = datetime.datetime.now().isoformat(timespec='seconds')
+            status['last_seconds'] = round(time.perf_counter() - started, 3)
+            status['last_result'] = result
+            status['last_error'] = error
+        return result
+
+    def snapshot(self):
+        """各任务的执行状态"""
+        with self.lock:
+            return {name: dict(status) for name, status in self.status.items()}
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            for name, interval, _ in self.tasks:
+                if now >= self.next_run[name]:
+                    self.run_task(name)
+                    self.next_run[name] = time.monotonic() + interval
+            wait = min(self.next_run.values()) - time.monotonic()
+            self.stop_event.wait(max(wait, 0.1))
+
+def default_tasks(db_path, backup_dir=None, backup_interval=86400, backup_keep=DEFAULT_BACKUP_KEEP,
+                  optimize_interval=3600, analyze_interval=86400, checkpoint_interval=60):
+    """默认维护计划：每分钟 PASSIVE 检查点、每小时 optimize、每天 ANALYZE 与备份（指定备份目录时）"""
+    tasks = [
+        ('checkpoint', checkpoint_interval, lambda conn: checkpoint(conn, 'PASSIVE')),
+        ('optimize', optimize_interval, optimize),
+        ('analyze', analyze_interval, analyze),
+    ]
+    if backup_dir:
+        tasks.append(('backup', backup_interval,
+                      lambda conn: backup_to_dir(conn, db_path, backup_dir, backup_keep)))
+    return tasks
+
+def on_database(db_path, callback, busy_timeout=DEFAULT_BUSY_TIMEOUT):
+    """把维护任务改为在另一个数据库文件（如各分片）上执行"""
+    def run(_conn):
+        conn = connect(db_path, busy_timeout)
+        try:
+            return callback(conn)
+        finally:
+            conn.close()
+    return run
+
+def init_maintenance(app):
+    """注册数据库容量指标，并按配置在首个请求时启动后台维护线程
+
+    相关配置（均可用同名 QUIZ_ 前缀环境变量覆盖）:
+        MAINTENANCE_ENABLED  是否启用后台维护线程（默认 0；多进程部署时只在一个进程启用）
+        BACKUP_DIR           在线备份目录，为空时不做定时备份
+        BACKUP_INTERVAL      备份间隔秒数（默认 86400）
+        BACKUP_KEEP          保留的备份数（默认 7）
+    首个请求时才启动线程，避免调试模式下重载器的父进程也执行维护
+    """
+    from services.instrumentation import registry
+
+    app.config.setdefault('MAINTENANCE_ENABLED', os.environ.get('QUIZ_MAINTENANCE_ENABLED', '0') == '1')
+    app.config.setdefault('BACKUP_DIR', os.environ.get('QUIZ_BACKUP_DIR', ''))
+    app.config.setdefault('BACKUP_INTERVAL', int(os.environ.get('QUIZ_BACKUP_INTERVAL', 86400)))
+    app.config.setdefault('BACKUP_KEEP', int(os.environ.get('QUIZ_BACKUP_KEEP', DEFAULT_BACKUP_KEEP)))
+
+    db_path = app.config['DATABASE_PATH']
+    scheduler = MaintenanceScheduler(db_path, default_tasks(
+        db_path, app.config['BACKUP_DIR'], app.config['BACKUP_INTERVAL'], app.config['BACKUP_KEEP']
+    ), log=app.logger.warning)
+    # 分片模式：每个分片各有一套检查点 / optimize / ANALYZE / 备份任务
+    for index, shard_path in enumerate(shard_router.shard_paths):
+        for name, interval, callback in default_tasks(
+            shard_path, app.config['BACKUP_DIR'], app.config['BACKUP_INTERVAL'], app.config['BACKUP_KEEP']
+        ):
+            scheduler.add_task(f'{name}:shard{index}', interval, on_database(shard_path, callback))
+    app.extensions['db_maintenance'] = scheduler
+
+    def _sizes():
+        conn = connect(db_path)
+        try:
+            report = size_report(conn, db_path)
+        finally:
+            conn.close()
+        return {f'{{file="{name}"}}': report[f'{name}_bytes'] for name in ('db', 'wal', 'freelist')}
+
+    def _runs():
+        values = {}
+        # 答题相关的后台任务（api/quiz.py 的 quiz_tasks）独立于维护线程运行，一并计数
+        schedulers = [scheduler] + [app.extensions[key] for key in ('quiz_tasks',) if key in app.extensions]
+        for name, status in (item for each in schedulers for item in each.snapshot().items()):
+            values[f'{{task="{name}",result="ok"}}'] = status['runs'] - status['failures']
+            values[f'{{task="{name}",result="failed"}}'] = status['failures']
+        return values
+
+    registry.gauge('quickqa_db_size_bytes', '数据库文件、WAL 与空闲页占用的字节数', _sizes)
+    registry.gauge('quickqa_db_maintenance_runs', '后台维护任务执行次数', _runs)
+
+    if app.config['MAINTENANCE_ENABLED']:
+        @app.before_request
+        def _start_maintenance():
+            scheduler.start()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+用户逐题掌握度与自适应出题
+user_question_stats 在每次提交答案时增量更新（尝试次数、答对次数、平均用时、连续答对次数、下次复习时间），
+自适应出题只读取该用户的掌握度行与缓存的题库，不扫描答题历史。
+
+复习间隔采用简单的间隔重复：答对后按连续答对次数 1、2、4、8… 天递增（最长 MAX_INTERVAL_DAYS 天），
+答错立即到期并清零连续次数。
+"""
+
+import datetime
+import heapq
+import random
+
+MAX_INTERVAL_DAYS = 32
+
+# 抽样权重：未做过的题为基准，到期题按错误率加权，未到期的题几乎不出
+NEW_WEIGHT = 1.0
+DUE_BASE_WEIGHT = 1.0
+DUE_ERROR_WEIGHT = 4.0
+NOT_DUE_WEIGHT = 0.05
+
+def _timestamp(moment):
+    return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+# DO UPDATE 中未加 excluded. 前缀的列均为更新前的值
+RECORD_ANSWER_SQL = f"""
+    INSERT INTO user_question_stats
+        (user_id, question_id, attempts, correct, avg_time_taken, streak, last_seen, due_at)
+    VALUES (?, ?, 1, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, question_id) DO UPDATE SET
+        attempts = attempts + 1,
+        correct = correct + excluded.correct,
+        avg_time_taken = avg_time_taken + (excluded.avg_time_taken - avg_time_taken) / (attempts + 1),
+        streak = CASE WHEN excluded.correct THEN streak + 1 ELSE 0 END,
+        last_seen = excluded.last_seen,
+        due_at = CASE WHEN excluded.correct
+                      THEN datetime(excluded.last_seen, '+' || min(1 << streak, {MAX_INTERVAL_DAYS}) || ' days')
+                      ELSE excluded.last_seen END
+"""
+
+def _answer_parameters(user_id, question_id, is_correct, time_taken, now):
+    seen = _timestamp(now)
+    first_due = _timestamp(now + datetime.timedelta(days=1)) if is_correct else seen
+    return (user_id, question_id, 1 if is_correct else 0, time_taken or 0,
+            1 if is_correct else 0, seen, first_due)
+
+def record_answer(conn, user_id, question_id, is_correct, time_taken, now=None):
+    """提交答案时更新掌握度（与答题记录在同一事务中）"""
+    conn.execute(RECORD_ANSWER_SQL, _answer_parameters(user_id, question_id, is_correct, time_taken,
+                                                       now or datetime.datetime.now()))
+
+def record_answers(conn, answers):
+    """按顺序批量更新掌握度，answers 为 (user_id, question_id, is_correct, time_taken, 作答时间) 序列"""
+    conn.executemany(RECORD_ANSWER_SQL, (_answer_parameters(*answer) for answer in answers))
+
+def load_user_stats(conn, user_id):
+    """读取用户的全部掌握度行，返回 {question_id: (attempts, correct, due_at)}"""
+    cursor = conn.execute(
+        "SELECT question_id, attempts, correct, due_at FROM user_question_stats WHERE user_id = ?",
+        (user_id,)
+    )
+    return {row[0]: (row[1], row[2], row[3]) for row in cursor.fetchall()}
+
+def question_weight(stats, now_text):
+    """题目的抽样权重"""
+    if stats is None:
+        return NEW_WEIGHT
+    attempts, correct, due_at = stats
+    if due_at is not None and due_at > now_text:
+        return NOT_DUE_WEIGHT
+    # 拉普拉斯平滑后的错误率，避免只做过一次的题权重走极端
+    error_rate = (attempts - correct + 1) / (attempts + 2)
+    return DUE_BASE_WEIGHT + DUE_ERROR_WEIGHT * error_rate
+
+def adaptive_sample(questions, user_stats, count, rng=random, now=None):
+    """按掌握度加权无放回抽取 count 道题（count<=0 表示全部按权重排序）
+
+    questions 须按题目ID排序（题库缓存的顺序）。用户做过的 k 道题在题目列表中二分查找定位、各自加权，
+    其余题目权重相同：每次按两部分的剩余总权重决定抽哪一部分，未做过的题随机取下标（跳过做过的与已抽中的），
+    做过的题在树状数组上按前缀和查找，代价 O(k · log 题库 + count · log k)（期望），不遍历题库。
+    未做过的题不足一半（拒绝采样变慢）或需要全部排序时，对整个题库做 Efraimidis-Spirakis 加权抽样：
+    每题取键 u^(1/w)，保留最大的 count 个，代价 O(题库 · log count)。两种方式的抽样分布相同
+    """
+    now_text = _timestamp(now or datetime.datetime.now())
+    if 0 < count < len(questions):
+        seen = {}  # 下标 -> 权重
+        for question_id, stats in user_stats.items():
+            index = _index_of(questions, question_id)
+            if index is not None:
+                seen[index] = question_weight(stats, now_text)
+        if len(questions) - len(seen) - count >= len(questions) / 2:
+            return _sample_sparse(questions, seen, count, rng)
+
+    keyed = (
+        (rng.random() ** (1.0 / question_weight(user_stats.get(q['id']), now_text)), q)
+        for q in questions
+    )
+    if count <= 0:
+        return [q for _, q in sorted(keyed, key=lambda item: item[0], reverse=True)]
+    return [q for _, q in heapq.nlargest(count, keyed, key=lambda item: item[0])]
+
+def _index_of(questions, question_id):
+    """题目在按ID排序的列表中的下标，不在列表中时返回 None"""
+    lo, hi = 0, len(questions)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if questions[mid]['id'] < question_id:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo if lo < len(questions) and questions[lo]['id'] == question_id else None
+
+def _sample_sparse(questions, seen, count, rng):
+    """逐个按权重无放回抽取：未做过的题（权重均为 NEW_WEIGHT）拒绝采样，做过的题用树状数组"""
+    indexes = list(seen)
+    tree = _WeightTree([seen[index] for index in indexes])
+    unseen_left = len(questions) - len(seen)
+    picked = set()
+    result = []
+    while len(result) < count:
+        unseen_total = NEW_WEIGHT * unseen_left
+        r = rng.random() * (unseen_total + tree.total)
+        if r < unseen_total or not tree.remaining:
+            index = rng.randrange(len(questions))
+            while index in seen or index in picked:
+                index = rng.randrange(len(questions))
+            unseen_left -= 1
+        else:
+            index = indexes[tree.take(r - unseen_total)]
+        picked.add(index)
+        result.append(questions[index])
+    return result
+
+class _WeightTree:
+    """权重的前缀和（树状数组）：按前缀和查找并取走一项为 O(log n)"""
+
+    def __init__(self, weights):
+        self.weights = list(weights)
+        self.tree = [0.0] * (len(self.weights) + 1)
+        for i, weight in enumerate(self.weights, 1):
+            self.tree[i] += weight
+            parent = i + (i & -i)
+            if parent < len(self.tree):
+                self.tree[parent] += self.tree[i]
+        self.total = sum(self.weights)
+        self.remaining = len(self.weights)
+
+    def take(self, value):
+        """取走前缀和首次超过 value 的一项，返回其位置"""
+        position, step = 0, 1 << (len(self.weights).bit_length() - 1)
+        while step:
+            nxt = position + step
+            if nxt < len(self.tree) and self.tree[nxt] <= value:
+                position = nxt
+                value -= self.tree[nxt]
+            step >>= 1
+        if position >= len(self.weights) or self.weights[position] <= 0:
+            # 浮点累计误差使查找越过末尾或落在已取走的项上：改取剩余权重最大的一项
+            position = max(range(len(self.weights)), key=self.weights.__getitem__)
+        weight = self.weights[position]
+        self.weights[position] = 0.0
+        self.total = max(self.total - weight, 0.0)
+        self.remaining -= 1
+        i = position + 1
+        while i < len(self.tree):
+            self.tree[i] -= weight
+            i += i & -i
+        return position
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+响应字段投影
+接口通过 fields=a,b,c（逐个指定字段）或 view=speed|study|full（预设视图）选择输出字段，
+出题、答题历史与答题详情共用同一套解析；接口只查询 / 解码所选字段需要的列。
+不依赖 Flask
+"""
+
+class Projection:
+    """一个接口可输出的字段（按输出顺序）与预设视图，默认视图 full 为全部字段"""
+
+    def __init__(self, fields, views, default_view='full'):
+        self.fields = tuple(fields)
+        self.views = {'full': self.fields}
+        for name, view_fields in views.items():
+            self.views[name] = tuple(field for field in self.fields if field in view_fields)
+        self.default_view = default_view
+
+    def parse(self, fields=None, view=None):
+        """解析请求参数，返回所选字段（按 self.fields 的顺序）；fields 优先于 view，
+        包含未知字段或视图时抛出 ValueError"""
+        if fields:
+            requested = {field.strip() for field in fields.split(',') if field.strip()}
+            unknown = requested.difference(self.fields)
+            if unknown:
+                raise ValueError(f"未知字段: {', '.join(sorted(unknown))}")
+            return tuple(field for field in self.fields if field in requested)
+        view = view or self.default_view
+        if view not in self.views:
+            raise ValueError(f'未知视图: {view}')
+        return self.views[view]
+
+def select_columns(columns, selected, always=()):
+    """所选字段需要的 SQL 列（去重并保持顺序）
+
+    columns: 字段 -> 该字段依赖的列表达式元组；always: 无论是否输出都要查询的字段（如分页游标）
+    """
+    return ', '.join(_column_list(columns, selected, always))
+
+def column_positions(columns, selected, always=()):
+    """所选字段在 select_columns（相同参数）查询结果中的列序号，依赖多列的字段为 None"""
+    result = _column_list(columns, selected, always)
+    return tuple(result.index(columns[field][0]) if len(columns[field]) == 1 else None for field in selected)
+
+def _column_list(columns, selected, always):
+    result = []
+    for field in tuple(always) + tuple(selected):
+        for column in columns[field]:
+            if column not in result:
+                result.append(column)
+    return result
+
+# =============================================================================
+# 各接口的字段定义
+# =============================================================================
+
+# /api/questions/random：从题库缓存按需取字段。答案与详解（correct_answer、correct_option、explanation、
+# 选项的 is_correct）不在可选字段中：正确选项与详解由 submit-answer 在作答后返回，
+# 详解也可作答后通过 /api/questions/<id>/explanation 获取
+QUESTIONS = Projection(
+    ('id', 'title', 'content', 'difficulty_level', 'tags', 'source',
+     'subject_name', 'question_type_name', 'options'),
+    {
+        # 速答：题干与选项，判分由 submit-answer 完成
+        'speed': ('id', 'title', 'content', 'options'),
+        # 学习：另带标签与出处，详解作答后通过 /api/questions/<id>/explanation 获取
+        'study': ('id', 'title', 'content', 'tags', 'source', 'options'),
+    },
+)
+
+def project_question(question, fields):
+    """按所选字段输出题目（题库快照中的题目只解码所选字段；选项只输出 id 与 text）"""
+    result = {}
+    for field in fields:
+        if field == 'options':
+            result['options'] = [{'id': option['id'], 'text': option['text']} for option in question['options']]
+        else:
+            result[field] = question[field]
+    return result
+
+# /api/quiz/history
+HISTORY = Projection(
+    ('id', 'mode', 'start_time', 'end_time', 'total_questions', 'correct_answers', 'accuracy',
+     'time_spent', 'completed', 'created_at'),
+    {
+        'speed': ('id', 'mode', 'start_time', 'correct_answers', 'total_questions', 'time_spent'),
+        'study': ('id', 'mode', 'start_time', 'total_questions', 'correct_answers', 'accuracy', 'completed'),
+    },
+)
+HISTORY_COLUMNS = {
+    'id': ('id',),
+    'mode': ('mode',),
+    'start_time': ('start_time',),
+    'end_time': ('end_time',),
+    'total_questions': ('total_questions',),
+    'correct_answers': ('correct_answers',),
+    'accuracy': ('total_questions', 'correct_answers'),
+    'time_spent': ('time_spent',),
+    'completed': ('completed',),
+    'created_at': ('created_at',),
+}
+
+# /api/quiz/<id>/details
+DETAILS = Projection(
+    ('question_id', 'question_title', 'question_content', 'selected_text', 'correct_text', 'is_correct',
+     'attempt_count', 'time_taken', 'explanation', 'answered_at'),
+    {
+        'speed': ('question_id', 'question_content', 'selected_text', 'correct_text', 'is_correct'),
+        'study': ('question_id', 'question_title', 'question_content', 'selected_text', 'correct_text',
+                  'is_correct', 'attempt_count', 'time_taken', 'answered_at'),
+    },
+)
+# 列表达式的结果列名与字段名一致
+DETAIL_COLUMNS = {
+    'question_id': ('qa.question_id',),
+    'question_title': ('q.title as question_title',),
+    'question_content': ('q.content as question_content',),
+    'selected_text': ('o.option_text as selected_text',),
+    'correct_text': ('co.option_text as correct_text',),
+    'is_correct': ('qa.is_correct',),
+    'attempt_count': ('qa.attempt_count',),
+    'time_taken': ('qa.time_taken',),
+    'explanation': ('q.explanation',),
+    'answered_at': ('qa.answered_at',),
+}
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内发布/订阅中心
+发布方只序列化一次消息，所有订阅者共享同一份字节；每个订阅者持有有界队列，
+消费过慢（队列满）时标记为落后，由订阅方改发一次完整快照重新同步。
+应用以 WSGI 运行，每个 SSE 连接在整个连接期间占用一个工作线程（阻塞在订阅队列上），
+因此订阅数有总上限与按主题类别（主题中冒号前的部分，如 battle）的上限；
+同一用户在同一主题上重连时旧订阅被取代，旧连接随即退出，不会同时占用两个线程
+"""
+
+import queue
+import threading
+
+class Subscriber:
+    """一个订阅者（通常对应一个 SSE 连接）"""
+
+    def __init__(self, topic, maxsize, owner=None):
+        self.topic = topic
+        self.owner = owner
+        self.queue = queue.Queue(maxsize)
+        self.lagging = False
+        self.superseded = False  # 同一用户在同一主题上建立了新的订阅，本连接应结束
+
+    def get(self, timeout):
+        """取下一条消息，超时返回 None"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def supersede(self):
+        """标记为已被取代并唤醒等待中的连接"""
+        self.superseded = True
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass  # 队列已满时等待中的连接会立即取到消息并看到标记
+
+    def drain(self):
+        """丢弃积压的消息（重新同步前调用）"""
+        self.lagging = False
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+class PubSubHub:
+    """按主题分发消息"""
+
+    def __init__(self, queue_size=16, max_subscribers=1000):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.lock = threading.Lock()
+        self.limits = {}  # 主题类别 -> 该类订阅者数上限
+        self.topics = {}  # topic -> set(Subscriber)
+        self.count = 0
+        self.kind_counts = {}
+
+    def subscribe(self, topic, owner=None):
+        """订阅主题；订阅者总数或该类主题的订阅者数已达上限时返回 None
+
+        owner: 订阅者所属的用户；该用户在同一主题上已有的订阅被取代（不计入上限）
+        """
+        kind = topic_kind(topic)
+        with self.lock:
+            replaced = [subscriber for subscriber in self.topics.get(topic, ())
+                        if owner is not None and subscriber.owner == owner]
+            if (self.count - len(replaced) >= self.max_subscribers or
+                    self.kind_counts.get(kind, 0) - len(replaced) >= self.limits.get(kind, self.max_subscribers)):
+                return None
+            for subscriber in replaced:
+                self._remove(subscriber)
+            subscriber = Subscriber(topic, self.queue_size, owner)
+            self.topics.setdefault(topic, set()).add(subscriber)
+            self.count += 1
+            self.kind_counts[kind] = self.kind_counts.get(kind, 0) + 1
+        for old in replaced:
+            old.supersede()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        """取消订阅（已被取代的订阅已移除，不再重复计数）"""
+        with self.lock:
+            self._remove(subscriber)
+
+    def _remove(self, subscriber):
+        subscribers = self.topics.get(subscriber.topic)
+        if subscribers and subscriber in subscribers:
+            subscribers.discard(subscriber)
+            self.count -= 1
+            self.kind_counts[topic_kind(subscriber.topic)] -= 1
+            if not subscribers:
+                del self.topics[subscriber.topic]
+
+    def subscriber_count(self, topic=None):
+        """某主题（或全部）的订阅者数"""
+        with self.lock:
+            if topic is None:
+                return self.count
+            return len(self.topics.get(topic, ()))
+
+    def publish(self, topic, message):
+        """向主题的全部订阅者投递消息（不阻塞），返回投递成功的订阅者数"""
+        with self.lock:
+            subscribers = list(self.topics.get(topic, ()))
+        delivered = 0
+        for subscriber in subscribers:
+            if subscriber.lagging:
+                continue
+            try:
+                subscriber.queue.put_nowait(message)
+                delivered += 1
+            except queue.Full:
+                subscriber.lagging = True
+        return delivered
+
+def topic_kind(topic):
+    """主题类别（如 battle:ABC123 -> battle）"""
+    return topic.partition(':')[0]
+
+def sse_frame(event, data, event_id=None):
+    """编码一条 SSE 消息（data 为已序列化的 JSON 字符串）"""
+    lines = [f'event: {event}']
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.extend(f'data: {line}' for line in data.split('\n'))
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+# 全局中心（每个进程一份）
+hub = PubSubHub()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内题库缓存
+题库只由导入脚本离线修改，按学科整体加载（题目与选项各一条查询）后常驻内存，
+出题、判分等热路径不再逐题查询选项；ttl 到期后重新加载以感知重新导入。
+配置了题库快照（services/bank_snapshot.py）且与数据库一致时改用只读映射的快照，多进程共享内存
+"""
+
+import json
+import os
+import threading
+import time
+
+from services.bank_snapshot import open_snapshot, bank_revision
+
+class SubjectBank:
+    """一个学科的题库快照（只读）"""
+
+    def __init__(self, subject_name, questions):
+        self.subject_name = subject_name
+        self.questions = questions  # 按题目ID排序的题目字典列表
+        self.by_id = {q['id']: q for q in questions}
+
+    def with_tag(self, tag):
+        """本学科中带有该标签的题目"""
+        return [q for q in self.questions if tag in q['tags']]
+
+class QuestionBank:
+    """按学科缓存题库
+
+    snapshot_path 指向题库快照时优先使用快照：每 ttl 秒检查一次文件是否被替换、修订号是否与数据库一致，
+    不可用时回退为从数据库加载
+    """
+
+    def __init__(self, ttl=300, snapshot_path=None):
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.lock = threading.Lock()
+        self.subjects = {}  # subject_name -> (SubjectBank, expires)
+        self.snapshot = None
+        self.snapshot_checked = None  # 上次检查快照的时间
+
+    def get(self, conn, subject_name):
+        """返回学科题库，未命中或过期时用给定连接加载"""
+        now = time.monotonic()
+        snapshot = self._current_snapshot(conn, now)
+        if snapshot is not None:
+            return snapshot.subject(subject_name)
+        with self.lock:
+            cached = self.subjects.get(subject_name)
+            if cached is not None and now < cached[1]:
+                return cached[0]
+
+        bank = load_subject_bank(conn, subject_name)
+        with self.lock:
+            self.subjects[subject_name] = (bank, now + self.ttl if self.ttl else float('inf'))
+        return bank
+
+    def invalidate(self, subject_name=None):
+        """使某个学科（或全部）的缓存失效"""
+        with self.lock:
+            if subject_name is None:
+                self.subjects.clear()
+                self.snapshot_checked = None
+            else:
+                self.subjects.pop(subject_name, None)
+
+    def _current_snapshot(self, conn, now):
+        """当前可用的快照（未配置、文件不存在或与数据库不一致时为 None）"""
+        if not self.snapshot_path:
+            return None
+        with self.lock:
+            checked, snapshot = self.snapshot_checked, self.snapshot
+        if checked is not None and (not self.ttl or now - checked < self.ttl):
+            return snapshot
+
+        try:
+            stat = os.stat(self.snapshot_path)
+        except OSError:
+            stat = None
+        if stat is None:
+            snapshot = None
+        elif snapshot is None or (stat.st_ino, stat.st_mtime_ns) != (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns):
+            # 文件被替换：映射新文件，旧映射留给仍在使用它的请求，随引用释放
+            snapshot = open_snapshot(self.snapshot_path)
+        if snapshot is not None and (snapshot.revision is None or snapshot.revision != bank_revision(conn)):
+            snapshot = None
+        with self.lock:
+            self.snapshot, self.snapshot_checked = snapshot, now
+        return snapshot
+
+def load_subject_bank(conn, subject_name):
+    """加载某学科的全部题目及选项"""
+    cursor = conn.execute("""
+        SELECT q.id, q.title, q.content, q.correct_answer, q.explanation,
+               q.difficulty_level, q.tags, q.source,
+               s.name as subject_name, qt.name as question_type_name
+        FROM questions q
+        JOIN subjects s ON q.subject_id = s.id
+        JOIN question_types qt ON q.question_type_id = qt.id
+        WHERE s.name = ?
+        ORDER BY q.id
+    """, (subject_name,))
+
+    questions = []
+    for row in cursor.fetchall():
+        questions.append({
+            'id': row['id'],
+            'title': row['title'],
+            'content': row['content'],
+            'correct_answer': row['correct_answer'],
+            'explanation': row['explanation'],
+            'difficulty_level': row['difficulty_level'],
+            'tags': json.loads(row['tags']) if row['tags'] else [],
+            'source': row['source'],
+            'subject_name': row['subject_name'],
+            'question_type_name': row['question_type_name'],
+            'options': [],
+            'correct_option': None
+        })
+    by_id = {q['id']: q for q in questions}
+
+    # 一次取出本学科全部选项，再按题目归组
+    cursor = conn.execute("""
+        SELECT o.id, o.question_id, o.option_text, o.is_correct
+        FROM options o
+        JOIN questions q ON o.question_id = q.id
+        JOIN subjects s ON q.subject_id = s.id
+        WHERE s.name = ?
+        ORDER BY q.id, o.option_order
+    """, (subject_name,))
+    for row in cursor.fetchall():
+        option = {
+            'id': row['id'],
+            'text': row['option_text'],
+            'is_correct': bool(row['is_correct'])
+        }
+        question = by_id[row['question_id']]
+        question['options'].append(option)
+        if option['is_correct']:
+            question['correct_option'] = option
+
+    return SubjectBank(subject_name, questions)
+
+# 全局题库缓存（每个进程一份）
+question_bank = QuestionBank()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线题库包
+按学科把题库打成一个以内容哈希为版本号的题库包，去掉答案（正确选项、答案字母与详解），判分仍在服务端；
+同一版本的内容永不改变，可被客户端长期缓存。每个版本的清单（题目ID -> 题目内容哈希）记录在
+question_pack_versions 表中，客户端持有旧版本时只需下载变化的题目。
+不依赖 Flask
+"""
+
+import hashlib
+import json
+import threading
+
+DEFAULT_KEEP_VERSIONS = 20  # 每个学科保留的版本清单数（更早的版本只能整包更新）
+
+# 题库包中的题目字段（难度随校准频繁变化且客户端不使用，不放入题库包）
+PACK_FIELDS = ('id', 'title', 'content', 'tags', 'source', 'subject_name', 'question_type_name')
+
+def _canonical(value):
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+def _digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+def pack_question(question):
+    """去掉答案后的题目（选项只保留ID与文本，按原顺序）"""
+    packed = {field: question[field] for field in PACK_FIELDS}
+    packed['options'] = [{'id': option['id'], 'text': option['text']} for option in question['options']]
+    return packed
+
+class QuestionPack:
+    """一个学科某一版本的题库包（只读）"""
+
+    def __init__(self, subject_name, questions):
+        self.subject_name = subject_name
+        self.questions = sorted((pack_question(q) for q in questions), key=lambda q: q['id'])
+        encoded = [_canonical(q) for q in self.questions]
+        self.hashes = {q['id']: _digest(text) for q, text in zip(self.questions, encoded)}
+        self.version = _digest(_canonical(subject_name) + '\n' + '\n'.join(encoded))
+        # 响应体预先编码，整包请求直接返回
+        self.body = _canonical({
+            'subject': subject_name,
+            'version': self.version,
+            'questions': self.questions,
+        }).encode('utf-8')
+
+    def manifest(self):
+        return {str(question_id): digest for question_id, digest in self.hashes.items()}
+
+    def delta(self, since_manifest):
+        """相对旧版本清单的变化：(变化或新增的题目, 删除的题目ID)"""
+        changed = [q for q in self.questions if since_manifest.get(str(q['id'])) != self.hashes[q['id']]]
+        removed = sorted(int(question_id) for question_id in since_manifest if int(question_id) not in self.hashes)
+        return changed, removed
+
+def load_manifest(conn, subject_name, version):
+    """某版本的清单，未记录（或已清理）时返回 None"""
+    row = conn.execute(
+        "SELECT manifest FROM question_pack_versions WHERE subject_name = ? AND version = ?",
+        (subject_name, version)
+    ).fetchone()
+    return json.loads(row[0]) if row else None
+
+def record_version(conn, pack, keep_versions=DEFAULT_KEEP_VERSIONS):
+    """记录题库包版本清单并清理过旧的版本，已记录时不写库"""
+    exists = conn.execute(
+        "SELECT 1 FROM question_pack_versions WHERE subject_name = ? AND version = ?",
+        (pack.subject_name, pack.version)
+    ).fetchone()
+    if exists:
+        return False
+    conn.execute(
+        "INSERT OR IGNORE INTO question_pack_versions (subject_name, version, manifest, question_count) VALUES (?, ?, ?, ?)",
+        (pack.subject_name, pack.version, _canonical(pack.manifest()), len(pack.questions))
+    )
+    # 每个学科只有少量版本：按写入顺序（rowid）保留最新的 keep_versions 个
+    rowids = sorted(row[0] for row in conn.execute(
+        "SELECT rowid FROM question_pack_versions WHERE subject_name = ?", (pack.subject_name,)
+    ))
+    if len(rowids) > keep_versions:
+        conn.executemany("DELETE FROM question_pack_versions WHERE rowid = ?",
+                         [(rowid,) for rowid in rowids[:-keep_versions]])
+    conn.commit()
+    return True
+
+class QuestionPackCache:
+    """按学科缓存当前题库包：题库缓存返回的题库对象不变时复用，题库重新加载后重新打包"""
+
+    def __init__(self, keep_versions=DEFAULT_KEEP_VERSIONS):
+        self.keep_versions = keep_versions
+        self.lock = threading.Lock()
+        self.packs = {}  # subject_name -> (题库对象, QuestionPack)
+
+    def get(self, conn, bank):
+        with self.lock:
+            cached = self.packs.get(bank.subject_name)
+            if cached is not None and cached[0] is bank:
+                return cached[1]
+        pack = QuestionPack(bank.subject_name, bank.questions)
+        if cached is None or cached[1].version != pack.version:
+            record_version(conn, pack, self.keep_versions)
+        with self.lock:
+            self.packs[bank.subject_name] = (bank, pack)
+        return pack
+
+# 全局题库包缓存（每个进程一份）
+question_packs = QuestionPackCache()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内活动答题会话
+以 quiz_record_id 为键保存进行中答题的归属、模式、开始时间、本轮题目顺序与逐题作答状态，
+提交答案时的归属校验与作答状态在内存中完成（结束时的统计以数据库中的单题记录为准）。
+未命中（进程重启、被淘汰或由其他进程开始）时从数据库重建，结果与直接查询数据库一致；
+超过 ttl 未活动的会话被淘汰。默认 ttl 为 0（不缓存，每次从数据库重建）：多进程部署时各进程的缓存
+互不可见，只有单进程或按答题记录粘性路由时才应开启。
+"""
+
+import datetime
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 0  # 会话无活动的淘汰时间（秒），0 表示不缓存
+DEFAULT_MAX_SESSIONS = 50000
+
+def parse_timestamp(value):
+    """解析数据库中的时间（兼容 SQLite 默认格式的空格/"T" 分隔）"""
+    if isinstance(value, datetime.datetime):
+        return value
+    return datetime.datetime.fromisoformat(str(value).replace(' ', 'T'))
+
+class QuizSession:
+    """一次进行中的答题"""
+
+    __slots__ = ('quiz_record_id', 'user_id', 'mode', 'start_time', 'created_at', 'completed', 'question_order',
+                 'served', 'answers', 'lock')
+
+    def __init__(self, quiz_record_id, user_id, mode, start_time, created_at, question_order=None, completed=False):
+        self.quiz_record_id = quiz_record_id
+        self.user_id = user_id
+        self.mode = mode
+        self.completed = bool(completed)  # 已结束（包括对战记录，写入时即为已结束）
+        self.start_time = parse_timestamp(start_time)
+        self.created_at = created_at
+        self.question_order = list(question_order or [])  # 本轮下发的题目顺序（为空表示不限制）
+        self.served = frozenset(self.question_order)
+        self.answers = {}  # question_id -> [answer_id, is_correct, attempt_count, time_taken]（answer_id 为 None 表示只在作答日志中）
+        self.lock = threading.Lock()
+
+    def allows(self, question_id):
+        """题目是否属于本轮（未登记题目顺序时不限制）"""
+        return not self.served or question_id in self.served
+
+    def apply_answer(self, question_id, answer_id, is_correct, attempt_count, time_taken):
+        """记录一道题的最新作答状态（与 question_answers 每题一行、保留最后一次结果一致）"""
+        with self.lock:
+            self.answers[question_id] = [answer_id, bool(is_correct), attempt_count, time_taken]
+
+    def existing_answer(self, question_id):
+        """本题已有的作答行 (answer_id, attempt_count, time_taken)，未作答时返回 None"""
+        with self.lock:
+            answer = self.answers.get(question_id)
+            return None if answer is None else (answer[0], answer[2], answer[3])
+
+def load_session(conn, quiz_record_id):
+    """从数据库重建会话（答题记录一条查询，单题记录按 quiz_record_id 索引一条查询），记录不存在时返回 None
+
+    单题记录与作答日志中尚未压缩的事件在同一条语句中读取（同一快照），事件按顺序叠加在单题记录之上
+    """
+    record = conn.execute(
+        "SELECT user_id, mode, start_time, created_at, completed FROM quiz_records WHERE id = ?",
+        (quiz_record_id,)
+    ).fetchone()
+    if record is None:
+        return None
+    session = QuizSession(quiz_record_id, record['user_id'], record['mode'], record['start_time'],
+                          record['created_at'], completed=record['completed'])
+    cursor = conn.execute("""
+        SELECT 0 AS pending, id, question_id, is_correct, attempt_count, time_taken
+        FROM question_answers WHERE quiz_record_id = ?
+        UNION ALL
+        SELECT 1 AS pending, id, question_id, is_correct, attempt_count, time_taken
+        FROM answer_events WHERE quiz_record_id = ?
+    """, (quiz_record_id, quiz_record_id))
+    for pending, answer_id, question_id, is_correct, attempt_count, time_taken in sorted(
+            cursor.fetchall(), key=lambda row: (row[0], row[1])):
+        if pending:
+            # 事件中的尝试次数与用时是增量
+            existing = session.existing_answer(question_id)
+            if existing is not None:
+                answer_id = existing[0]
+                attempt_count += existing[1] or 0
+                time_taken = (existing[2] or 0) + (time_taken or 0)
+            else:
+                answer_id = None
+        session.apply_answer(question_id, answer_id, is_correct, attempt_count, time_taken)
+    return session
+
+class SessionRegistry:
+    """活动会话表（LRU 顺序，按最后活动时间淘汰）
+
+    多进程部署时同一轮答题的请求可能落在不同进程，此时应按 quiz_record_id 粘性路由，
+    或把 ttl 设为 0（不缓存，每次从数据库重建）
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.sessions = OrderedDict()  # quiz_record_id -> (QuizSession, 最后活动时间)
+
+    def put(self, session):
+        """登记会话（ttl 为 0 时不缓存）"""
+        if not self.ttl:
+            return session
+        now = time.monotonic()
+        with self.lock:
+            self.sessions[session.quiz_record_id] = (session, now)
+            self.sessions.move_to_end(session.quiz_record_id)
+            self._evict(now)
+        return session
+
+    def get(self, conn, quiz_record_id):
+        """取会话并刷新活动时间；未命中或已过期时从数据库重建，记录不存在时返回 None"""
+        now = time.monotonic()
+        with self.lock:
+            cached = self.sessions.get(quiz_record_id)
+            if cached is not None and now - cached[1] < self.ttl:
+                self.sessions[quiz_record_id] = (cached[0], now)
+                self.sessions.move_to_end(quiz_record_id)
+                return cached[0]
+        session = load_session(conn, quiz_record_id)
+        if session is None:
+            return None
+        with self.lock:
+            # 重建期间其他请求可能已登记，以先登记者为准
+            cached = self.sessions.get(quiz_record_id)
+            if cached is not None and now - cached[1] < self.ttl:
+                return cached[0]
+        return self.put(session)
+
+    def discard(self, quiz_record_id):
+        with self.lock:
+            self.sessions.pop(quiz_record_id, None)
+
+    def evict_expired(self):
+        """淘汰过期会话，返回淘汰数"""
+        with self.lock:
+            return self._evict(time.monotonic())
+
+    def _evict(self, now):
+        evicted = 0
+        # 按最后活动时间排列，从最旧的开始检查即可
+        while self.sessions:
+            quiz_record_id, (_, touched) = next(iter(self.sessions.items()))
+            if now - touched < self.ttl and len(self.sessions) <= self.max_sessions:
+                break
+            self.sessions.popitem(last=False)
+            evicted += 1
+        return evicted
+
+    def __len__(self):
+        return len(self.sessions)
+
+# 全局会话表（每个进程一份）
+sessions = SessionRegistry()
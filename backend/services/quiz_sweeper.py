@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自动结束被放弃的答题
+关闭页面等情况下 finish_quiz 不会被调用，答题记录一直保持 completed = FALSE。
+定期按 (completed, start_time) 索引找出超过模式时限的未完成记录，分批用一条集合式 UPDATE
+汇总其单题记录并结束答题，同时计入排行榜汇总表（与 finish_quiz 的结果一致）。
+不依赖 Flask，后端的定时维护线程与命令行工具（database/maintenance.py sweep）共用
+"""
+
+import datetime
+
+from services import leaderboard_rollups, answer_journal
+
+MODE_TIME_LIMITS = {'speed': 60, 'study': None}  # 每轮时限（秒），None 表示不限时
+# 开始后超过该秒数仍未结束即视为放弃（速答留出网络延迟的余量，学习模式按长时间无人结束处理）
+DEFAULT_STALE_AFTER = {'speed': 600, 'study': 6 * 3600}
+DEFAULT_BATCH_SIZE = 200
+
+# 用时：从记录创建到最后一次作答（两者同为数据库 UTC 时间）；限时模式不超过时限
+FINALIZE_SQL = """
+    UPDATE quiz_records
+    SET total_questions = a.total_questions,
+        correct_answers = a.correct_answers,
+        time_spent = a.time_spent,
+        end_time = datetime(quiz_records.start_time, '+' || a.time_spent || ' seconds'),
+        completed = TRUE
+    FROM (
+        SELECT qr.id,
+               COUNT(DISTINCT qa.question_id) as total_questions,
+               COALESCE(SUM(qa.is_correct), 0) as correct_answers,
+               MIN(COALESCE(?, 1e9), MAX(0, CAST(ROUND(
+                   (julianday(COALESCE(MAX(qa.answered_at), qr.created_at)) - julianday(qr.created_at)) * 86400
+               ) AS INTEGER))) as time_spent
+        FROM quiz_records qr
+        LEFT JOIN question_answers qa ON qa.quiz_record_id = qr.id
+        WHERE qr.id IN ({placeholders})
+        GROUP BY qr.id
+    ) a
+    WHERE quiz_records.id = a.id AND quiz_records.completed = FALSE
+    RETURNING quiz_records.user_id, quiz_records.mode, quiz_records.id, quiz_records.correct_answers,
+              quiz_records.total_questions, quiz_records.time_spent, quiz_records.created_at, quiz_records.end_time
+"""
+
+def find_stale(conn, mode, cutoff, limit):
+    """开始时间早于 cutoff 的未完成答题记录ID（按开始时间从早到晚）"""
+    cursor = conn.execute("""
+        SELECT id FROM quiz_records
+        WHERE completed = FALSE AND start_time < ? AND mode = ?
+        ORDER BY start_time
+        LIMIT ?
+    """, (cutoff, mode, limit))
+    return [row[0] for row in cursor.fetchall()]
+
+def finalize_batch(conn, mode, quiz_record_ids, now=None):
+    """结束一批答题并计入排行榜汇总表（由调用方提交事务），返回结束的成绩行
+
+    成绩行为 (user_id, mode, quiz_record_id, correct_answers, total_questions, time_spent, created_at, end_time)
+    """
+    if not quiz_record_ids:
+        return []
+    # 先合并这些答题尚未压缩的作答事件，汇总与 finish_quiz 一样包含全部作答
+    answer_journal.compact_quizzes(conn, quiz_record_ids)
+    placeholders = ','.join('?' * len(quiz_record_ids))
+    cursor = conn.execute(FINALIZE_SQL.format(placeholders=placeholders),
+                          [MODE_TIME_LIMITS.get(mode)] + list(quiz_record_ids))
+    results = [tuple(row) for row in cursor.fetchall()]
+    leaderboard_rollups.record_late_results(conn, results, now)
+    return results
+
+def finalize_abandoned(conn, stale_after=None, batch_size=DEFAULT_BATCH_SIZE, max_batches=None,
+                       now=None, on_finalized=None):
+    """分批结束超过时限的未完成答题，每批一个事务，返回结束的记录数
+
+    on_finalized(results) 在每批提交后调用（如更新进程内的排行榜缓存与活动会话）
+    """
+    stale_after = dict(DEFAULT_STALE_AFTER, **(stale_after or {}))
+    now = now or datetime.datetime.now()
+    finalized = batches = 0
+    for mode, seconds in stale_after.items():
+        cutoff = now - datetime.timedelta(seconds=seconds)
+        while max_batches is None or batches < max_batches:
+            ids = find_stale(conn, mode, cutoff, batch_size)
+            if not ids:
+                break
+            # 显式开启事务：维护连接为自动提交模式，with conn 不会把一批语句放进同一事务
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                results = finalize_batch(conn, mode, ids, now)
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            batches += 1
+            finalized += len(results)
+            if on_finalized and results:
+                on_finalized(results)
+            if len(ids) < batch_size:
+                break
+    return finalized
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+旧库升级
+新功能引入的表（以及建在其上的索引、触发器）定义在 database/extended_schema.sql 中，
+init_database.py 只在新建数据库时执行一次。启动时按同一份定义补建旧库缺少的对象（语句均为 IF NOT EXISTS，
+已存在的对象不变；表的初始行为 INSERT OR IGNORE，随表一起执行），不需要重新初始化数据库。
+分片库只补建分片表上的对象。不依赖 Flask
+"""
+
+import re
+from pathlib import Path
+
+from services.shards import SHARD_TABLES, split_statements, schema_object, read_shard_info
+from services.maintenance import connect as maintenance_connect
+
+SCHEMA_PATH = Path(__file__).resolve().parents[2] / 'database' / 'extended_schema.sql'
+
+_SEED_PATTERN = re.compile(r'INSERT\s+OR\s+IGNORE\s+INTO\s+(\w+)', re.IGNORECASE)
+
+# 需要在旧库上补建的对象：写表名时连同建在该表上的索引一起补建，索引与触发器也可按名称单独列出
+UPGRADE_OBJECTS = (
+    'leaderboard_rollups',  # 分时段排行榜汇总表（补建后首次访问排行榜时从答题记录重建）
+    'user_question_stats',  # 用户逐题掌握度（提交答案时写入；旧库从空表开始累计）
+    # 逐题统计汇总与维护它们的触发器（旧库补建后只累计新的作答，
+    # 已有单题记录用 database/calibrate_difficulty.py --rebuild-stats 回填）
+    'question_stats', 'question_time_buckets', 'question_option_picks',
+    'update_question_stats_after_answer', 'update_question_stats_after_answer_update',
+    'archived_quizzes',  # 已归档的答题记录（空表表示尚未归档过）
+    'question_pack_versions',  # 题库包版本清单（预热与首次出题时登记当前版本）
+    'groups', 'group_members', 'group_invitations',  # 班级/分组、成员与待接受的邀请
+    'group_export_consents',  # 成员对组长导出其答题数据的授权
+    'idx_options_question_order',  # 按题目与顺序读取选项
+    'idx_quiz_records_user_history', 'idx_quiz_records_user_mode_history',  # 答题历史键集分页的覆盖索引
+    'idx_quiz_records_open',  # 自动结束被放弃的答题时按开始时间范围查找未完成的记录
+    'idx_user_sessions_active_expires',  # 刷新令牌与清理过期会话按 (is_active, expires_at) 查找
+    # 题库修订号（含初始行）与题目 / 选项表上递增它的触发器（题库快照据此判断是否过期）
+    'bank_revision',
+    'bump_bank_revision_after_question_insert', 'bump_bank_revision_after_question_update',
+    'bump_bank_revision_after_question_delete', 'bump_bank_revision_after_option_insert',
+    'bump_bank_revision_after_option_update', 'bump_bank_revision_after_option_delete',
+)
+
+def upgrade_statements(script, names=UPGRADE_OBJECTS, tables=None):
+    """扩展架构中 names 所列对象的建立语句（按脚本中的顺序）
+
+    tables: 只保留建在这些表上的对象（分片库传入 SHARD_TABLES）
+    """
+    names = set(names)
+    statements = []
+    for statement in split_statements(script):
+        parsed = schema_object(statement)
+        if parsed is None:
+            # 所列表的初始行（INSERT OR IGNORE，重复执行不变）
+            seed = _SEED_PATTERN.match(statement)
+            if seed is None or seed.group(1) not in names:
+                continue
+            table = seed.group(1)
+        else:
+            kind, name, on_table = parsed
+            table = name if kind == 'TABLE' else on_table
+            if kind == 'VIEW' or not (name in names or kind == 'INDEX' and on_table in names):
+                continue
+        if tables is None or table in tables:
+            statements.append(statement)
+    return statements
+
+def upgrade_database(conn, script, shard=False):
+    """补建缺少的对象，返回新建的对象名（已是最新时为空）"""
+    statements = upgrade_statements(script, tables=SHARD_TABLES if shard else None)
+    if not statements:
+        return []
+    before = _object_names(conn)
+    conn.executescript('\n'.join(statements))
+    return sorted(name for name in _object_names(conn) - before if not name.startswith('sqlite_'))
+
+def _object_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master")}
+
+def upgrade_databases(paths, logger=None):
+    """升级各数据库文件（主库或分片，按 shard_info 识别），返回 {路径: 新建的对象名}"""
+    script = SCHEMA_PATH.read_text(encoding='utf-8')
+    upgraded = {}
+    for path in paths:
+        conn = maintenance_connect(path)
+        try:
+            created = upgrade_database(conn, script, shard=read_shard_info(conn) is not None)
+        finally:
+            conn.close()
+        upgraded[path] = created
+        if created and logger is not None:
+            logger.info(f"{path}: 已补建 {', '.join(created)}")
+    return upgraded
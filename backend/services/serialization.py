@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+API 响应的 JSON 序列化
+FastJSONProvider 替换 Flask 默认的 JSON 提供者：安装了 orjson 时用它编码响应（直接生成 UTF-8 字节，
+省去标准库编码器逐个对象分派与 str → bytes 的往返），未安装或配置为 stdlib 时与 Flask 默认行为完全相同。
+两种编码输出的 JSON 等价：键同样排序，日期同样输出为 HTTP 日期格式，调试模式同样缩进；
+区别只在于 orjson 不转义非 ASCII 字符。orjson 不支持的值（超出 64 位的整数等）自动改用标准库编码。
+
+row_mapper 为一条查询编译一次 sqlite3 行 → dict 的转换函数（生成一个返回字典字面量的函数），
+代替在循环里逐字段赋值、逐个判断字段类型的写法。
+"""
+
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # 可选依赖：未安装时使用标准库
+    orjson = None
+
+BACKENDS = ('auto', 'orjson', 'stdlib')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """优先使用 orjson 编码的 JSON 提供者；dumps 带额外参数时交给标准库（orjson 不支持这些参数）。
+    解析请求体仍用标准库：请求体很小，且 orjson 会把超出 64 位的整数解析为浮点数"""
+
+    use_orjson = orjson is not None
+
+    def _options(self, indent=False):
+        # 日期与 dataclass 交给 default（即 Flask 的默认转换），保持与标准库编码相同的输出
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def encode(self, obj, indent=False):
+        """编码为 UTF-8 字节"""
+        if self.use_orjson:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._options(indent))
+            except orjson.JSONEncodeError:
+                pass  # 标准库能编码的照常输出，确实无法编码的由标准库抛出 TypeError
+        if indent:
+            return super().dumps(obj, indent=2).encode('utf-8')
+        return super().dumps(obj, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if not self.use_orjson or kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.encode(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        if not self.use_orjson:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(self.encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+def init_json(app):
+    """按配置 JSON_BACKEND（auto | orjson | stdlib，默认 auto：已安装 orjson 时使用）替换应用的 JSON 提供者"""
+    app.config.setdefault('JSON_BACKEND', os.environ.get('QUIZ_JSON_BACKEND', 'auto'))
+    backend = app.config['JSON_BACKEND']
+    if backend not in BACKENDS:
+        raise ValueError(f"JSON_BACKEND 须为 {' / '.join(BACKENDS)}: {backend}")
+    if backend == 'orjson' and orjson is None:
+        raise RuntimeError('JSON_BACKEND=orjson 但未安装 orjson（pip install orjson）')
+
+    app.json_provider_class = FastJSONProvider
+    app.json = FastJSONProvider(app)
+    app.json.use_orjson = backend != 'stdlib' and orjson is not None
+    app.logger.info(f"JSON 编码: {'orjson' if app.json.use_orjson else 'stdlib'}")
+
+def row_mapper(fields, keys=None, converters=None, computed=None, extra=()):
+    """编译行转换函数 map_row(row, *extra) -> dict
+
+    fields: 输出字段（按顺序）；keys: 各字段在行中的键，默认为字段名，查询列顺序固定时可传列序号（更快）；
+    converters: 字段 -> 作用于该列值的转换（如 bool）；computed: 字段 -> 作用于整行的函数（值由多列计算）；
+    extra: 调用时追加的位置参数名，原样输出为同名字段（如名次 rank）
+    """
+    fields = tuple(fields)
+    keys = fields if keys is None else tuple(keys)
+    if len(keys) != len(fields):
+        raise ValueError('keys 与 fields 的数量不一致')
+    converters = converters or {}
+    computed = computed or {}
+    for name in extra:
+        if not name.isidentifier() or name == 'row':
+            raise ValueError(f'无效的参数名: {name}')
+
+    namespace = {}
+    items = [f'{name!r}: {name}' for name in extra]
+    for i, (field, key) in enumerate(zip(fields, keys)):
+        if field in computed:
+            namespace[f'_f{i}'] = computed[field]
+            items.append(f'{field!r}: _f{i}(row)')
+        elif field in converters:
+            namespace[f'_f{i}'] = converters[field]
+            items.append(f'{field!r}: _f{i}(row[{key!r}])')
+        else:
+            items.append(f'{field!r}: row[{key!r}]')
+    params = ', '.join(('row',) + tuple(extra))
+    exec(f"def map_row({params}):\n    return {{{', '.join(items)}}}\n", namespace)
+    return namespace['map_row']
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按用户分片存储
+可选的分片模式下，用户产生的数据（答题记录、单题记录、登录会话、掌握度、排行榜汇总与逐题统计）
+按用户ID的哈希分散到 N 个 SQLite 文件，各分片各自持有写锁，写入吞吐随分片数增长；
+用户、分组与题库仍在共享库（主库）中，分片连接以别名 shared 附加主库，题库表照常按表名访问。
+每次（重新）划分时各分片的自增ID从高于全部已有ID的不同区间（区间宽 SHARD_ID_STRIDE）开始，
+答题记录、单题记录与会话ID在各分片间不重复。
+分片中的 users 表只是镜像（ID、用户名与答题累计），供触发器累计与排行榜取用户名；账号信息以主库为准。
+分片由 database/reshard.py 创建与重新划分。不依赖 Flask
+"""
+
+import os
+import re
+import sqlite3
+import zlib
+
+SHARED_ALIAS = 'shared'
+SHARD_ID_STRIDE = 1 << 40  # 每个分片的自增ID区间（JavaScript 可精确表示到 8192 个分片）
+
+# 分片中的表（其余表只在主库）
+SHARD_TABLES = (
+    'users', 'user_sessions', 'quiz_records', 'question_answers', 'archived_quizzes',
+    'question_stats', 'question_time_buckets', 'question_option_picks', 'user_question_stats',
+    'leaderboard_rollups',
+)
+# 各分片ID区间独立的自增表
+SEQUENCE_TABLES = ('user_sessions', 'quiz_records', 'question_answers')
+
+SHARD_INFO_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS shard_info (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        shard_index INTEGER NOT NULL,
+        shard_count INTEGER NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
+_OBJECT_PATTERN = re.compile(
+    r'CREATE\s+(TABLE|INDEX|TRIGGER|VIEW)\s+IF\s+NOT\s+EXISTS\s+(\w+)(?:.*?\bON\s+(\w+))?',
+    re.IGNORECASE | re.DOTALL,
+)
+
+def shard_index(user_id, shard_count):
+    """用户所在的分片序号（CRC32，与进程和 Python 版本无关）"""
+    return zlib.crc32(str(int(user_id)).encode('ascii')) % shard_count
+
+def default_shard_paths(db_path, shard_count):
+    """默认分片路径：与主库同目录，如 quiz_app.db -> quiz_app.shard0.db"""
+    root, ext = os.path.splitext(db_path)
+    return [f'{root}.shard{index}{ext or ".db"}' for index in range(shard_count)]
+
+def split_statements(script):
+    """把 SQL 脚本拆分为完整语句（触发器体内的分号不会被拆开）"""
+    statements, current = [], ''
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statement = current.strip()
+            if statement.rstrip(';').strip():
+                statements.append(statement)
+            current = ''
+    return statements
+
+def schema_object(statement):
+    """识别建立语句创建的对象，返回 (类型, 名称, 所在表)；不是 CREATE ... IF NOT EXISTS 时返回 None"""
+    # 去掉语句前的注释行再识别对象类型
+    body = '\n'.join(line for line in statement.splitlines() if not line.strip().startswith('--'))
+    match = _OBJECT_PATTERN.search(body)
+    if match is None:
+        return None
+    return match.group(1).upper(), match.group(2), match.group(3)
+
+def shard_schema(script):
+    """从扩展架构中挑出分片需要的语句，返回 (建表/索引/视图语句, 触发器语句)
+
+    分片表本身、建在分片表上的索引与触发器，以及视图（只引用 users 与答题记录）
+    """
+    tables, triggers = [], []
+    for statement in split_statements(script):
+        parsed = schema_object(statement)
+        if parsed is None:
+            continue
+        kind, name, on_table = parsed
+        if kind == 'TABLE' and name in SHARD_TABLES or kind == 'VIEW':
+            tables.append(statement)
+        elif kind == 'INDEX' and on_table in SHARD_TABLES:
+            tables.append(statement)
+        elif kind == 'TRIGGER' and on_table in SHARD_TABLES:
+            triggers.append(statement)
+    return tables, triggers
+
+def init_shard(conn, index, count, script, with_triggers=True, sequence_floor=None):
+    """在空库上创建分片：分片表与视图、分片信息与自增ID起点；with_triggers=False 时不建触发器
+    （批量搬移数据时避免重复累计，之后再用 create_triggers 补建）
+
+    sequence_floor: 各自增表的ID起点（默认 index × SHARD_ID_STRIDE）
+    """
+    tables, triggers = shard_schema(script)
+    conn.executescript(SHARD_INFO_SCHEMA + '\n'.join(tables))
+    if with_triggers:
+        conn.executescript('\n'.join(triggers))
+    conn.execute("INSERT OR REPLACE INTO shard_info (id, shard_index, shard_count) VALUES (1, ?, ?)",
+                 (index, count))
+    floor = sequence_floor or {}
+    for table in SEQUENCE_TABLES:
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = ?", (table,))
+        conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                     (table, floor.get(table, index * SHARD_ID_STRIDE)))
+    conn.commit()
+
+def create_triggers(conn, script):
+    conn.executescript('\n'.join(shard_schema(script)[1]))
+
+def read_shard_info(conn):
+    """(分片序号, 分片数)；不是分片库时返回 None"""
+    try:
+        row = conn.execute("SELECT shard_index, shard_count FROM shard_info WHERE id = 1").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return tuple(row) if row else None
+
+def ensure_user_mirror(conn, user_id, username):
+    """在用户所在分片中登记用户镜像（登录时调用，已存在时不写入）"""
+    conn.execute(
+        "INSERT OR IGNORE INTO users (id, username, password_hash) VALUES (?, ?, '')",
+        (user_id, username)
+    )
+
+class ShardRouter:
+    """按用户ID选择数据库文件；未配置分片时所有用户都在主库"""
+
+    def __init__(self, main_path=None, shard_paths=()):
+        self.main_path = main_path
+        self.shard_paths = list(shard_paths)
+
+    @property
+    def enabled(self):
+        return bool(self.shard_paths)
+
+    @property
+    def count(self):
+        return len(self.shard_paths)
+
+    def configure(self, main_path, shard_count, shard_paths=None):
+        """设置主库与分片（shard_count 为 0 时关闭分片），分片文件不存在或分片数不符时抛出 RuntimeError"""
+        self.main_path = main_path
+        paths = list(shard_paths or default_shard_paths(main_path, shard_count)) if shard_count else []
+        for index, path in enumerate(paths):
+            if not os.path.exists(path):
+                raise RuntimeError(f'分片 {path} 不存在，请先运行 database/reshard.py 创建分片')
+            conn = sqlite3.connect(path)
+            try:
+                info = read_shard_info(conn)
+            finally:
+                conn.close()
+            if info != (index, len(paths)):
+                raise RuntimeError(f'分片 {path} 的分片信息 {info} 与配置 ({index}, {len(paths)}) 不符，'
+                                   f'请用 database/reshard.py 重新划分')
+        self.shard_paths = paths
+
+    def path_for_user(self, user_id):
+        if not self.shard_paths:
+            return self.main_path
+        return self.shard_paths[shard_index(user_id, len(self.shard_paths))]
+
+    def user_paths(self):
+        """保存用户数据的全部文件（未分片时只有主库）"""
+        return list(self.shard_paths) or [self.main_path]
+
+    def partition(self, user_ids):
+        """按所在文件划分用户：{路径: [用户ID, ...]}"""
+        groups = {}
+        for user_id in user_ids:
+            groups.setdefault(self.path_for_user(user_id), []).append(user_id)
+        return groups
+
+    def attach_shared(self, conn):
+        """分片连接附加主库（别名 shared），题库、分组等只在主库的表可直接按表名访问"""
+        conn.execute(f"ATTACH DATABASE ? AS {SHARED_ALIAS}", (self.main_path,))
+        return conn
+
+# 全局分片路由（每个进程一份，由后端启动时配置）
+router = ShardRouter()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动预热与健康检查
+进程启动后在后台线程中依次：加载各学科题库（含答案）与题库包、读取热点索引使其页面进入操作系统页缓存、
+预读前端构建产物（入口页与 assets），全部完成后 /readyz 才返回 200，负载均衡据此开始转发流量；
+/healthz 只表示进程存活，不访问数据库。预热失败时每隔一段时间重试，期间 /readyz 返回 503 与失败原因。
+"""
+
+import os
+import threading
+import time
+
+from flask import jsonify
+
+from db import get_db, get_user_dbs
+from services.shards import router
+
+# 热点请求使用的索引：登录、判分、答题历史、排行榜、答题详情
+HOT_INDEXES = (
+    'idx_users_username',
+    'idx_options_question',
+    'idx_quiz_records_user_history',
+    'idx_quiz_records_user_mode_history',
+    'idx_leaderboard_rollups_speed',
+    'idx_leaderboard_rollups_study',
+    'idx_question_answers_quiz_record_id',
+)
+DEFAULT_RETRY_INTERVAL = 5  # 预热失败后的重试间隔（秒）
+DEFAULT_STATIC_MAX_BYTES = 32 * 1024 * 1024  # 预读前端文件的总字节数上限
+
+def warm_question_banks(conn):
+    """加载全部学科的题库与题库包，并逐题读取正确选项（使用快照时让答案所在页面驻留内存）"""
+    from services.question_bank import question_bank
+    from services.question_packs import question_packs
+
+    subjects = [row[0] for row in conn.execute("SELECT name FROM subjects ORDER BY id").fetchall()]
+    questions = 0
+    for subject_name in subjects:
+        bank = question_bank.get(conn, subject_name)
+        if not bank.questions:
+            continue
+        for question in bank.questions:
+            # 只为读取：快照中的题目按需解码，访问正确选项即让其所在页面被读入内存
+            _ = question['correct_option']
+        question_packs.get(conn, bank)
+        questions += len(bank.questions)
+    return {'subjects': len(subjects), 'questions': questions}
+
+def warm_indexes(conn, names=HOT_INDEXES):
+    """逐个遍历热点索引的全部页面（COUNT(*) 走指定索引），不存在的索引跳过"""
+    tables = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index'").fetchall())
+    warmed = []
+    for name in names:
+        if name in tables:
+            conn.execute(f'SELECT COUNT(*) FROM "{tables[name]}" INDEXED BY "{name}"').fetchone()
+            warmed.append(name)
+    return {'indexes': len(warmed)}
+
+def warm_static(root, max_bytes=DEFAULT_STATIC_MAX_BYTES):
+    """预读前端构建产物（入口页优先），root 为空时跳过"""
+    if not root or not os.path.isdir(root):
+        return {'files': 0, 'bytes': 0}
+    paths = [os.path.join(root, 'index.html')]
+    for directory, _, filenames in os.walk(root):
+        paths.extend(os.path.join(directory, filename) for filename in sorted(filenames))
+    files = total = 0
+    for path in dict.fromkeys(paths):
+        if total >= max_bytes or not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as f:
+            total += len(f.read(max_bytes - total))
+        files += 1
+    return {'files': files, 'bytes': total}
+
+class Warmup:
+    """预热进度与就绪状态（每个进程一份）"""
+
+    def __init__(self, app, static_root=None, retry_interval=DEFAULT_RETRY_INTERVAL):
+        self.app = app
+        self.static_root = static_root  # 返回前端构建目录的函数
+        self.retry_interval = retry_interval
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.ready = False
+        self.ready_seconds = None  # 从进程初始化到就绪的秒数
+        self.steps = {}
+        self.attempts = 0
+        self.error = None
+        self.pid = None
+        self.thread = None
+
+    def start(self):
+        """启动预热线程；fork 出的子进程（如 gunicorn --preload）中线程不会被继承，再次调用时重新启动"""
+        with self.lock:
+            if self.ready or (self.pid == os.getpid() and self.thread is not None):
+                return
+            self.pid = os.getpid()
+            self.thread = threading.Thread(target=self._run, name='startup-warmup', daemon=True)
+            self.thread.start()
+
+    def mark_ready(self):
+        with self.lock:
+            self.ready = True
+            self.ready_seconds = round(time.monotonic() - self.started, 3)
+
+    def run_once(self):
+        """执行一遍全部预热步骤，各步骤的耗时与结果记入 steps"""
+        steps = (
+            ('question_bank', warm_question_banks),
+            ('indexes', warm_indexes),
+        )
+        with self.app.app_context():
+            conn = get_db()
+            try:
+                for name, step in steps:
+                    begin = time.perf_counter()
+                    result = step(conn)
+                    self._record(name, begin, result)
+            finally:
+                conn.close()
+            # 分片模式：答题记录、会话与排行榜汇总的索引在各分片中
+            if router.enabled:
+                begin = time.perf_counter()
+                warmed = 0
+                for conn in get_user_dbs():
+                    try:
+                        warmed += warm_indexes(conn)['indexes']
+                    finally:
+                        conn.close()
+                self._record('shard_indexes', begin, {'shards': router.count, 'indexes': warmed})
+        begin = time.perf_counter()
+        self._record('static', begin, warm_static(self.static_root() if self.static_root else None))
+
+    def _record(self, name, begin, result):
+        with self.lock:
+            self.steps[name] = dict(result, seconds=round(time.perf_counter() - begin, 3))
+
+    def _run(self):
+        while True:
+            with self.lock:
+                self.attempts += 1
+            try:
+                self.run_once()
+            except Exception as e:
+                with self.lock:
+                    self.error = f'{type(e).__name__}: {e}'
+                self.app.logger.warning(f'启动预热失败，{self.retry_interval} 秒后重试: {e}')
+                time.sleep(self.retry_interval)
+                continue
+            with self.lock:
+                self.error = None
+            self.mark_ready()
+            return
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'status': 'ready' if self.ready else ('failing' if self.error else 'warming_up'),
+                'ready_seconds': self.ready_seconds,
+                'attempts': self.attempts,
+                'error': self.error,
+                'steps': dict(self.steps),
+            }
+
+def init_warmup(app, static_root=None):
+    """注册 /healthz 与 /readyz，并按配置启动后台预热
+
+    相关配置（可用 QUIZ_WARMUP 环境变量覆盖）:
+        WARMUP_ENABLED  是否在启动时预热（默认 1；为 0 时 /readyz 立即就绪）
+    static_root 为返回前端构建目录的函数
+    """
+    from services.instrumentation import registry
+
+    app.config.setdefault('WARMUP_ENABLED', os.environ.get('QUIZ_WARMUP', '1') != '0')
+    warmup = Warmup(app, static_root)
+    app.extensions['warmup'] = warmup
+
+    @app.route('/healthz', methods=['GET'])
+    def healthz():
+        """存活探针：进程能处理请求即返回 200"""
+        return jsonify({'status': 'ok', 'uptime_seconds': round(time.monotonic() - warmup.started, 3)}), 200
+
+    @app.route('/readyz', methods=['GET'])
+    def readyz():
+        """就绪探针：预热完成前返回 503"""
+        return jsonify(warmup.snapshot()), 200 if warmup.ready else 503
+
+    registry.gauge('quickqa_ready', '启动预热是否完成（1 为就绪）', lambda: 1 if warmup.ready else 0)
+
+    if not app.config['WARMUP_ENABLED']:
+        warmup.mark_ready()
+        return warmup
+
+    warmup.start()
+
+    @app.before_request
+    def _ensure_warmup():
+        if not warmup.ready:
+            warmup.start()
+
+    return warmup
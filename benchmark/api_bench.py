@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP API 基准/压测
+在合成数据库上重复运行固定场景（登录风暴、完整速答、排行榜轮询、历史翻页），
+按接口输出 p50/p95/p99 延迟与吞吐量（JSON）
+
+用法:
+    python benchmark/api_bench.py --users 500 --output bench.json
+    # 针对本地已启动的服务（服务需以 QUIZ_DB_PATH 指向同一合成库启动）
+    python benchmark/api_bench.py --db /tmp/bench.db --seed-only
+    python benchmark/api_bench.py --db /tmp/bench.db --no-seed --base-url http://127.0.0.1:8000
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from seed import ROOT_DIR, BENCH_PASSWORD, bench_username, seed_database, add_scale_arguments
+
+BACKEND_DIR = ROOT_DIR / 'backend'
+
+def percentile(sorted_values, pct):
+    """线性插值百分位（输入需已排序）"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+def summarize(durations, wall_time):
+    """把一组耗时（秒）汇总为毫秒统计；吞吐量为这些请求数除以场景的总墙钟时间（秒）"""
+    values = sorted(durations)
+    total = sum(values)
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 50) * 1000, 3),
+        'p95_ms': round(percentile(values, 95) * 1000, 3),
+        'p99_ms': round(percentile(values, 99) * 1000, 3),
+        'mean_ms': round(total / len(values) * 1000, 3) if values else 0.0,
+        'max_ms': round(values[-1] * 1000, 3) if values else 0.0,
+        'throughput_rps': round(len(values) / wall_time, 1) if wall_time else 0.0,
+    }
+
+class TestClientTransport:
+    """使用 Flask test client 在进程内发请求"""
+
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        resp = client.open(path, method=method, json=body, headers=headers or {})
+        return resp.status_code, resp.get_json(silent=True)
+
+class HttpTransport:
+    """通过 HTTP 访问已启动的本地服务"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header('Content-Type', 'application/json')
+        for k, v in (headers or {}).items():
+            req.add_header(k, v)
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                payload = resp.read()
+                status = resp.status
+        except urllib.error.HTTPError as e:
+            payload = e.read()
+            status = e.code
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+class Recorder:
+    """按接口记录每次请求的耗时与错误"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.errors = {}
+
+    def record(self, label, elapsed, ok):
+        with self.lock:
+            self.durations.setdefault(label, []).append(elapsed)
+            if not ok:
+                self.errors[label] = self.errors.get(label, 0) + 1
+
+class Session:
+    """一个压测用户：包装 transport，自动计时并附带令牌"""
+
+    def __init__(self, transport, recorder):
+        self.transport = transport
+        self.recorder = recorder
+        self.token = None
+
+    def call(self, method, path, body=None, label=None, expect=(200, 201)):
+        headers = {'Authorization': f'Bearer {self.token}'} if self.token else {}
+        started = time.perf_counter()
+        status, data = self.transport.request(method, path, body, headers)
+        elapsed = time.perf_counter() - started
+        self.recorder.record(label or f'{method} {path.split("?")[0]}', elapsed, status in expect)
+        return status, data
+
+    def login(self, username, password=BENCH_PASSWORD):
+        status, data = self.call('POST', '/api/login', {'username': username, 'password': password})
+        if status == 200:
+            self.token = data['access_token']
+        return status
+
+# =============================================================================
+# 场景
+# =============================================================================
+
+def scenario_login_storm(session, rng, ctx):
+    """登录风暴：随机用户反复登录"""
+    session.login(bench_username(rng.randrange(ctx['users'])))
+
+def scenario_speed_round(session, rng, ctx):
+    """完整速答：开始 → 拉题 → 逐题提交 → 结束"""
+    status, data = session.call('POST', '/api/quiz/start', {'mode': 'speed'})
+    if status != 201:
+        return
+    quiz_record_id = data['quiz_record_id']
+    _, data = session.call('GET', f'/api/questions/random?subject=语文&limit={ctx["round_questions"]}')
+    for q in (data or {}).get('questions', []):
+        option = rng.choice(q['options'])
+        session.call('POST', '/api/quiz/submit-answer', {
+            'quiz_record_id': quiz_record_id,
+            'question_id': q['id'],
+            'selected_option_id': option['id'],
+            'time_taken': rng.randint(500, 4000),
+        })
+    session.call('POST', '/api/quiz/finish', {'quiz_record_id': quiz_record_id})
+
+def scenario_leaderboard_polling(session, rng, ctx):
+    """排行榜轮询：结果页反复刷新各榜单"""
+    session.call('GET', '/api/leaderboard/speed?limit=50')
+    session.call('GET', '/api/leaderboard/study?limit=50')
+    session.call('GET', '/api/leaderboard/stats')
+    session.call('GET', '/api/leaderboard/personal')
+
+def scenario_history_paging(session, rng, ctx):
+    """历史翻页：沿 next_cursor 一直翻到最后一页"""
+    mode = rng.choice(['', '&mode=speed', '&mode=study'])
+    cursor = None
+    while True:
+        path = f'/api/quiz/history?limit=20{mode}' + (f'&cursor={cursor}' if cursor else '')
+        status, data = session.call('GET', path)
+        cursor = (data or {}).get('next_cursor') if status == 200 else None
+        if not cursor:
+            break
+
+SCENARIOS = {
+    'login_storm': scenario_login_storm,
+    'speed_round': scenario_speed_round,
+    'leaderboard_polling': scenario_leaderboard_polling,
+    'history_paging': scenario_history_paging,
+}
+
+def run_scenario(name, transport, iterations, concurrency, ctx, seed):
+    """并发运行某个场景 iterations 次，返回该场景的统计
+
+    任一工作线程出错时其余线程不再领取新的迭代，出错的异常在主线程中重新抛出（运行失败）
+    """
+    recorder = Recorder()
+    func = SCENARIOS[name]
+    counter = iter(range(iterations))
+    counter_lock = threading.Lock()
+    failures = []
+
+    def run(worker_id):
+        rng = random.Random(seed * 1000 + worker_id)
+        session = Session(transport, Recorder())
+        # 登录本身不计入非登录场景的统计
+        if name != 'login_storm' and session.login(bench_username(worker_id % ctx['users'])) != 200:
+            raise RuntimeError('基准用户登录失败，请检查数据库是否已生成')
+        session.recorder = recorder
+        while True:
+            with counter_lock:
+                if failures or next(counter, None) is None:
+                    return
+            func(session, rng, ctx)
+
+    def worker(worker_id):
+        try:
+            run(worker_id)
+        except BaseException as e:
+            with counter_lock:
+                failures.append(e)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+    if failures:
+        raise RuntimeError(f'场景 {name} 运行失败: {failures[0]}') from failures[0]
+
+    total_requests = sum(len(v) for v in recorder.durations.values())
+    return {
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'wall_time_s': round(wall, 3),
+        'requests': total_requests,
+        'throughput_rps': round(total_requests / wall, 1) if wall else 0.0,
+        'errors': sum(recorder.errors.values()),
+        'endpoints': {
+            label: dict(summarize(values, wall), errors=recorder.errors.get(label, 0))
+            for label, values in sorted(recorder.durations.items())
+        },
+    }
+
+def load_app(db_path):
+    """以指定数据库导入 Flask 应用"""
+    os.environ['QUIZ_DB_PATH'] = str(db_path)
+    # 不在后台预热：基准结果与运行时收集的语句不受预热线程干扰（冷启动见 cold_start.py）
+    os.environ.setdefault('QUIZ_WARMUP', '0')
+    sys.path.insert(0, str(BACKEND_DIR))
+    from app import app
+    app.logger.disabled = True
+    return app
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='快问快答 HTTP API 基准测试')
+    parser.add_argument('--db', help='合成数据库路径（默认使用临时文件）')
+    parser.add_argument('--no-seed', action='store_true', help='复用已有的 --db，不重新生成')
+    parser.add_argument('--seed-only', action='store_true', help='只生成数据库后退出')
+    parser.add_argument('--base-url', help='压测已启动的服务而不是进程内 test client')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗号分隔的场景列表')
+    parser.add_argument('--iterations', type=int, default=50, help='每个场景的运行次数')
+    parser.add_argument('--concurrency', type=int, default=1, help='并发用户数')
+    parser.add_argument('--round-questions', type=int, default=20, help='速答场景每轮题数')
+    parser.add_argument('--output', help='结果 JSON 输出路径（默认标准输出）')
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='quickqa-bench-'), 'bench.db')
+    if args.no_seed:
+        conn = sqlite3.connect(db_path)
+        users = conn.execute("SELECT COUNT(*) FROM users WHERE username LIKE 'bench_user_%'").fetchone()[0]
+        conn.close()
+        scale = {'users': users}
+    else:
+        scale = seed_database(db_path, args.users, args.quizzes_per_user, args.answers_per_quiz,
+                              args.questions, args.seed)
+    if args.seed_only:
+        return
+
+    transport = HttpTransport(args.base_url) if args.base_url else TestClientTransport(load_app(db_path))
+    ctx = {'users': scale['users'], 'round_questions': args.round_questions}
+
+    results = {}
+    for name in [s.strip() for s in args.scenarios.split(',') if s.strip()]:
+        if name not in SCENARIOS:
+            parser.error(f'未知场景: {name}')
+        print(f"运行场景 {name} ...", file=sys.stderr)
+        results[name] = run_scenario(name, transport, args.iterations, args.concurrency, ctx, args.seed)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'transport': args.base_url or 'flask-test-client',
+            'database': db_path,
+            'scale': scale,
+            'seed': args.seed,
+        },
+        'scenarios': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
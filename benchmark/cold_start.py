@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+冷启动基准
+每轮启动一个新的 Python 进程导入后端并发出第一批请求，测量：
+解释器启动、导入 app 的耗时、预热到 /readyz 就绪的耗时、首个登录 / 出题请求的延迟与
+从启动进程到首个出题响应的总时间（time-to-first-response），按中位数汇总（JSON）。
+可保存为基线并在之后比较，超出容差时以非零状态退出，用于跟踪启动耗时的回归。
+操作系统页缓存不会在各轮之间清空，"首个请求" 测量的是进程内的冷启动（导入、连接、题库加载等）
+
+用法:
+    python benchmark/cold_start.py --runs 5
+    python benchmark/cold_start.py --db /tmp/bench.db --no-seed --warmup both
+    python benchmark/cold_start.py --runs 5 --save-baseline benchmark/cold_start_baseline.json
+    python benchmark/cold_start.py --runs 5 --baseline benchmark/cold_start_baseline.json --tolerance 0.25
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from seed import ROOT_DIR, BENCH_PASSWORD, bench_username, seed_database, add_scale_arguments
+
+BACKEND_DIR = ROOT_DIR / 'backend'
+
+# 子进程：导入后端并依次发出首批请求，以 JSON 输出各阶段的时间点（time.time()，与父进程可比）
+CHILD_SCRIPT = r'''
+import json, sys, time
+started = time.time()
+begin = time.perf_counter()
+from app import app
+import_seconds = time.perf_counter() - begin
+app.logger.disabled = True
+client = app.test_client()
+
+def timed(method, url, **kwargs):
+    begin = time.perf_counter()
+    response = client.open(url, method=method, **kwargs)
+    return response, time.perf_counter() - begin
+
+_, health_seconds = timed('GET', '/healthz')
+ready_begin = time.perf_counter()
+while client.get('/readyz').status_code != 200:
+    time.sleep(0.005)
+ready_seconds = time.perf_counter() - ready_begin
+response, login_seconds = timed('POST', '/api/login', json={'username': sys.argv[1], 'password': sys.argv[2]})
+headers = {'Authorization': 'Bearer ' + response.get_json()['access_token']}
+url = '/api/questions/random?subject=' + sys.argv[3] + '&limit=20'
+response, questions_seconds = timed('GET', url, headers=headers)
+assert response.status_code == 200, response.status_code
+first_response = time.time()
+_, warm_questions_seconds = timed('GET', url, headers=headers)
+print(json.dumps({
+    'started': started, 'first_response': first_response,
+    'import_seconds': import_seconds, 'health_seconds': health_seconds, 'ready_seconds': ready_seconds,
+    'login_seconds': login_seconds, 'questions_seconds': questions_seconds,
+    'warm_questions_seconds': warm_questions_seconds,
+}))
+'''
+
+# 汇总输出的指标（毫秒）
+METRICS = ('interpreter_ms', 'import_ms', 'first_health_ms', 'ready_wait_ms', 'first_login_ms',
+           'first_questions_ms', 'warm_questions_ms', 'time_to_first_response_ms')
+
+def run_once(db_path, warmup, subject, username):
+    """启动一个全新进程完成一轮冷启动，返回各阶段耗时（毫秒）"""
+    env = dict(os.environ, QUIZ_DB_PATH=str(db_path), QUIZ_WARMUP='1' if warmup else '0')
+    spawned = time.time()
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD_SCRIPT, username, BENCH_PASSWORD, subject],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    child = json.loads(output.strip().splitlines()[-1])
+
+    def ms(seconds):
+        return round(seconds * 1000, 3)
+
+    return {
+        'interpreter_ms': ms(child['started'] - spawned),
+        'import_ms': ms(child['import_seconds']),
+        'first_health_ms': ms(child['health_seconds']),
+        'ready_wait_ms': ms(child['ready_seconds']),
+        'first_login_ms': ms(child['login_seconds']),
+        'first_questions_ms': ms(child['questions_seconds']),
+        'warm_questions_ms': ms(child['warm_questions_seconds']),
+        'time_to_first_response_ms': ms(child['first_response'] - spawned),
+    }
+
+def summarize_runs(runs):
+    """各指标的中位数 / 最小 / 最大值"""
+    return {
+        metric: {
+            'median': round(statistics.median(run[metric] for run in runs), 3),
+            'min': min(run[metric] for run in runs),
+            'max': max(run[metric] for run in runs),
+        }
+        for metric in METRICS
+    }
+
+def compare_baseline(results, baseline, tolerance):
+    """与基线比较中位数，返回超出容差的 (配置, 指标, 基线, 当前)"""
+    regressions = []
+    for config, summary in results.items():
+        for metric, values in summary.items():
+            previous = baseline.get(config, {}).get(metric)
+            # 极短的阶段（不足 1 毫秒）受噪声影响大，不参与比较
+            if previous and previous['median'] >= 1 and values['median'] > previous['median'] * (1 + tolerance):
+                regressions.append((config, metric, previous['median'], values['median']))
+    return regressions
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='快问快答后端冷启动基准')
+    parser.add_argument('--db', help='合成数据库路径（默认使用临时文件）')
+    parser.add_argument('--no-seed', action='store_true', help='复用已有的 --db，不重新生成')
+    parser.add_argument('--runs', type=int, default=5, help='每种配置启动的进程数')
+    parser.add_argument('--warmup', choices=('on', 'off', 'both'), default='both', help='是否启用启动预热')
+    parser.add_argument('--subject', default='语文', help='出题请求的学科')
+    parser.add_argument('--output', help='结果 JSON 输出路径（默认标准输出）')
+    parser.add_argument('--save-baseline', help='把本次结果写为基线')
+    parser.add_argument('--baseline', help='与基线比较，中位数超出容差时以状态 1 退出')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许的相对增幅（默认 0.25）')
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='quickqa-cold-'), 'bench.db')
+    if args.no_seed:
+        conn = sqlite3.connect(db_path)
+        users = conn.execute("SELECT COUNT(*) FROM users WHERE username LIKE 'bench_user_%'").fetchone()[0]
+        conn.close()
+        scale = {'users': users}
+    else:
+        scale = seed_database(db_path, args.users, args.quizzes_per_user, args.answers_per_quiz,
+                              args.questions, args.seed)
+
+    configs = {'on': (True,), 'off': (False,), 'both': (False, True)}[args.warmup]
+    results = {}
+    for warmup in configs:
+        name = 'warmup_on' if warmup else 'warmup_off'
+        print(f"运行 {name} × {args.runs} ...", file=sys.stderr)
+        runs = [run_once(db_path, warmup, args.subject, bench_username(i % max(scale['users'], 1)))
+                for i in range(args.runs)]
+        results[name] = summarize_runs(runs)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'database': db_path,
+            'scale': scale,
+            'runs': args.runs,
+        },
+        'results': results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(results, ensure_ascii=False, indent=2) + '\n')
+        print(f"已写入基线 {args.save_baseline}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_baseline(results, baseline, args.tolerance)
+        for config, metric, previous, current in regressions:
+            print(f"[回归] {config} {metric}: {previous} ms -> {current} ms", file=sys.stderr)
+        print(f"与基线比较：{len(regressions)} 项超出容差 {args.tolerance:.0%}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
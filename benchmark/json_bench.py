@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 序列化微基准
+比较标准库编码与 orjson 编码（backend/services/serialization.py 的 FastJSONProvider）生成典型
+响应（排行榜、答题历史一页、出题）的耗时，以及逐字段构造 dict 与编译后的行转换函数（row_mapper）
+把 sqlite3 行转为响应条目的耗时；每项取多轮中的最小值，按每次操作的微秒数输出（JSON）。
+不需要数据库，未安装 orjson 时只测标准库
+
+用法:
+    python benchmark/json_bench.py
+    python benchmark/json_bench.py --rows 1000 --number 2000 --output json_bench.json
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import sqlite3
+import sys
+import timeit
+
+from seed import ROOT_DIR
+
+BACKEND_DIR = ROOT_DIR / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from flask import Flask
+from services import serialization
+from services.serialization import init_json, row_mapper
+
+SPEED_FIELDS = ('username', 'user_id', 'correct_answers', 'total_questions', 'time_spent', 'accuracy', 'created_at')
+
+def make_payloads(rows):
+    """典型响应体：排行榜（rows 名）、答题历史一页（50 条）、出题（20 题，每题 4 个选项）"""
+    created_at = '2024-05-01 12:34:56'
+    leaderboard = {
+        'leaderboard': [{
+            'rank': i + 1,
+            'username': f'用户{i:05d}',
+            'user_id': i + 1,
+            'correct_answers': 60 - i % 60,
+            'total_questions': 60,
+            'accuracy': round((60 - i % 60) * 100.0 / 60, 2),
+            'time_spent': 30 + i % 90,
+            'created_at': created_at,
+        } for i in range(rows)],
+        'mode': 'speed',
+        'period': 'all',
+        'total': rows,
+    }
+    history = {
+        'records': [{
+            'id': 1000 - i,
+            'mode': 'speed' if i % 2 else 'study',
+            'start_time': created_at,
+            'end_time': created_at,
+            'total_questions': 20,
+            'correct_answers': i % 21,
+            'accuracy': round(i % 21 * 5.0, 2),
+            'time_spent': 45,
+            'completed': True,
+            'created_at': created_at,
+        } for i in range(50)],
+        'total': 50,
+        'next_cursor': 'MjAyNC0wNS0wMSAxMjozNDo1Nnw5NTA',
+    }
+    questions = {
+        'questions': [{
+            'id': i + 1,
+            'title': f'第{i + 1}题',
+            'content': '下列词语中加点字的读音完全正确的一项是' * 2,
+            'tags': ['字音', '基础'],
+            'options': [{'id': i * 4 + j + 1, 'text': f'{"ABCD"[j]}. 选项内容{j}'} for j in range(4)],
+        } for i in range(20)],
+        'total': 20,
+        'generated_at': datetime.datetime(2024, 5, 1, 12, 34, 56),  # 经 default 输出为 HTTP 日期
+    }
+    return {'leaderboard': leaderboard, 'history': history, 'questions': questions}
+
+def make_app(backend):
+    app = Flask(__name__)
+    app.config['JSON_BACKEND'] = backend
+    init_json(app)
+    return app
+
+def best_us(func, number, repeat):
+    """多轮中最快一轮的每次操作耗时（微秒）"""
+    return round(min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1e6, 3)
+
+def bench_encoding(payloads, number, repeat):
+    backends = ['stdlib'] + (['orjson'] if serialization.orjson is not None else [])
+    results = {}
+    for name, payload in payloads.items():
+        result = {}
+        decoded = []
+        for backend in backends:
+            app = make_app(backend)
+            with app.app_context():
+                body = app.json.response(payload).get_data()
+                result[backend] = {
+                    'us_per_response': best_us(lambda: app.json.response(payload).get_data(), number, repeat),
+                    'bytes': len(body),
+                }
+            decoded.append(json.loads(body))
+        # 两种编码的输出必须解析为相同的数据
+        result['equivalent'] = all(data == decoded[0] for data in decoded)
+        if 'orjson' in result:
+            result['speedup'] = round(result['stdlib']['us_per_response'] / result['orjson']['us_per_response'], 2)
+        results[name] = result
+    return results
+
+def naive_entries(rows):
+    """改造前的写法：逐字段构造 dict"""
+    leaderboard = []
+    for rank, row in enumerate(rows, 1):
+        leaderboard.append({
+            'rank': rank,
+            'username': row['username'],
+            'user_id': row['user_id'],
+            'correct_answers': row['correct_answers'],
+            'total_questions': row['total_questions'],
+            'accuracy': row['accuracy'],
+            'time_spent': row['time_spent'],
+            'created_at': row['created_at']
+        })
+    return leaderboard
+
+def bench_row_mapping(rows, number, repeat):
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"CREATE TABLE board ({', '.join(SPEED_FIELDS)})")
+    conn.executemany(
+        "INSERT INTO board VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(f'用户{i:05d}', i + 1, 60 - i % 60, 60, 30 + i % 90, round((60 - i % 60) * 100.0 / 60, 2),
+          '2024-05-01 12:34:56') for i in range(rows)]
+    )
+    fetched = conn.execute(f"SELECT {', '.join(SPEED_FIELDS)} FROM board").fetchall()
+    conn.close()
+
+    by_name = row_mapper(SPEED_FIELDS, extra=('rank',))
+    by_index = row_mapper(SPEED_FIELDS, keys=range(len(SPEED_FIELDS)), extra=('rank',))
+    assert naive_entries(fetched) == [by_index(row, rank) for rank, row in enumerate(fetched, 1)]
+
+    naive = best_us(lambda: naive_entries(fetched), number, repeat)
+    results = {
+        'rows': rows,
+        'naive_us': naive,
+        'mapper_by_name_us': best_us(lambda: [by_name(row, rank) for rank, row in enumerate(fetched, 1)],
+                                     number, repeat),
+        'mapper_by_index_us': best_us(lambda: [by_index(row, rank) for rank, row in enumerate(fetched, 1)],
+                                      number, repeat),
+    }
+    results['speedup_by_index'] = round(naive / results['mapper_by_index_us'], 2)
+    return results
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='快问快答 JSON 序列化微基准')
+    parser.add_argument('--rows', type=int, default=100, help='排行榜条目数 / 行转换的行数')
+    parser.add_argument('--number', type=int, default=500, help='每轮执行次数')
+    parser.add_argument('--repeat', type=int, default=5, help='轮数（取最快一轮）')
+    parser.add_argument('--output', help='结果 JSON 输出路径（默认标准输出）')
+    args = parser.parse_args()
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'orjson': getattr(serialization.orjson, '__version__', None),
+            'number': args.number,
+            'repeat': args.repeat,
+        },
+        'encoding': bench_encoding(make_payloads(args.rows), args.number, args.repeat),
+        'row_mapping': bench_row_mapping(args.rows, args.number, args.repeat),
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == '__main__':
+    main()
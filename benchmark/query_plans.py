@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+查询计划回归检查
+收集后端的全部SQL（源码中的字面量语句、基准场景实际执行的语句、schema 中的视图与触发器），
+在合成数据库上运行 EXPLAIN QUERY PLAN，标记大表全表扫描、临时 B-tree 排序与相关子查询，
+并与保存的基线对比；出现新的问题时以非零状态退出，便于在部署前拦截
+
+用法:
+    python benchmark/query_plans.py                    # 与基线对比
+    python benchmark/query_plans.py --update-baseline  # 接受当前计划为新基线
+"""
+
+import argparse
+import ast
+import contextlib
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+from seed import ROOT_DIR, DATABASE_DIR, seed_database, add_scale_arguments
+from api_bench import SCENARIOS, TestClientTransport, load_app, run_scenario
+
+BACKEND_DIR = ROOT_DIR / 'backend'
+SCHEMA_FILES = [DATABASE_DIR / 'database_schema.sql', DATABASE_DIR / 'extended_schema.sql']
+DEFAULT_BASELINE = ROOT_DIR / 'benchmark' / 'query_plan_baseline.json'
+
+# 随使用量无限增长的表：不论合成库里有多少行，全表扫描都视为问题
+GROWING_TABLES = ('users', 'user_sessions', 'quiz_records', 'question_answers')
+
+DML_PREFIXES = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH', 'REPLACE')
+SQL_KEYWORDS = {
+    'WHERE', 'ON', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'GROUP', 'ORDER', 'LIMIT',
+    'USING', 'SET', 'VALUES', 'AS', 'UNION', 'HAVING', 'WINDOW', 'NATURAL', 'INDEXED', 'NOT',
+}
+# 直接改写表定义的迁移语句（须开启 writable_schema）不是业务查询，也无法 EXPLAIN
+_SCHEMA_WRITE_PATTERN = re.compile(r'^(?:UPDATE|INSERT\s+INTO|DELETE\s+FROM)\s+sqlite_(?:master|schema)\b', re.IGNORECASE)
+_ALIAS_PATTERN = re.compile(r'\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)(?:\s+(?:AS\s+)?([A-Za-z_]\w*))?', re.IGNORECASE)
+
+def normalize_sql(sql):
+    """压缩空白，作为语句的身份"""
+    return ' '.join(sql.split())
+
+def statement_key(sql):
+    """语句在基线中的键"""
+    return hashlib.sha1(normalize_sql(sql).encode('utf-8')).hexdigest()[:12]
+
+def placeholder_parameters(sql):
+    """为未知参数的语句生成占位参数（计划与参数取值无关）"""
+    stripped = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    named = re.findall(r'[:@$]([A-Za-z_]\w*)', stripped)
+    if named:
+        return {name: None for name in named}
+    return (None,) * stripped.count('?')
+
+# =============================================================================
+# 收集语句
+# =============================================================================
+
+def collect_source_statements():
+    """扫描后端源码中 execute/executemany 的字符串字面量语句"""
+    found = []
+    for path in sorted(BACKEND_DIR.rglob('*.py')):
+        tree = ast.parse(path.read_text(encoding='utf-8'), filename=str(path))
+        for node in ast.walk(tree):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ('execute', 'executemany') and node.args):
+                continue
+            arg = node.args[0]
+            if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+                sql = arg.value.strip()
+                if sql.upper().startswith(DML_PREFIXES) and not _SCHEMA_WRITE_PATTERN.match(sql):
+                    found.append((sql, f'{path.relative_to(ROOT_DIR)}:{node.lineno}', None))
+    return found
+
+def collect_schema_statements():
+    """schema 中的视图（整表读取）与触发器体内的语句"""
+    found = []
+    for path in SCHEMA_FILES:
+        text = path.read_text(encoding='utf-8')
+        rel = path.relative_to(ROOT_DIR)
+        for name in re.findall(r'CREATE\s+VIEW\s+IF\s+NOT\s+EXISTS\s+(\w+)', text, re.IGNORECASE):
+            found.append((f'SELECT * FROM {name}', f'{rel}:view {name}', None))
+        for name, body in re.findall(r'CREATE\s+TRIGGER\s+IF\s+NOT\s+EXISTS\s+(\w+).*?\bBEGIN\b(.*?)\bEND;',
+                                     text, re.IGNORECASE | re.DOTALL):
+            for sql in body.split(';'):
+                sql = re.sub(r'\b(?:NEW|OLD)\.\w+', '?', sql).strip()
+                if sql.upper().startswith(DML_PREFIXES):
+                    found.append((sql, f'{rel}:trigger {name}', None))
+    return found
+
+def collect_runtime_statements(db_path, iterations):
+    """运行一遍基准场景，记录实际执行的语句及其参数"""
+    captured = []
+
+    def listener(sql, parameters):
+        if sql.strip().upper().startswith(DML_PREFIXES):
+            captured.append((sql, 'runtime', parameters))
+
+    app = load_app(db_path)
+    from services import instrumentation
+    instrumentation.statement_listeners.append(listener)
+    try:
+        transport = TestClientTransport(app)
+        conn = sqlite3.connect(db_path)
+        users = conn.execute("SELECT COUNT(*) FROM users WHERE username LIKE 'bench_user_%'").fetchone()[0]
+        conn.close()
+        ctx = {'users': users, 'round_questions': 10}
+        for name in SCENARIOS:
+            run_scenario(name, transport, iterations, 1, ctx, seed=7)
+    finally:
+        instrumentation.statement_listeners.remove(listener)
+    return captured
+
+def merge_statements(*groups):
+    """按规范化语句去重，合并来源，优先保留运行时的真实参数"""
+    merged = {}
+    for group in groups:
+        for sql, source, parameters in group:
+            key = statement_key(sql)
+            entry = merged.setdefault(key, {'sql': normalize_sql(sql), 'sources': set(), 'parameters': None})
+            entry['sources'].add(source)
+            if parameters is not None and entry['parameters'] is None:
+                entry['parameters'] = parameters
+    return merged
+
+# =============================================================================
+# 分析计划
+# =============================================================================
+
+def alias_map(sql):
+    """解析 FROM/JOIN 中的别名 → 表名"""
+    aliases = {}
+    for table, alias in _ALIAS_PATTERN.findall(sql):
+        aliases[table] = table
+        if alias and alias.upper() not in SQL_KEYWORDS:
+            aliases[alias] = table
+    return aliases
+
+def plan_flags(details, aliases, table_rows, large_table_rows, large_tables=GROWING_TABLES):
+    """从计划行中提取需要关注的问题"""
+    flags = set()
+    for detail in details:
+        if detail.startswith('SCAN '):
+            name = detail.split()[1]
+            table = aliases.get(name, name)
+            if table in table_rows and (table in large_tables or table_rows[table] >= large_table_rows):
+                flags.add(f'SCAN {table}')
+        if 'TEMP B-TREE' in detail:
+            flags.add(detail)
+        if detail.startswith('CORRELATED'):
+            flags.add('CORRELATED SUBQUERY')
+    return sorted(flags)
+
+def explain_all(db_path, statements, large_table_rows, large_tables=GROWING_TABLES):
+    """对全部语句运行 EXPLAIN QUERY PLAN"""
+    conn = sqlite3.connect(db_path)
+    tables = [r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    # 只在分片连接上执行的语句：分片信息表与以 shared 别名附加的主库（收集运行时语句时已导入后端）
+    from services.shards import SHARD_INFO_SCHEMA, SHARED_ALIAS
+    conn.executescript(SHARD_INFO_SCHEMA)
+    conn.execute(f"ATTACH DATABASE ? AS {SHARED_ALIAS}", (db_path,))
+    table_rows = {t: conn.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0] for t in tables}
+
+    # 视图内部的别名也需要能解析
+    global_aliases = {}
+    for sql in [r[0] for r in conn.execute("SELECT sql FROM sqlite_master WHERE type = 'view'")]:
+        global_aliases.update(alias_map(sql))
+
+    results = {}
+    for key, entry in sorted(statements.items(), key=lambda kv: kv[1]['sql']):
+        sql = entry['sql']
+        parameters = entry['parameters']
+        if parameters is None:
+            parameters = placeholder_parameters(sql)
+        try:
+            rows = conn.execute('EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+        except sqlite3.Error as e:
+            results[key] = {'sql': sql, 'sources': sorted(entry['sources']), 'error': str(e), 'plan': [], 'flags': []}
+            continue
+        details = [r[3] for r in rows]
+        aliases = dict(global_aliases, **alias_map(sql))
+        results[key] = {
+            'sql': sql,
+            'sources': sorted(entry['sources']),
+            'plan': details,
+            'flags': plan_flags(details, aliases, table_rows, large_table_rows, large_tables),
+        }
+    conn.close()
+    return results, table_rows
+
+def compare(results, baseline):
+    """与基线比较，返回 (回归, 提示)"""
+    regressions, notes = [], []
+    for key, current in results.items():
+        if current.get('error'):
+            regressions.append((key, f"EXPLAIN 失败: {current['error']}"))
+            continue
+        previous = baseline.get(key)
+        if previous is None:
+            if current['flags']:
+                regressions.append((key, f"新语句存在问题: {', '.join(current['flags'])}"))
+            else:
+                notes.append((key, '新语句'))
+            continue
+        new_flags = sorted(set(current['flags']) - set(previous.get('flags', [])))
+        if new_flags:
+            regressions.append((key, f"新增问题: {', '.join(new_flags)}"))
+        elif current['plan'] != previous.get('plan'):
+            notes.append((key, '计划有变化（未引入新问题）'))
+    for key in baseline.keys() - results.keys():
+        notes.append((key, '语句已不存在'))
+    return regressions, notes
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='检查全部SQL的查询计划并与基线对比')
+    parser.add_argument('--db', help='合成数据库路径（默认使用临时文件）')
+    parser.add_argument('--no-seed', action='store_true', help='复用已有的 --db，不重新生成')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='基线文件路径')
+    parser.add_argument('--update-baseline', action='store_true', help='把当前计划写为新基线')
+    parser.add_argument('--large-table-rows', type=int, default=1000, help='行数达到该值的表视为大表')
+    parser.add_argument('--large-tables', default=','.join(GROWING_TABLES),
+                        help='逗号分隔，始终视为大表的表名')
+    parser.add_argument('--iterations', type=int, default=2, help='每个基准场景运行次数（用于收集语句）')
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出完整结果')
+    add_scale_arguments(parser)
+    parser.set_defaults(users=200, quizzes_per_user=10, answers_per_quiz=10, questions=300)
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix='quickqa-plans-'), 'plans.db')
+    if not args.no_seed:
+        seed_database(db_path, args.users, args.quizzes_per_user, args.answers_per_quiz, args.questions, args.seed)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        runtime = collect_runtime_statements(db_path, args.iterations)
+    statements = merge_statements(collect_source_statements(), collect_schema_statements(), runtime)
+    large_tables = tuple(t.strip() for t in args.large_tables.split(',') if t.strip())
+    results, table_rows = explain_all(db_path, statements, args.large_table_rows, large_tables)
+
+    if args.update_baseline:
+        baseline = {k: {'sql': v['sql'], 'sources': v['sources'], 'plan': v['plan'], 'flags': v['flags']}
+                    for k, v in results.items()}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"已写入基线 {args.baseline}：{len(baseline)} 条语句")
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    regressions, notes = compare(results, baseline)
+
+    if args.json:
+        print(json.dumps({'table_rows': table_rows, 'statements': results,
+                          'regressions': [dict(key=k, message=m) for k, m in regressions],
+                          'notes': [dict(key=k, message=m) for k, m in notes]},
+                         ensure_ascii=False, indent=2))
+    else:
+        flagged = sum(1 for r in results.values() if r['flags'])
+        print(f"共检查 {len(results)} 条语句，{flagged} 条存在已知问题（见基线），{len(regressions)} 条回归")
+        for key, message in regressions + notes:
+            entry = results.get(key) or baseline.get(key)
+            kind = '回归' if (key, message) in regressions else '提示'
+            print(f"[{kind}] {key} {message}\n    {entry['sql'][:160]}\n    来源: {', '.join(entry['sources'])}")
+            for line in (results.get(key) or {}).get('plan', []):
+                print(f"      {line}")
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+基准测试数据生成
+通过 init_database / QuestionImporter 建库，再按指定规模写入合成的用户、答题记录与单题记录
+"""
+
+import argparse
+import contextlib
+import datetime
+import hashlib
+import os
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DATABASE_DIR = ROOT_DIR / 'database'
+sys.path.insert(0, str(DATABASE_DIR))
+
+from init_database import init_database  # noqa: E402
+from import_questions import QuestionImporter  # noqa: E402
+
+BENCH_PASSWORD = 'bench123'
+BENCH_USER_PREFIX = 'bench_user_'
+
+# 默认规模：可在一台笔记本上几十秒内生成
+DEFAULT_SCALE = {
+    'users': 200,
+    'quizzes_per_user': 20,
+    'answers_per_quiz': 15,
+    'questions': 300,
+}
+
+def bench_username(i):
+    """第 i 个合成用户的用户名"""
+    return f'{BENCH_USER_PREFIX}{i:06d}'
+
+def _synthetic_question(i, rng):
+    """构造一条与真实题库格式一致的合成题目"""
+    letters = ['A', 'B', 'C', 'D']
+    correct = rng.choice(letters)
+    return {
+        'title': f'《合成诗{i}》 （唐）佚名{i % 50}',
+        'content': f'合成题干{i}：床前明月光，（ ）是地上霜。',
+        'options': [{'letter': l, 'text': f'选项{l}{i}'} for l in letters],
+        'correct_answer': correct,
+        'explanation': f'合成详解{i}：正确答案为{correct}。',
+    }
+
+def seed_questions(db_path, total, rng):
+    """把题库补足到 total 道题（真实题库之外使用合成题目）"""
+    conn = sqlite3.connect(db_path)
+    existing = conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
+    conn.close()
+    if existing >= total:
+        return existing
+
+    importer = QuestionImporter(db_path)
+    importer.connect_db()
+    importer.init_database()
+    for i in range(existing, total):
+        importer.insert_question(_synthetic_question(i, rng))
+    importer.conn.commit()
+    importer.close_db()
+    return total
+
+def seed_users(conn, count):
+    """批量写入合成用户，返回用户ID列表"""
+    password_hash = hashlib.sha256(BENCH_PASSWORD.encode()).hexdigest()
+    conn.executemany(
+        "INSERT OR IGNORE INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+        ((bench_username(i), f'{bench_username(i)}@bench.local', password_hash) for i in range(count))
+    )
+    rows = conn.execute(
+        "SELECT id FROM users WHERE username LIKE ? ORDER BY id", (BENCH_USER_PREFIX + '%',)
+    ).fetchall()
+    return [r[0] for r in rows]
+
+def seed_quizzes(conn, user_ids, quizzes_per_user, answers_per_quiz, rng):
+    """为每个用户写入已完成的答题记录及其单题记录"""
+    question_options = {}
+    for qid, oid, is_correct in conn.execute("SELECT question_id, id, is_correct FROM options"):
+        question_options.setdefault(qid, []).append((oid, bool(is_correct)))
+    question_ids = list(question_options)
+    per_quiz = min(answers_per_quiz, len(question_ids))
+    now = datetime.datetime.now()
+
+    for user_id in user_ids:
+        for _ in range(quizzes_per_user):
+            mode = 'speed' if rng.random() < 0.6 else 'study'
+            start = now - datetime.timedelta(seconds=rng.randint(60, 90 * 86400))
+            asked = rng.sample(question_ids, per_quiz)
+            answers = []
+            for qid in asked:
+                oid, is_correct = rng.choice(question_options[qid])
+                attempts = 1 if mode == 'speed' else rng.randint(1, 3)
+                answers.append((qid, oid, is_correct, attempts, rng.randint(800, 6000)))
+            correct = sum(1 for a in answers if a[2])
+            time_spent = 60 if mode == 'speed' else rng.randint(120, 1800)
+            end = start + datetime.timedelta(seconds=time_spent)
+            stamp = start.strftime('%Y-%m-%d %H:%M:%S')
+            cursor = conn.execute("""
+                INSERT INTO quiz_records (user_id, mode, start_time, end_time, total_questions,
+                                          correct_answers, time_spent, completed, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, TRUE, ?)
+            """, (user_id, mode, start, end, len(answers), correct, time_spent, stamp))
+            quiz_record_id = cursor.lastrowid
+            conn.executemany("""
+                INSERT INTO question_answers
+                (quiz_record_id, question_id, selected_option_id, is_correct, attempt_count, time_taken, answered_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(quiz_record_id, qid, oid, is_correct, attempts, taken, stamp)
+                  for qid, oid, is_correct, attempts, taken in answers])
+
+def seed_database(db_path, users=DEFAULT_SCALE['users'], quizzes_per_user=DEFAULT_SCALE['quizzes_per_user'],
+                  answers_per_quiz=DEFAULT_SCALE['answers_per_quiz'], questions=DEFAULT_SCALE['questions'],
+                  seed=42, log=sys.stderr):
+    """生成一个指定规模的基准测试数据库（会覆盖已有文件）"""
+    rng = random.Random(seed)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    # init_database / QuestionImporter 会逐题打印进度，这里统一转到日志输出
+    with contextlib.redirect_stdout(log):
+        init_database(db_path)
+        bank_size = seed_questions(db_path, questions, rng)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        user_ids = seed_users(conn, users)
+        seed_quizzes(conn, user_ids, quizzes_per_user, answers_per_quiz, rng)
+        conn.commit()
+        counts = {
+            'users': len(user_ids),
+            'quiz_records': conn.execute("SELECT COUNT(*) FROM quiz_records").fetchone()[0],
+            'question_answers': conn.execute("SELECT COUNT(*) FROM question_answers").fetchone()[0],
+            'questions': bank_size,
+        }
+    finally:
+        conn.close()
+
+    print(f"基准数据库已生成: {db_path} {counts}", file=log)
+    return counts
+
+def add_scale_arguments(parser):
+    """注册数据规模相关的命令行参数（供各基准脚本共用）"""
+    parser.add_argument('--users', type=int, default=DEFAULT_SCALE['users'], help='合成用户数')
+    parser.add_argument('--quizzes-per-user', type=int, default=DEFAULT_SCALE['quizzes_per_user'], help='每个用户的答题记录数')
+    parser.add_argument('--answers-per-quiz', type=int, default=DEFAULT_SCALE['answers_per_quiz'], help='每次答题的单题记录数')
+    parser.add_argument('--questions', type=int, default=DEFAULT_SCALE['questions'], help='题库规模')
+    parser.add_argument('--seed', type=int, default=42, help='随机种子，保证可重复')
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='生成基准测试用的合成数据库')
+    parser.add_argument('db_path', help='输出数据库路径')
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    seed_database(args.db_path, args.users, args.quizzes_per_user, args.answers_per_quiz,
+                  args.questions, args.seed)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单题记录归档工具
+把超过保留期的答题记录的单题记录分批移入归档库（默认 quiz_app.archive.db），再用增量 vacuum 缩小主库
+
+用法：
+    python database/archive_answers.py database/quiz_app.db --retention-days 180
+    python database/archive_answers.py database/quiz_app.db --enable-incremental-vacuum   # 旧库首次使用前转换一次
+"""
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.archive import (  # noqa: E402
+    DEFAULT_RETENTION_DAYS, DEFAULT_BATCH_SIZE, default_archive_path,
+    archive_old_answers, incremental_vacuum, enable_incremental_vacuum,
+)
+from services.schema import upgrade_databases  # noqa: E402
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='归档旧的单题记录并缩小主库')
+    parser.add_argument('db_path', nargs='?', default='database/quiz_app.db', help='主库路径')
+    parser.add_argument('--archive', help='归档库路径（默认与主库同目录的 *.archive.db）')
+    parser.add_argument('--retention-days', type=int, default=DEFAULT_RETENTION_DAYS, help='主库保留的天数')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每个事务归档的答题记录数')
+    parser.add_argument('--max-batches', type=int, help='本次最多处理的批数（默认全部）')
+    parser.add_argument('--pause', type=float, default=0.0, help='批间暂停秒数，减少对在线写入的影响')
+    parser.add_argument('--vacuum-pages', type=int, help='归档后最多归还的空闲页数（默认全部）')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='把已有数据库转换为 auto_vacuum=INCREMENTAL（执行一次完整 VACUUM）')
+    args = parser.parse_args()
+
+    # 后端启动前在旧库上运行时，先补建 archived_quizzes 等表
+    upgrade_databases([args.db_path])
+    conn = sqlite3.connect(args.db_path, timeout=30)
+    try:
+        if args.enable_incremental_vacuum:
+            print("正在转换为增量 vacuum（完整 VACUUM，期间独占数据库）...")
+            enable_incremental_vacuum(conn)
+
+        archive_path = args.archive or default_archive_path(args.db_path)
+        quizzes, moved = archive_old_answers(conn, archive_path, args.retention_days, args.batch_size,
+                                             args.max_batches, args.pause)
+        print(f"归档完成：{quizzes} 条答题记录，{moved} 条单题记录 -> {archive_path}")
+
+        freelist = incremental_vacuum(conn, args.vacuum_pages)
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print(f"主库未启用增量 vacuum，当前空闲页 {freelist} 页；可加 --enable-incremental-vacuum 转换")
+        else:
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            print(f"增量 vacuum：空闲页 {freelist} -> {remaining}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
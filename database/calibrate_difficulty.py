@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+题目难度校准任务（离线运行，需要 NumPy）
+按主键分块流式读取 question_answers，用 NumPy 按题聚合
+（答题记录数、尝试次数、一次答对数、用时分布、选项分布），
+再按平滑后的一次答对率计算 difficulty_level，在一个事务中批量写回。
+
+内存占用只与分块大小和题库规模相关（每题 121 档用时直方图），与答题记录总数无关。
+
+用法：
+    python database/calibrate_difficulty.py database/quiz_app.db
+    python database/calibrate_difficulty.py database/quiz_app.db --dry-run
+    python database/calibrate_difficulty.py database/quiz_app.db --rebuild-stats   # 同时重建逐题统计汇总表
+    python database/calibrate_difficulty.py database/quiz_app.db --shards 4        # 分片模式：汇总各分片的单题记录
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.archive import default_archive_path  # noqa: E402
+from services.bank_snapshot import default_snapshot_path, write_snapshot  # noqa: E402
+from services.shards import default_shard_paths  # noqa: E402
+
+try:
+    import numpy as np
+except ImportError:  # 仅离线任务依赖 NumPy，后端服务不需要
+    np = None
+
+TIME_BUCKET_MS = 500  # 与 extended_schema.sql 中触发器的分档一致
+TIME_BUCKETS = 121    # 0..119 档每档 500 毫秒，第 120 档为 60 秒及以上
+DEFAULT_CHUNK_SIZE = 200_000
+DEFAULT_MIN_ANSWERS = 30
+DEFAULT_PRIOR_WEIGHT = 20
+
+# 平滑后的一次答对率 >= 阈值 依次对应难度 1..4，低于最后一个阈值为 5
+DIFFICULTY_THRESHOLDS = (0.9, 0.75, 0.55, 0.35)
+
+def load_id_index(conn, sql):
+    """读取有序ID数组（用于把原始ID映射为连续下标）"""
+    return np.array([row[0] for row in conn.execute(sql)], dtype=np.int64)
+
+def map_ids(sorted_ids, values):
+    """把ID映射为下标，返回 (下标, 有效掩码)；不存在的ID（如已删除的题目）掩码为 False"""
+    if len(sorted_ids) == 0:
+        return np.zeros(len(values), dtype=np.int64), np.zeros(len(values), dtype=bool)
+    index = np.searchsorted(sorted_ids, values)
+    index = np.minimum(index, len(sorted_ids) - 1)
+    return index, sorted_ids[index] == values
+
+def aggregate_answers(conn, question_ids, option_ids, chunk_size=DEFAULT_CHUNK_SIZE, log=print,
+                      tables=('question_answers',), sources=()):
+    """分块流式聚合全部单题记录（tables 可包含已附加的归档库中的表；
+    sources 为其他数据库文件中的 (连接, 表) 列表，如各分片）"""
+    n_questions = len(question_ids)
+    totals = {
+        'answers': np.zeros(n_questions, dtype=np.int64),
+        'attempts': np.zeros(n_questions, dtype=np.int64),
+        'first_try_correct': np.zeros(n_questions, dtype=np.int64),
+        'total_time_taken': np.zeros(n_questions, dtype=np.int64),
+        'time_buckets': np.zeros(n_questions * TIME_BUCKETS, dtype=np.int64),
+        'option_picks': np.zeros(len(option_ids), dtype=np.int64),
+    }
+    for table in tables:
+        _aggregate_table(conn, table, question_ids, option_ids, totals, chunk_size, log)
+    for source, table in sources:
+        _aggregate_table(source, table, question_ids, option_ids, totals, chunk_size, log)
+    totals['time_buckets'] = totals['time_buckets'].reshape(n_questions, TIME_BUCKETS)
+    return totals
+
+def _aggregate_table(conn, table, question_ids, option_ids, totals, chunk_size, log):
+    n_questions = len(question_ids)
+    last_id, processed, started = 0, 0, time.time()
+    while True:
+        # 按主键键集分块，每块一条独立查询，不会把整个结果集留在内存中
+        rows = conn.execute(f"""
+            SELECT id, question_id, COALESCE(selected_option_id, -1),
+                   CASE WHEN is_correct THEN 1 ELSE 0 END,
+                   COALESCE(attempt_count, 1), COALESCE(time_taken, 0)
+            FROM {table}
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (last_id, chunk_size)).fetchall()
+        if not rows:
+            break
+        chunk = np.array(rows, dtype=np.int64)
+        del rows
+        last_id = int(chunk[-1, 0])
+        processed += len(chunk)
+
+        q_index, valid = map_ids(question_ids, chunk[:, 1])
+        q_index, chunk = q_index[valid], chunk[valid]
+        is_correct, attempts, time_taken = chunk[:, 3], chunk[:, 4], chunk[:, 5]
+
+        totals['answers'] += np.bincount(q_index, minlength=n_questions)
+        totals['attempts'] += np.bincount(q_index, weights=attempts, minlength=n_questions).astype(np.int64)
+        first_try = (is_correct == 1) & (attempts == 1)
+        totals['first_try_correct'] += np.bincount(q_index, weights=first_try, minlength=n_questions).astype(np.int64)
+        totals['total_time_taken'] += np.bincount(q_index, weights=time_taken, minlength=n_questions).astype(np.int64)
+
+        buckets = np.clip(time_taken // TIME_BUCKET_MS, 0, TIME_BUCKETS - 1)
+        totals['time_buckets'] += np.bincount(q_index * TIME_BUCKETS + buckets, minlength=n_questions * TIME_BUCKETS)
+
+        o_index, o_valid = map_ids(option_ids, chunk[:, 2])
+        totals['option_picks'] += np.bincount(o_index[o_valid], minlength=len(option_ids))
+
+        log(f"{table}: 已处理 {processed} 条单题记录（{processed / max(time.time() - started, 1e-9):.0f} 条/秒）")
+
+def median_time_ms(time_buckets, answers):
+    """由用时直方图估算中位用时（取所在档的中点），无记录的题为 NaN"""
+    cumulative = np.cumsum(time_buckets, axis=1)
+    half = (answers + 1) // 2
+    median_bucket = np.argmax(cumulative >= half[:, None], axis=1)
+    median = median_bucket * TIME_BUCKET_MS + TIME_BUCKET_MS / 2.0
+    return np.where(answers > 0, median, np.nan)
+
+def difficulty_levels(answers, first_try_correct, min_answers=DEFAULT_MIN_ANSWERS, prior_weight=DEFAULT_PRIOR_WEIGHT):
+    """计算难度等级，返回 (levels, 平滑答对率, 是否参与校准)
+
+    一次答对率向全体平均值收缩（相当于额外 prior_weight 条平均水平的记录），避免样本少的题走极端；
+    记录数不足 min_answers 的题不参与校准
+    """
+    total = answers.sum()
+    overall = first_try_correct.sum() / total if total else 0.5
+    smoothed = (first_try_correct + prior_weight * overall) / (answers + prior_weight)
+    # 答对率越高越简单：>= 0.9 为 1 级，依次递增，< 0.35 为 5 级
+    levels = 5 - np.digitize(smoothed, sorted(DIFFICULTY_THRESHOLDS))
+    return levels.astype(np.int64), smoothed, answers >= min_answers
+
+def write_difficulty(conn, question_ids, levels, eligible):
+    """批量写回发生变化的难度等级，返回更新的题目数"""
+    cursor = conn.executemany(
+        "UPDATE questions SET difficulty_level = ? WHERE id = ? AND difficulty_level IS NOT ?",
+        [(int(level), int(qid), int(level))
+         for qid, level in zip(question_ids[eligible], levels[eligible])]
+    )
+    return cursor.rowcount
+
+def write_stats(conn, question_ids, option_ids, option_question_ids, totals):
+    """用聚合结果整体重建逐题统计汇总表"""
+    conn.execute("DELETE FROM question_stats")
+    conn.execute("DELETE FROM question_time_buckets")
+    conn.execute("DELETE FROM question_option_picks")
+    has_answers = totals['answers'] > 0
+    conn.executemany(
+        "INSERT INTO question_stats (question_id, answers, attempts, first_try_correct, total_time_taken) VALUES (?, ?, ?, ?, ?)",
+        zip(question_ids[has_answers].tolist(), totals['answers'][has_answers].tolist(),
+            totals['attempts'][has_answers].tolist(), totals['first_try_correct'][has_answers].tolist(),
+            totals['total_time_taken'][has_answers].tolist())
+    )
+    q_index, bucket = np.nonzero(totals['time_buckets'])
+    conn.executemany(
+        "INSERT INTO question_time_buckets (question_id, bucket, answers) VALUES (?, ?, ?)",
+        zip(question_ids[q_index].tolist(), bucket.tolist(), totals['time_buckets'][q_index, bucket].tolist())
+    )
+    picked = totals['option_picks'] > 0
+    conn.executemany(
+        "INSERT INTO question_option_picks (question_id, option_id, picks) VALUES (?, ?, ?)",
+        zip(option_question_ids[picked].tolist(), option_ids[picked].tolist(), totals['option_picks'][picked].tolist())
+    )
+
+def calibrate(db_path, chunk_size=DEFAULT_CHUNK_SIZE, min_answers=DEFAULT_MIN_ANSWERS,
+              prior_weight=DEFAULT_PRIOR_WEIGHT, dry_run=False, rebuild_stats=False, log=print,
+              archive_path=None, shard_count=0):
+    """运行一次校准，返回摘要（archive_path 存在时一并统计已归档的单题记录；
+    shard_count 大于 0 时单题记录取自各分片及其归档库）"""
+    if np is None:
+        raise RuntimeError('难度校准需要 NumPy，请先执行 pip install numpy')
+    if shard_count and rebuild_stats:
+        # 分片模式下逐题统计分散在各分片，由 database/reshard.py 搬移时汇总
+        raise RuntimeError('分片模式不支持 --rebuild-stats')
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    sources = []
+    try:
+        tables = ['question_answers']
+        if archive_path and os.path.exists(archive_path):
+            conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            tables.append('archive.question_answers')
+        for shard_path in default_shard_paths(db_path, shard_count):
+            if not os.path.exists(shard_path):
+                raise RuntimeError(f'分片 {shard_path} 不存在')
+            shard_conn = sqlite3.connect(shard_path, isolation_level=None)
+            sources.append((shard_conn, 'question_answers'))
+            shard_archive = default_archive_path(shard_path)
+            if os.path.exists(shard_archive):
+                shard_conn.execute("ATTACH DATABASE ? AS archive", (shard_archive,))
+                sources.append((shard_conn, 'archive.question_answers'))
+        if rebuild_stats:
+            # 重建汇总表时需要与触发器的增量更新互斥：全程持有写锁，读到的是一致的快照
+            conn.execute("BEGIN IMMEDIATE")
+        question_ids = load_id_index(conn, "SELECT id FROM questions ORDER BY id")
+        option_rows = conn.execute("SELECT id, question_id FROM options ORDER BY id").fetchall()
+        option_ids = np.array([row[0] for row in option_rows], dtype=np.int64)
+        option_question_ids = np.array([row[1] for row in option_rows], dtype=np.int64)
+        del option_rows
+
+        totals = aggregate_answers(conn, question_ids, option_ids, chunk_size, log, tables, sources)
+        levels, smoothed, eligible = difficulty_levels(totals['answers'], totals['first_try_correct'],
+                                                       min_answers, prior_weight)
+        medians = median_time_ms(totals['time_buckets'], totals['answers'])
+
+        summary = {
+            'questions': int(len(question_ids)),
+            'answers': int(totals['answers'].sum()),
+            'calibrated': int(eligible.sum()),
+            'levels': {int(level): int(((levels == level) & eligible).sum()) for level in range(1, 6)},
+            'median_time_ms': float(np.nanmedian(medians)) if np.any(totals['answers'] > 0) else None,
+            'updated': 0,
+        }
+
+        if dry_run:
+            if rebuild_stats:
+                conn.execute("ROLLBACK")
+            return summary
+
+        if not rebuild_stats:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            summary['updated'] = write_difficulty(conn, question_ids, levels, eligible)
+            if rebuild_stats:
+                write_stats(conn, question_ids, option_ids, option_question_ids, totals)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        # 难度变化后重新生成已有的题库快照（否则修订号不一致，后端会回退为从数据库加载）
+        snapshot_path = default_snapshot_path(db_path)
+        if summary['updated'] and os.path.exists(snapshot_path):
+            summary['snapshot'] = write_snapshot(conn, snapshot_path)
+        return summary
+    finally:
+        for source, _ in sources:
+            source.close()
+        conn.close()
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='根据答题记录校准题目难度（difficulty_level）')
+    parser.add_argument('db_path', nargs='?', default='database/quiz_app.db', help='数据库路径')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='每次读取的单题记录数')
+    parser.add_argument('--min-answers', type=int, default=DEFAULT_MIN_ANSWERS, help='参与校准的最少答题记录数')
+    parser.add_argument('--prior-weight', type=float, default=DEFAULT_PRIOR_WEIGHT, help='答对率平滑强度')
+    parser.add_argument('--dry-run', action='store_true', help='只计算并输出摘要，不写回')
+    parser.add_argument('--rebuild-stats', action='store_true', help='同时重建逐题统计汇总表（旧库首次启用时使用）')
+    parser.add_argument('--archive', help='归档库路径（默认与主库同目录的 *.archive.db，存在时一并统计）')
+    parser.add_argument('--shards', type=int, default=0, help='分片数（与后端的 QUIZ_SHARDS 一致）')
+    parser.add_argument('--quiet', action='store_true', help='不输出分块进度')
+    args = parser.parse_args()
+
+    log = (lambda message: None) if args.quiet else (lambda message: print(message, file=sys.stderr))
+    try:
+        summary = calibrate(args.db_path, args.chunk_size, args.min_answers, args.prior_weight,
+                            args.dry_run, args.rebuild_stats, log,
+                            args.archive or default_archive_path(args.db_path), args.shards)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    print(f"题目数: {summary['questions']}，单题记录数: {summary['answers']}，参与校准: {summary['calibrated']}")
+    print("难度分布: " + ', '.join(f"{level}级 {count} 题" for level, count in summary['levels'].items()))
+    if summary['median_time_ms'] is not None:
+        print(f"各题中位用时的中位数: {summary['median_time_ms']:.0f} 毫秒")
+    if args.dry_run:
+        print("（试运行，未写回）")
+    else:
+        print(f"已更新 {summary['updated']} 道题的难度等级")
+        if summary.get('snapshot'):
+            print(f"题库快照已重新生成（版本 {summary['snapshot']}）")
+
+if __name__ == '__main__':
+    main()
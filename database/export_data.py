@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+答题数据导出工具
+与导出接口（/api/export/...）共用同一套流式导出逻辑，直接读取数据库文件，适合整库或整班的大批量导出
+
+用法：
+    python database/export_data.py database/quiz_app.db quiz_records --format csv --group-id 1 -o class.csv
+    python database/export_data.py database/quiz_app.db question_answers --user-id 3 --from 2025-09-01 --to 2025-09-30
+"""
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.export import DATASETS, FORMATS, DEFAULT_BATCH_SIZE, parse_filters, export_chunks  # noqa: E402
+from services.archive import default_archive_path, attach_archive  # noqa: E402
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='流式导出答题记录 / 单题记录（NDJSON 或 CSV）')
+    parser.add_argument('db_path', help='数据库路径')
+    parser.add_argument('dataset', choices=DATASETS, help='导出的数据')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='ndjson', help='输出格式')
+    parser.add_argument('--user-id', type=int, help='只导出该用户')
+    parser.add_argument('--group-id', type=int, help='只导出该分组中组长与已授权共享的成员')
+    parser.add_argument('--mode', choices=('speed', 'study', 'battle'), help='只导出该模式')
+    parser.add_argument('--from', dest='date_from', help='起始日期 YYYY-MM-DD（含）')
+    parser.add_argument('--to', dest='date_to', help='结束日期 YYYY-MM-DD（含）')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批读取的答题记录数')
+    parser.add_argument('--archive', help='归档库路径（默认与主库同目录的 *.archive.db，存在时一并导出）')
+    parser.add_argument('-o', '--output', help='输出文件（默认标准输出）')
+    args = parser.parse_args()
+
+    try:
+        filters = parse_filters(args.user_id, args.group_id, args.mode, args.date_from, args.date_to)
+    except ValueError as e:
+        parser.error(f'无效的筛选条件: {e}')
+
+    conn = sqlite3.connect(f'file:{args.db_path}?mode=ro', uri=True)
+    if args.dataset == 'question_answers':
+        attach_archive(conn, args.archive or default_archive_path(args.db_path))
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    try:
+        for chunk in export_chunks(conn, args.dataset, args.format, filters, args.batch_size):
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
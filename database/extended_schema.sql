@@ -27,7 +27,7 @@ CREATE TABLE IF NOT EXISTS user_sessions (
 CREATE TABLE IF NOT EXISTS quiz_records (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
-    mode TEXT NOT NULL CHECK (mode IN ('speed', 'study')),
+    mode TEXT NOT NULL CHECK (mode IN ('speed', 'study', 'battle')),
     start_time TIMESTAMP NOT NULL,
     end_time TIMESTAMP,
     total_questions INTEGER DEFAULT 0,
@@ -53,6 +53,118 @@ CREATE TABLE IF NOT EXISTS question_answers (
     FOREIGN KEY (selected_option_id) REFERENCES options(id)
 );
 
+-- 已归档的答题记录：其单题记录已移入归档库（见 services/archive.py），查询详情时需附加归档库
+CREATE TABLE IF NOT EXISTS archived_quizzes (
+    quiz_record_id INTEGER PRIMARY KEY,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (quiz_record_id) REFERENCES quiz_records(id)
+);
+
+-- 逐题统计汇总：由 question_answers 上的触发器增量维护，反映全部单题记录的当前状态
+-- （答题记录数、累计尝试次数、一次答对数、累计用时），离线校准任务可整体重建
+CREATE TABLE IF NOT EXISTS question_stats (
+    question_id INTEGER PRIMARY KEY,
+    answers INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    first_try_correct INTEGER NOT NULL DEFAULT 0,
+    total_time_taken INTEGER NOT NULL DEFAULT 0, -- 毫秒
+    FOREIGN KEY (question_id) REFERENCES questions(id)
+);
+
+-- 逐题用时分布（500 毫秒一档，第 120 档及以上合并），用于估算中位用时
+CREATE TABLE IF NOT EXISTS question_time_buckets (
+    question_id INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    answers INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (question_id, bucket),
+    FOREIGN KEY (question_id) REFERENCES questions(id)
+) WITHOUT ROWID;
+
+-- 逐题选项分布（按单题记录最终所选选项计数）
+CREATE TABLE IF NOT EXISTS question_option_picks (
+    question_id INTEGER NOT NULL,
+    option_id INTEGER NOT NULL,
+    picks INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (question_id, option_id),
+    FOREIGN KEY (question_id) REFERENCES questions(id),
+    FOREIGN KEY (option_id) REFERENCES options(id)
+) WITHOUT ROWID;
+
+-- 用户逐题掌握度表：提交答案时增量更新，供自适应出题使用（不必扫描答题历史）
+CREATE TABLE IF NOT EXISTS user_question_stats (
+    user_id INTEGER NOT NULL,
+    question_id INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    avg_time_taken REAL NOT NULL DEFAULT 0, -- 平均用时（毫秒）
+    streak INTEGER NOT NULL DEFAULT 0, -- 连续答对次数
+    last_seen TIMESTAMP,
+    due_at TIMESTAMP, -- 间隔重复的下次复习时间
+    PRIMARY KEY (user_id, question_id),
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (question_id) REFERENCES questions(id)
+) WITHOUT ROWID;
+
+-- 班级/分组表
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    owner_id INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (owner_id) REFERENCES users(id)
+);
+
+-- 分组成员表：主键 (group_id, user_id) 按分组列出成员，反向索引按用户列出所属分组
+CREATE TABLE IF NOT EXISTS group_members (
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    role TEXT NOT NULL DEFAULT 'member' CHECK (role IN ('owner', 'member')),
+    joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_id, user_id),
+    FOREIGN KEY (group_id) REFERENCES groups(id),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+) WITHOUT ROWID;
+
+-- 分组邀请表：组长按用户名邀请已有用户，被邀请人接受后才加入分组（拒绝或接受后删除）
+CREATE TABLE IF NOT EXISTS group_invitations (
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    invited_by INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_id, user_id),
+    FOREIGN KEY (group_id) REFERENCES groups(id),
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (invited_by) REFERENCES users(id)
+) WITHOUT ROWID;
+
+-- 分组数据共享授权：成员同意后组长才能导出其答题数据（退出分组或撤回时删除）
+CREATE TABLE IF NOT EXISTS group_export_consents (
+    group_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    granted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (group_id, user_id),
+    FOREIGN KEY (group_id) REFERENCES groups(id),
+    FOREIGN KEY (user_id) REFERENCES users(id)
+) WITHOUT ROWID;
+
+-- 分时段排行榜汇总表：每个用户在各时段（daily/weekly/all）、各模式下的最佳成绩
+-- period_start 为时段起始日期（总榜为空字符串），答题结束时增量更新，过期时段定期清理
+CREATE TABLE IF NOT EXISTS leaderboard_rollups (
+    period TEXT NOT NULL CHECK (period IN ('daily', 'weekly', 'all')),
+    period_start TEXT NOT NULL,
+    mode TEXT NOT NULL CHECK (mode IN ('speed', 'study')),
+    user_id INTEGER NOT NULL,
+    quiz_record_id INTEGER NOT NULL,
+    correct_answers INTEGER NOT NULL DEFAULT 0,
+    total_questions INTEGER NOT NULL DEFAULT 0,
+    time_spent INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP,
+    PRIMARY KEY (period, period_start, mode, user_id),
+    FOREIGN KEY (user_id) REFERENCES users(id),
+    FOREIGN KEY (quiz_record_id) REFERENCES quiz_records(id)
+);
+
 -- 速答排行榜视图
 CREATE VIEW IF NOT EXISTS speed_leaderboard AS
 SELECT 
@@ -106,6 +218,29 @@ CREATE INDEX IF NOT EXISTS idx_user_sessions_token_jti ON user_sessions(token_jt
 CREATE INDEX IF NOT EXISTS idx_quiz_records_user_id ON quiz_records(user_id);
 CREATE INDEX IF NOT EXISTS idx_quiz_records_mode ON quiz_records(mode);
 CREATE INDEX IF NOT EXISTS idx_quiz_records_created_at ON quiz_records(created_at);
+-- 自动结束被放弃的答题：按开始时间范围扫描未完成的记录
+CREATE INDEX IF NOT EXISTS idx_quiz_records_open ON quiz_records(completed, start_time);
+-- 答题历史键集分页的覆盖索引（按模式筛选 / 不筛选两种查询各一条）
+CREATE INDEX IF NOT EXISTS idx_quiz_records_user_mode_history ON quiz_records(
+    user_id, mode, created_at DESC, id DESC,
+    start_time, end_time, total_questions, correct_answers, time_spent, completed
+);
+CREATE INDEX IF NOT EXISTS idx_quiz_records_user_history ON quiz_records(
+    user_id, created_at DESC, id DESC,
+    mode, start_time, end_time, total_questions, correct_answers, time_spent, completed
+);
+CREATE INDEX IF NOT EXISTS idx_group_members_user ON group_members(user_id, group_id, role);
+CREATE INDEX IF NOT EXISTS idx_groups_owner ON groups(owner_id);
+-- 选项按题目与顺序排列（出题、题库快照与题目统计按顺序读取选项，无需排序）
+CREATE INDEX IF NOT EXISTS idx_options_question_order ON options(question_id, option_order);
+CREATE INDEX IF NOT EXISTS idx_group_invitations_user ON group_invitations(user_id, group_id);
+-- 分时段排行榜按各模式排序的部分索引（直接按顺序取前 N 名，无需排序）
+CREATE INDEX IF NOT EXISTS idx_leaderboard_rollups_speed ON leaderboard_rollups(
+    period, period_start, correct_answers DESC, time_spent ASC, created_at DESC
+) WHERE mode = 'speed';
+CREATE INDEX IF NOT EXISTS idx_leaderboard_rollups_study ON leaderboard_rollups(
+    period, period_start, total_questions DESC, time_spent DESC, created_at DESC
+) WHERE mode = 'study';
 CREATE INDEX IF NOT EXISTS idx_question_answers_quiz_record_id ON question_answers(quiz_record_id);
 CREATE INDEX IF NOT EXISTS idx_question_answers_question_id ON question_answers(question_id);
 
@@ -120,6 +255,57 @@ BEGIN
     WHERE id = (SELECT user_id FROM quiz_records WHERE id = NEW.quiz_record_id);
 END;
 
+-- 创建触发器，增量维护逐题统计（新增单题记录）
+-- 注意：归档等搬移单题记录的操作不应影响统计，因此不设删除触发器
+CREATE TRIGGER IF NOT EXISTS update_question_stats_after_answer
+    AFTER INSERT ON question_answers
+    FOR EACH ROW
+BEGIN
+    INSERT INTO question_stats (question_id, answers, attempts, first_try_correct, total_time_taken)
+    VALUES (NEW.question_id, 1, COALESCE(NEW.attempt_count, 1),
+            CASE WHEN NEW.is_correct AND COALESCE(NEW.attempt_count, 1) = 1 THEN 1 ELSE 0 END,
+            COALESCE(NEW.time_taken, 0))
+    ON CONFLICT (question_id) DO UPDATE SET
+        answers = answers + 1,
+        attempts = attempts + excluded.attempts,
+        first_try_correct = first_try_correct + excluded.first_try_correct,
+        total_time_taken = total_time_taken + excluded.total_time_taken;
+
+    INSERT INTO question_time_buckets (question_id, bucket, answers)
+    VALUES (NEW.question_id, MIN(COALESCE(NEW.time_taken, 0) / 500, 120), 1)
+    ON CONFLICT (question_id, bucket) DO UPDATE SET answers = answers + 1;
+
+    INSERT INTO question_option_picks (question_id, option_id, picks)
+    SELECT NEW.question_id, NEW.selected_option_id, 1 WHERE NEW.selected_option_id IS NOT NULL
+    ON CONFLICT (question_id, option_id) DO UPDATE SET picks = picks + 1;
+END;
+
+-- 创建触发器，增量维护逐题统计（学习模式重复作答会更新同一行：先减去旧值再加上新值）
+CREATE TRIGGER IF NOT EXISTS update_question_stats_after_answer_update
+    AFTER UPDATE OF selected_option_id, is_correct, attempt_count, time_taken ON question_answers
+    FOR EACH ROW
+BEGIN
+    UPDATE question_stats SET
+        attempts = attempts - COALESCE(OLD.attempt_count, 1) + COALESCE(NEW.attempt_count, 1),
+        first_try_correct = first_try_correct
+            - CASE WHEN OLD.is_correct AND COALESCE(OLD.attempt_count, 1) = 1 THEN 1 ELSE 0 END
+            + CASE WHEN NEW.is_correct AND COALESCE(NEW.attempt_count, 1) = 1 THEN 1 ELSE 0 END,
+        total_time_taken = total_time_taken - COALESCE(OLD.time_taken, 0) + COALESCE(NEW.time_taken, 0)
+    WHERE question_id = NEW.question_id;
+
+    UPDATE question_time_buckets SET answers = answers - 1
+    WHERE question_id = OLD.question_id AND bucket = MIN(COALESCE(OLD.time_taken, 0) / 500, 120);
+    INSERT INTO question_time_buckets (question_id, bucket, answers)
+    VALUES (NEW.question_id, MIN(COALESCE(NEW.time_taken, 0) / 500, 120), 1)
+    ON CONFLICT (question_id, bucket) DO UPDATE SET answers = answers + 1;
+
+    UPDATE question_option_picks SET picks = picks - 1
+    WHERE question_id = OLD.question_id AND option_id = OLD.selected_option_id;
+    INSERT INTO question_option_picks (question_id, option_id, picks)
+    SELECT NEW.question_id, NEW.selected_option_id, 1 WHERE NEW.selected_option_id IS NOT NULL
+    ON CONFLICT (question_id, option_id) DO UPDATE SET picks = picks + 1;
+END;
+
 -- 创建触发器，清理过期的用户会话
 CREATE TRIGGER IF NOT EXISTS cleanup_expired_sessions
     AFTER INSERT ON user_sessions
@@ -127,4 +313,60 @@ CREATE TRIGGER IF NOT EXISTS cleanup_expired_sessions
 BEGIN
     UPDATE user_sessions SET is_active = FALSE 
     WHERE expires_at < datetime('now') AND is_active = TRUE;
-END;
\ No newline at end of file
+END;
+-- 题库修订号：题目或选项的任何增删改都使其递增，题库快照据此判断是否过期
+CREATE TABLE IF NOT EXISTS bank_revision (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    revision INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO bank_revision (id, revision) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS bump_bank_revision_after_question_insert
+    AFTER INSERT ON questions
+BEGIN
+    UPDATE bank_revision SET revision = revision + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS bump_bank_revision_after_question_update
+    AFTER UPDATE ON questions
+BEGIN
+    UPDATE bank_revision SET revision = revision + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS bump_bank_revision_after_question_delete
+    AFTER DELETE ON questions
+BEGIN
+    UPDATE bank_revision SET revision = revision + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS bump_bank_revision_after_option_insert
+    AFTER INSERT ON options
+BEGIN
+    UPDATE bank_revision SET revision = revision + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS bump_bank_revision_after_option_update
+    AFTER UPDATE ON options
+BEGIN
+    UPDATE bank_revision SET revision = revision + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS bump_bank_revision_after_option_delete
+    AFTER DELETE ON options
+BEGIN
+    UPDATE bank_revision SET revision = revision + 1 WHERE id = 1;
+END;
+
+-- 题库包版本清单：各版本中每道题的内容哈希（JSON：{题目ID: 哈希}），用于计算客户端的增量更新
+CREATE TABLE IF NOT EXISTS question_pack_versions (
+    subject_name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    manifest TEXT NOT NULL,
+    question_count INTEGER NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (subject_name, version)
+);
+
+-- 登录时清理过期会话的触发器按 (is_active, expires_at) 范围查找，不再扫描整个会话表
+CREATE INDEX IF NOT EXISTS idx_user_sessions_active_expires ON user_sessions(is_active, expires_at);
@@ -8,7 +8,15 @@
 import sqlite3
 import re
 import json
+import sys
 from datetime import datetime
+from pathlib import Path
+
+SCHEMA_PATH = Path(__file__).resolve().parent / 'database_schema.sql'
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.bank_snapshot import default_snapshot_path, write_snapshot  # noqa: E402
 
 class QuestionImporter:
     def __init__(self, db_path='database/quiz_app.db'):
@@ -31,7 +39,7 @@ class QuestionImporter:
         # 检查是否已有基础表
         self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='subjects'")
         if not self.cursor.fetchone():
-            with open('database_schema.sql', 'r', encoding='utf-8') as f:
+            with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
                 schema = f.read()
                 self.cursor.executescript(schema)
             self.conn.commit()
@@ -245,6 +253,11 @@ class QuestionImporter:
         
         print(f"导入完成！成功导入 {success_count} 个题目")
         
+        # 生成题库快照（后端各工作进程只读映射共享，不再各自加载一份题库）
+        snapshot_path = default_snapshot_path(str(self.db_path))
+        version = write_snapshot(self.conn, snapshot_path)
+        print(f"题库快照已生成: {snapshot_path}（版本 {version}）")
+        
         # 关闭数据库连接
         self.close_db()
 
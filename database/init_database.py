@@ -9,6 +9,9 @@ import sqlite3
 import os
 from pathlib import Path
 
+# 架构文件与题库文件均相对于本脚本所在目录定位，便于从任意工作目录调用
+DATABASE_DIR = Path(__file__).resolve().parent
+
 def init_database(db_path='database/quiz_app.db'):
     """初始化数据库"""
     print("开始初始化数据库...")
@@ -23,15 +26,19 @@ def init_database(db_path='database/quiz_app.db'):
     cursor = conn.cursor()
     
     try:
+        # 0. 新库启用增量 vacuum（须在建表前设置），归档后可用 PRAGMA incremental_vacuum 归还空闲页；
+        #    已有数据库需用 database/archive_answers.py --enable-incremental-vacuum 转换一次
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        
         # 1. 执行基础架构
         print("创建基础表结构...")
-        with open('database_schema.sql', 'r', encoding='utf-8') as f:
+        with open(DATABASE_DIR / 'database_schema.sql', 'r', encoding='utf-8') as f:
             base_schema = f.read()
             cursor.executescript(base_schema)
         
         # 2. 执行扩展架构
         print("创建扩展表结构...")
-        with open('extended_schema.sql', 'r', encoding='utf-8') as f:
+        with open(DATABASE_DIR / 'extended_schema.sql', 'r', encoding='utf-8') as f:
             extended_schema = f.read()
             cursor.executescript(extended_schema)
         
@@ -49,7 +56,7 @@ def init_database(db_path='database/quiz_app.db'):
             
             # 使用导入器导入数据
             importer = QuestionImporter(db_path)
-            importer.import_questions('小学古诗词专项练习.txt', reset=True)
+            importer.import_questions(DATABASE_DIR / '小学古诗词专项练习.txt', reset=True)
             
             # 重新连接
             conn = sqlite3.connect(db_path)
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库维护工具
+在线备份（备份 API 分步复制，不阻塞服务）、ANALYZE / PRAGMA optimize、WAL 检查点与容量报告；
+适合由 cron 定时调用，也可用 run 子命令在前台按计划循环执行
+
+用法：
+    python database/maintenance.py report
+    python database/maintenance.py backup --dir backups --keep 7
+    python database/maintenance.py analyze
+    python database/maintenance.py checkpoint --mode PASSIVE
+    python database/maintenance.py wal                      # 切换为 WAL 日志模式（只需一次）
+    python database/maintenance.py sweep                    # 自动结束被放弃的答题
+    python database/maintenance.py compact                  # 把作答日志合并到单题记录
+    python database/maintenance.py purge                    # 清理过期的提交答案幂等记录
+    python database/maintenance.py run --backup-dir backups  # 前台定时维护
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.maintenance import (  # noqa: E402
+    CHECKPOINT_MODES, DEFAULT_ANALYSIS_LIMIT, DEFAULT_BACKUP_KEEP, DEFAULT_BACKUP_PAGES, DEFAULT_BACKUP_SLEEP,
+    MaintenanceScheduler, connect, online_backup, backup_to_dir, analyze, optimize, checkpoint, size_report,
+    default_tasks,
+)
+from services.quiz_sweeper import DEFAULT_STALE_AFTER, finalize_abandoned  # noqa: E402
+from services.answer_journal import DEFAULT_BATCH_SIZE as JOURNAL_BATCH_SIZE, ensure_journal, compact  # noqa: E402
+from services.idempotency import DEFAULT_RETENTION, ensure_submissions, purge_submissions  # noqa: E402
+
+def format_bytes(value):
+    """字节数转为易读的字符串"""
+    if value < 1024:
+        return f'{value} B'
+    for unit in ('KB', 'MB', 'GB'):
+        value /= 1024
+        if value < 1024 or unit == 'GB':
+            return f'{value:.1f} {unit}'
+
+def print_report(report):
+    print(f"日志模式: {report['journal_mode']}，auto_vacuum: {report['auto_vacuum']}")
+    print(f"数据库文件: {format_bytes(report['db_bytes'])}（{report['page_count']} 页 × {report['page_size']} B）")
+    print(f"WAL 文件: {format_bytes(report['wal_bytes'])}")
+    print(f"空闲页: {report['freelist_count']} 页（{format_bytes(report['freelist_bytes'])}）")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='数据库在线备份与维护')
+    parser.add_argument('--db', default='database/quiz_app.db', help='数据库路径')
+    parser.add_argument('--busy-timeout', type=float, default=5.0, help='数据库繁忙时的等待秒数')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    report_parser = commands.add_parser('report', help='容量报告（数据库、WAL、空闲页）')
+    report_parser.add_argument('--json', action='store_true', help='以 JSON 输出')
+
+    backup_parser = commands.add_parser('backup', help='在线备份')
+    target = backup_parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--dir', help='备份目录（文件名带时间戳，并清理旧备份）')
+    target.add_argument('-o', '--output', help='备份文件路径')
+    backup_parser.add_argument('--keep', type=int, default=DEFAULT_BACKUP_KEEP, help='--dir 时保留的备份数')
+    backup_parser.add_argument('--pages', type=int, default=DEFAULT_BACKUP_PAGES, help='每步复制的页数')
+    backup_parser.add_argument('--sleep', type=float, default=DEFAULT_BACKUP_SLEEP, help='步间暂停秒数')
+
+    for name, description in (('analyze', '采样收集全部统计信息'), ('optimize', 'PRAGMA optimize（仅分析过时的表）')):
+        command = commands.add_parser(name, help=description)
+        command.add_argument('--analysis-limit', type=int, default=DEFAULT_ANALYSIS_LIMIT,
+                             help='每个索引最多采样的行数（0 表示不限制）')
+
+    checkpoint_parser = commands.add_parser('checkpoint', help='WAL 检查点')
+    checkpoint_parser.add_argument('--mode', choices=CHECKPOINT_MODES, default='PASSIVE', help='检查点模式')
+
+    commands.add_parser('wal', help='切换为 WAL 日志模式（读写互不阻塞，需配合定期检查点）')
+
+    sweep_parser = commands.add_parser('sweep', help='自动结束超过时限仍未结束的答题')
+    for mode, seconds in DEFAULT_STALE_AFTER.items():
+        sweep_parser.add_argument(f'--{mode}-after', type=int, default=seconds,
+                                  help=f'{mode} 模式开始后超过该秒数视为放弃')
+
+    compact_parser = commands.add_parser('compact', help='把作答日志（answer_events）合并到单题记录与统计')
+    compact_parser.add_argument('--batch-size', type=int, default=JOURNAL_BATCH_SIZE, help='每个事务合并的事件数')
+
+    purge_parser = commands.add_parser('purge', help='清理过期的提交答案幂等记录（answer_submissions）')
+    purge_parser.add_argument('--retention', type=int, default=DEFAULT_RETENTION, help='保留秒数')
+
+    run_parser = commands.add_parser('run', help='前台按计划循环执行维护')
+    run_parser.add_argument('--backup-dir', help='备份目录（为空时不备份）')
+    run_parser.add_argument('--backup-interval', type=int, default=86400, help='备份间隔秒数')
+    run_parser.add_argument('--keep', type=int, default=DEFAULT_BACKUP_KEEP, help='保留的备份数')
+    run_parser.add_argument('--optimize-interval', type=int, default=3600, help='optimize 间隔秒数')
+    run_parser.add_argument('--analyze-interval', type=int, default=86400, help='ANALYZE 间隔秒数')
+    run_parser.add_argument('--checkpoint-interval', type=int, default=60, help='检查点间隔秒数')
+    run_parser.add_argument('--sweep-interval', type=int, default=300, help='自动结束放弃答题的间隔秒数（0 关闭）')
+    run_parser.add_argument('--compact-interval', type=int, default=5, help='合并作答日志的间隔秒数（0 关闭）')
+    run_parser.add_argument('--purge-interval', type=int, default=3600, help='清理过期幂等记录的间隔秒数（0 关闭）')
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        tasks = default_tasks(args.db, args.backup_dir, args.backup_interval, args.keep,
+                              args.optimize_interval, args.analyze_interval, args.checkpoint_interval)
+        scheduler = MaintenanceScheduler(args.db, tasks, args.busy_timeout, log=print)
+        scheduler.add_task('sweep_quizzes', args.sweep_interval, finalize_abandoned)
+        conn = connect(args.db, args.busy_timeout)
+        try:
+            if args.compact_interval > 0:
+                ensure_journal(conn)
+            if args.purge_interval > 0:
+                ensure_submissions(conn)
+        finally:
+            conn.close()
+        scheduler.add_task('compact_answers', args.compact_interval, compact)
+        scheduler.add_task('purge_submissions', args.purge_interval, purge_submissions)
+        scheduler.start()
+        print(f"维护计划已启动: {', '.join(name for name, _, _ in scheduler.tasks)}（Ctrl+C 退出）")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+        return
+
+    conn = connect(args.db, args.busy_timeout)
+    try:
+        if args.command == 'report':
+            report = size_report(conn, args.db)
+            if args.json:
+                print(json.dumps(report, ensure_ascii=False))
+            else:
+                print_report(report)
+        elif args.command == 'backup':
+            if args.dir:
+                result = backup_to_dir(conn, args.db, args.dir, args.keep, args.pages, args.sleep)
+            else:
+                result = online_backup(conn, args.output, args.pages, args.sleep)
+            print(f"备份完成: {result['path']}（{format_bytes(result['bytes'])}，{result['pages']} 页，"
+                  f"{result['seconds']} 秒，重新开始 {result['restarts']} 次"
+                  + ("，已改为一步复制" if result['single_step'] else "") + "）")
+            for path in result.get('removed', []):
+                print(f"已删除旧备份: {path}")
+        elif args.command == 'analyze':
+            started = time.perf_counter()
+            analyze(conn, args.analysis_limit)
+            print(f"ANALYZE 完成，耗时 {time.perf_counter() - started:.3f} 秒")
+        elif args.command == 'optimize':
+            action = optimize(conn, args.analysis_limit)
+            print("PRAGMA optimize 完成" if action == 'optimize' else "尚无统计信息，已执行 ANALYZE")
+        elif args.command == 'checkpoint':
+            busy, log_frames, checkpointed = checkpoint(conn, args.mode)
+            if log_frames < 0:
+                print("当前不是 WAL 模式，无需检查点")
+            else:
+                print(f"检查点（{args.mode}）：WAL {log_frames} 帧，已写回 {checkpointed} 帧"
+                      + ("，有连接占用未能全部写回" if busy else ""))
+        elif args.command == 'sweep':
+            stale_after = {mode: getattr(args, f'{mode}_after') for mode in DEFAULT_STALE_AFTER}
+            finalized = finalize_abandoned(conn, stale_after)
+            print(f"已自动结束 {finalized} 条被放弃的答题记录")
+        elif args.command == 'compact':
+            ensure_journal(conn)
+            started = time.perf_counter()
+            compacted = compact(conn, args.batch_size)
+            print(f"已合并 {compacted} 条作答事件，耗时 {time.perf_counter() - started:.3f} 秒")
+        elif args.command == 'purge':
+            ensure_submissions(conn)
+            purged = purge_submissions(conn, args.retention)
+            print(f"已清理 {purged} 条过期的幂等记录")
+        elif args.command == 'wal':
+            mode = conn.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            print(f"日志模式: {mode}")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
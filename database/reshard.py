@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片创建与重新划分工具（需停止后端服务后执行，执行前建议先备份）
+把用户数据（答题记录、单题记录、登录会话、掌握度、排行榜汇总、逐题统计与用户累计镜像）
+从当前布局（主库或现有分片）按用户ID哈希复制到 N 个新分片；--shards 0 把数据合并回主库。
+新分片先写入临时文件，全部复制并核对行数后才替换旧分片；原来在主库中的用户数据随后从主库删除。
+新分片的自增ID从高于全部已有ID的新区间开始，各分片之间不会重复。
+
+用法：
+    python database/reshard.py database/quiz_app.db --shards 4     # 从主库拆分为 4 个分片
+    python database/reshard.py database/quiz_app.db --shards 8     # 4 -> 8
+    python database/reshard.py database/quiz_app.db --shards 0     # 合并回主库
+之后以 QUIZ_SHARDS=<分片数> 启动后端
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.shards import (  # noqa: E402
+    SHARD_ID_STRIDE, SEQUENCE_TABLES, default_shard_paths, shard_index, shard_schema,
+    init_shard, create_triggers, read_shard_info,
+)
+from services.answer_journal import ensure_journal, compact  # noqa: E402
+
+DATABASE_DIR = Path(__file__).resolve().parent
+DEFAULT_BATCH_SIZE = 1000
+
+# 按 user_id 列分配的表；单题记录与已归档标记跟随其答题记录
+USER_TABLES = ('user_sessions', 'leaderboard_rollups', 'user_question_stats')
+# 逐题统计为可相加的汇总：(表, 键列, 累加列)，合并到一个目标库中（接口按分片求和）
+STAT_TABLES = (
+    ('question_stats', ('question_id',), ('answers', 'attempts', 'first_try_correct', 'total_time_taken')),
+    ('question_time_buckets', ('question_id', 'bucket'), ('answers',)),
+    ('question_option_picks', ('question_id', 'option_id'), ('picks',)),
+)
+# 用户镜像（分片中的 users 表）携带的列
+MIRROR_COLUMNS = ('id', 'username', 'password_hash', 'created_at', 'total_questions_answered', 'total_correct_answers')
+
+def current_layout(main_path):
+    """当前的分片路径列表（未分片时为空列表）"""
+    first = default_shard_paths(main_path, 1)[0]
+    if not os.path.exists(first):
+        return []
+    conn = sqlite3.connect(first)
+    try:
+        info = read_shard_info(conn)
+    finally:
+        conn.close()
+    if info is None:
+        raise RuntimeError(f'{first} 不是分片库')
+    return default_shard_paths(main_path, info[1])
+
+def next_id_range(conns):
+    """高于全部已有自增ID的第一个ID区间序号"""
+    highest = 0
+    for conn in conns:
+        for table in SEQUENCE_TABLES:
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (table,)).fetchone()
+            highest = max(highest, row[0] if row else 0,
+                          conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0])
+    return highest // SHARD_ID_STRIDE + 1
+
+def _insert_rows(conn, table, columns, rows, verb='INSERT'):
+    placeholders = ', '.join('?' * len(columns))
+    conn.executemany(f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+def _add_stats(conn, table, keys, values, rows):
+    columns = keys + values
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in values)
+    conn.executemany(f"""
+        INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+        ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}
+    """, rows)
+
+class Copier:
+    """把源库中的用户数据按目标分片路由写入，并统计各表复制的行数"""
+
+    def __init__(self, targets, batch_size=DEFAULT_BATCH_SIZE):
+        self.targets = targets  # 目标连接列表；只有一个时（合并回主库）全部写入该库
+        self.batch_size = batch_size
+        self.copied = {}
+
+    def target_for(self, user_id):
+        return 0 if len(self.targets) == 1 else shard_index(user_id, len(self.targets))
+
+    def _count(self, table, n):
+        self.copied[table] = self.copied.get(table, 0) + n
+
+    def _route(self, table, columns, rows, user_column, verb='INSERT'):
+        position = columns.index(user_column)
+        routed = {}
+        for row in rows:
+            routed.setdefault(self.target_for(row[position]), []).append(row)
+        for index, part in routed.items():
+            _insert_rows(self.targets[index], table, columns, part, verb)
+        self._count(table, len(rows))
+        return routed
+
+    def copy_users(self, source, from_main):
+        """用户累计镜像：从主库拆分时取主库 users，从分片重新划分时取各分片的镜像"""
+        cursor = source.execute(f"SELECT {', '.join(MIRROR_COLUMNS)} FROM users")
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                return
+            if len(self.targets) == 1:
+                # 合并回主库：把镜像中的累计写回主库的用户行
+                self.targets[0].executemany(
+                    "UPDATE users SET total_questions_answered = ?, total_correct_answers = ? WHERE id = ?",
+                    [(row[4], row[5], row[0]) for row in rows]
+                )
+                self._count('users', len(rows))
+            else:
+                # 镜像不保存密码
+                rows = [(row[0], row[1], '') + tuple(row[3:]) for row in rows] if from_main else rows
+                self._route('users', MIRROR_COLUMNS, rows, 'id')
+
+    def copy_quizzes(self, source):
+        """答题记录连同其单题记录与归档标记（按答题记录分批，单题记录经 quiz_record_id 索引读取）"""
+        cursor = source.execute("SELECT * FROM quiz_records ORDER BY id")
+        columns = [d[0] for d in cursor.description]
+        while True:
+            rows = cursor.fetchmany(self.batch_size)
+            if not rows:
+                return
+            routed = self._route('quiz_records', columns, rows, 'user_id')
+            for index, part in routed.items():
+                ids = [row[0] for row in part]
+                placeholders = ','.join('?' * len(ids))
+                for table in ('question_answers', 'archived_quizzes'):
+                    child = source.execute(f"SELECT * FROM {table} WHERE quiz_record_id IN ({placeholders})", ids)
+                    child_columns = [d[0] for d in child.description]
+                    child_rows = child.fetchall()
+                    _insert_rows(self.targets[index], table, child_columns, child_rows)
+                    self._count(table, len(child_rows))
+
+    def copy_user_tables(self, source):
+        for table in USER_TABLES:
+            cursor = source.execute(f"SELECT * FROM {table}")
+            columns = [d[0] for d in cursor.description]
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                self._route(table, columns, rows, 'user_id')
+
+    def copy_stats(self, source):
+        for table, keys, values in STAT_TABLES:
+            cursor = source.execute(f"SELECT {', '.join(keys + values)} FROM {table}")
+            while True:
+                rows = cursor.fetchmany(self.batch_size)
+                if not rows:
+                    break
+                _add_stats(self.targets[0], table, keys, values, rows)
+                self._count(table, len(rows))
+
+def count_rows(conns, tables):
+    return {table: sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for conn in conns)
+            for table in tables}
+
+def remove_database(path):
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def reshard(main_path, shard_count, batch_size=DEFAULT_BATCH_SIZE, keep_old=False, log=print):
+    """把用户数据重新划分到 shard_count 个分片（0 表示合并回主库），返回各表复制的行数"""
+    with open(DATABASE_DIR / 'extended_schema.sql', 'r', encoding='utf-8') as f:
+        script = f.read()
+    _, trigger_statements = shard_schema(script)
+    trigger_names = [statement.split('EXISTS', 1)[1].split()[0] for statement in trigger_statements]
+
+    old_paths = current_layout(main_path)
+    if len(old_paths) == shard_count:
+        log(f"当前已是 {shard_count} 个分片，无需调整")
+        return {}
+    from_main = not old_paths
+
+    main = sqlite3.connect(main_path)
+    sources = [main] if from_main else [sqlite3.connect(path) for path in old_paths]
+    for source in sources:
+        # 先把作答日志合并到单题记录（日志不随分片搬移）
+        ensure_journal(source)
+        compact(source)
+        # 把 WAL 中的内容写回数据库文件，之后才能安全地替换或删除旧文件
+        source.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    new_paths = default_shard_paths(main_path, shard_count)
+    temp_paths = [path + '.resharding' for path in new_paths]
+    if shard_count:
+        base_range = next_id_range(sources)
+        targets = []
+        for index, path in enumerate(temp_paths):
+            remove_database(path)
+            conn = sqlite3.connect(path)
+            # 复制完成后再建触发器，搬移的单题记录不会被重复累计到统计与用户累计中
+            init_shard(conn, index, shard_count, script, with_triggers=False,
+                       sequence_floor={table: (base_range + index) * SHARD_ID_STRIDE for table in SEQUENCE_TABLES})
+            targets.append(conn)
+    else:
+        targets = [main]
+        for name in trigger_names:
+            main.execute(f"DROP TRIGGER IF EXISTS {name}")
+
+    counted = ('quiz_records', 'question_answers', 'archived_quizzes') + USER_TABLES
+    expected = count_rows(sources, counted)
+    copier = Copier(targets, batch_size)
+    started = time.time()
+    try:
+        for number, source in enumerate(sources):
+            copier.copy_users(source, from_main)
+            copier.copy_quizzes(source)
+            copier.copy_user_tables(source)
+            copier.copy_stats(source)
+            log(f"已复制 {number + 1}/{len(sources)} 个源库（{time.time() - started:.1f} 秒）")
+        actual = count_rows(targets, counted)
+        if actual != expected:
+            raise RuntimeError(f'行数核对失败: 源 {expected}，目标 {actual}')
+        for target in targets:
+            target.commit()
+            create_triggers(target, script)
+    except BaseException:
+        for target in targets:
+            target.rollback()
+        if not shard_count:
+            create_triggers(main, script)
+        raise
+    finally:
+        for source in sources:
+            if source is not main:
+                source.close()
+        if shard_count:
+            for target in targets:
+                target.close()
+
+    # 替换旧分片：全部新分片已提交后才删除（或保留为 .old）旧文件
+    for path in old_paths:
+        if keep_old:
+            os.replace(path, path + '.old')
+        remove_database(path)
+    for temp_path, path in zip(temp_paths[:shard_count], new_paths):
+        os.replace(temp_path, path)
+
+    if from_main:
+        # 用户数据已移入分片，清空主库中的副本（主库的 users 表仍是账号表）
+        for table in ('quiz_records', 'question_answers', 'archived_quizzes') + USER_TABLES + \
+                tuple(table for table, _, _ in STAT_TABLES):
+            main.execute(f"DELETE FROM {table}")
+        main.commit()
+    main.close()
+    return copier.copied
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='按用户创建 / 重新划分数据库分片（需停止服务）')
+    parser.add_argument('db_path', nargs='?', default='database/quiz_app.db', help='主库路径')
+    parser.add_argument('--shards', type=int, required=True, help='目标分片数（0 表示合并回主库）')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='每批复制的行数')
+    parser.add_argument('--keep-old', action='store_true', help='旧分片重命名为 *.old 保留，而不是删除')
+    args = parser.parse_args()
+
+    if args.shards < 0:
+        parser.error('分片数不能为负数')
+    try:
+        copied = reshard(args.db_path, args.shards, args.batch_size, args.keep_old)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    if copied:
+        print("复制行数: " + '，'.join(f"{table} {count}" for table, count in copied.items()))
+        print(f"完成：请以 QUIZ_SHARDS={args.shards} 启动后端")
+
+if __name__ == '__main__':
+    main()
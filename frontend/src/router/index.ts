@@ -3,6 +3,7 @@ import Home from '../views/Home.vue'
 import SpeedMode from '../views/SpeedMode.vue'
 import StudyMode from '../views/StudyMode.vue'
 import Leaderboard from '../views/Leaderboard.vue'
+import Battle from '../views/Battle.vue'
 import { useAuthStore } from '../stores/auth'
 
 const routes: RouteRecordRaw[] = [
@@ -10,6 +11,7 @@ const routes: RouteRecordRaw[] = [
   { path: '/speed', name: 'speed', component: SpeedMode, meta: { requiresAuth: true } },
   { path: '/study', name: 'study', component: StudyMode, meta: { requiresAuth: true } },
   { path: '/leaderboard', name: 'leaderboard', component: Leaderboard, meta: { requiresAuth: true } },
+  { path: '/battle', name: 'battle', component: Battle, meta: { requiresAuth: true } },
 ]
 
 const router = createRouter({
@@ -1,5 +1,6 @@
 import { defineStore } from 'pinia'
-import { http } from '../utils/http'
+import axios from 'axios'
+import { http, saveTokens, clearTokens } from '../utils/http'
 
 export interface UserProfile {
   id: number
@@ -51,15 +52,20 @@ export const useAuthStore = defineStore('auth', {
       const data = res.data
       this.token = data.access_token
       this.user = { id: data.user_id, username: data.username }
-      localStorage.setItem('access_token', this.token!)
+      saveTokens(data)
     },
     async register(payload: { username: string; email?: string; password: string }) {
       await http.post('/register', payload)
     },
     logout() {
+      // 通知服务端注销登录会话（刷新令牌随之失效），失败不影响本地登出
+      const token = localStorage.getItem('access_token')
+      if (token && token !== 'null' && token !== 'undefined') {
+        axios.post('/api/logout', null, { headers: { Authorization: `Bearer ${token}` } }).catch(() => {})
+      }
       this.token = null
       this.user = null
-      localStorage.removeItem('access_token')
+      clearTokens()
     },
   },
 })
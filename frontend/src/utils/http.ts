@@ -16,19 +16,96 @@ http.interceptors.request.use((config) => {
   return config
 })
 
+export function saveTokens(data: { access_token: string; refresh_token?: string }) {
+  localStorage.setItem('access_token', data.access_token)
+  if (data.refresh_token) localStorage.setItem('refresh_token', data.refresh_token)
+}
+
+export function clearTokens() {
+  localStorage.removeItem('access_token')
+  localStorage.removeItem('refresh_token')
+}
+
+// 同一时刻只发起一次刷新，并发的 401 请求共用其结果（刷新令牌每次使用后即失效，重复使用会注销会话）
+let refreshing: Promise<string> | null = null
+
+export function refreshAccessToken(): Promise<string> {
+  if (!refreshing) {
+    const refreshToken = localStorage.getItem('refresh_token')
+    refreshing = (async () => {
+      if (!refreshToken) throw new Error('no refresh token')
+      // 不经过 http 实例，避免请求拦截器带上访问令牌、响应拦截器再次处理 401
+      const res = await axios.post('/api/token/refresh', null, {
+        headers: { Authorization: `Bearer ${refreshToken}` },
+        timeout: 15000,
+      })
+      saveTokens(res.data)
+      return res.data.access_token as string
+    })().finally(() => {
+      refreshing = null
+    })
+  }
+  return refreshing
+}
+
+function redirectToLogin() {
+  clearTokens()
+  if (!location.search.includes('login=1')) {
+    const url = new URL(location.href)
+    url.searchParams.set('login', '1')
+    location.replace(url.toString())
+  }
+}
+
 http.interceptors.response.use(
   (resp) => resp,
-  (error) => {
-    if (error?.response?.status === 401) {
-      localStorage.removeItem('access_token')
-      if (!location.search.includes('login=1')) {
-        const url = new URL(location.href)
-        url.searchParams.set('login', '1')
-        location.replace(url.toString())
+  async (error) => {
+    const config = error?.config
+    if (error?.response?.status === 401 && config) {
+      // 访问令牌过期：刷新后重试一次；登录接口本身的 401 是用户名或密码错误
+      if (!config._retried && !String(config.url).endsWith('/login') && localStorage.getItem('refresh_token')) {
+        config._retried = true
+        const sent = String(config.headers?.Authorization || '').replace('Bearer ', '')
+        try {
+          // 其他标签页可能已经刷新过，直接使用新的访问令牌
+          const current = localStorage.getItem('access_token')
+          if (!current || current === sent) await refreshAccessToken()
+          return http(config)
+        } catch (_) {
+          redirectToLogin()
+          return Promise.reject(error)
+        }
       }
+      redirectToLogin()
     }
     return Promise.reject(error)
   }
 )
 
+function newIdempotencyKey(): string {
+  if (typeof crypto !== 'undefined' && typeof crypto.randomUUID === 'function') return crypto.randomUUID()
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}-${Math.random().toString(36).slice(2)}`
+}
+
+const SUBMIT_RETRIES = 3
 
+// 提交答案：每次作答生成一个幂等键，网络中断、超时或 5xx 时沿用同一个键重试，
+// 服务端对重复的键直接返回首次的结果，尝试次数与用时不会被重复累计
+export async function submitAnswer(payload: {
+  quiz_record_id: number
+  question_id: number
+  selected_option_id: number
+  time_taken?: number
+  attempt_count?: number
+}) {
+  const headers = { 'Idempotency-Key': newIdempotencyKey() }
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await http.post('/quiz/submit-answer', payload, { headers })
+    } catch (e: any) {
+      const status = e?.response?.status
+      if (attempt >= SUBMIT_RETRIES || (status !== undefined && status < 500)) throw e
+      await new Promise((resolve) => setTimeout(resolve, 500 * 2 ** attempt))
+    }
+  }
+}
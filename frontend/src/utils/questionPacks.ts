@@ -0,0 +1,73 @@
+import { http } from './http'
+
+// 离线题库包：按学科缓存在 localStorage，版本变化时只下载变化的题目；题库包不含答案，判分由服务端完成
+export interface PackOption { id: number; text: string }
+export interface PackQuestion {
+  id: number
+  title: string
+  content: string
+  tags: string[]
+  source?: string
+  subject_name: string
+  question_type_name: string
+  options: PackOption[]
+}
+interface StoredPack { subject: string; version: string; questions: PackQuestion[] }
+
+const storageKey = (subject: string) => `question-pack:${subject}`
+
+function loadPack(subject: string): StoredPack | null {
+  try {
+    const raw = localStorage.getItem(storageKey(subject))
+    return raw ? JSON.parse(raw) : null
+  } catch {
+    return null
+  }
+}
+
+function savePack(pack: StoredPack) {
+  try {
+    localStorage.setItem(storageKey(pack.subject), JSON.stringify(pack))
+  } catch {
+    // 存储空间不足时不缓存，下次重新下载
+  }
+}
+
+async function syncPack(subject: string, version: string): Promise<StoredPack> {
+  const cached = loadPack(subject)
+  if (cached && cached.version === version) return cached
+  const subjectPath = encodeURIComponent(subject)
+  let pack: StoredPack
+  if (cached) {
+    const { data } = await http.get(`/question-packs/${subjectPath}/delta`, { params: { since: cached.version } })
+    const byId = new Map<number, PackQuestion>(data.full ? [] : cached.questions.map((q: PackQuestion) => [q.id, q]))
+    for (const id of data.removed as number[]) byId.delete(id)
+    for (const q of data.changed as PackQuestion[]) byId.set(q.id, q)
+    pack = { subject, version: data.version, questions: [...byId.values()].sort((a, b) => a.id - b.id) }
+  } else {
+    const { data } = await http.get(`/question-packs/${subjectPath}/${version}`)
+    pack = { subject, version: data.version, questions: data.questions }
+  }
+  savePack(pack)
+  return pack
+}
+
+function shuffle<T>(items: T[]): T[] {
+  const result = items.slice()
+  for (let i = result.length - 1; i > 0; i--) {
+    const j = Math.floor(Math.random() * (i + 1))
+    ;[result[i], result[j]] = [result[j], result[i]]
+  }
+  return result
+}
+
+// 向服务端只请求本轮题目ID与顺序（参数同 /questions/random），题目内容取自本地题库包，选项顺序在本地打乱
+export async function fetchPackQuestions(subject: string, params: Record<string, any> = {}): Promise<PackQuestion[]> {
+  const { data } = await http.get('/questions/random', { params: { ...params, subject, ids_only: 1 } })
+  const pack = await syncPack(subject, data.pack_version)
+  const byId = new Map(pack.questions.map(q => [q.id, q]))
+  return (data.question_ids as number[])
+    .map(id => byId.get(id))
+    .filter((q): q is PackQuestion => !!q)
+    .map(q => ({ ...q, options: shuffle(q.options) }))
+}
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试公共夹具
+后端与数据库脚本按顶层模块导入（与直接运行时相同），应用是模块级单例：
+整个测试会话在临时目录中初始化一个数据库，设置 QUIZ_DB_PATH 后导入一次 app
+"""
+
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+for directory in ('backend', 'database', 'benchmark'):
+    sys.path.insert(0, str(ROOT_DIR / directory))
+
+from init_database import init_database  # noqa: E402
+
+def create_database(path):
+    """在 path 新建一个完整的数据库（含题库与测试用户），不输出进度"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_database(str(path))
+    return str(path)
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    db_path = create_database(tmp_path_factory.mktemp('app') / 'quiz_app.db')
+    os.environ['QUIZ_DB_PATH'] = db_path
+    os.environ['QUIZ_WARMUP'] = '0'  # 不预热，首个请求前不访问题库快照
+    os.environ['QUIZ_TASKS_ENABLED'] = '0'  # 不启动后台线程，测试中按需直接调用
+    os.environ['QUIZ_MAINTENANCE_ENABLED'] = '0'
+    from app import app as flask_app
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def db(app):
+    """直接访问应用数据库的连接（读取核对结果用）"""
+    conn = sqlite3.connect(app.config['DATABASE_PATH'])
+    conn.row_factory = sqlite3.Row
+    yield conn
+    conn.close()
+
+class Player:
+    """以一个新注册用户的身份调用答题接口"""
+
+    def __init__(self, client, username, password='test123'):
+        self.client = client
+        response = client.post('/api/register', json={'username': username, 'password': password,
+                                                       'email': f'{username}@example.com'})
+        assert response.status_code == 201, response.get_json()
+        response = client.post('/api/login', json={'username': username, 'password': password})
+        assert response.status_code == 200, response.get_json()
+        self.user_id = response.get_json()['user_id']
+        self.token = response.get_json()['access_token']
+
+    def headers(self, key=None):
+        headers = {'Authorization': f'Bearer {self.token}'}
+        if key is not None:
+            headers['Idempotency-Key'] = key
+        return headers
+
+    def start(self, question_ids, mode='study'):
+        response = self.client.post('/api/quiz/start', json={'mode': mode, 'question_ids': question_ids},
+                                    headers=self.headers())
+        assert response.status_code in (200, 201), response.get_json()
+        return response.get_json()['quiz_record_id']
+
+    def submit(self, quiz_record_id, question_id, option_id, time_taken, key=None):
+        return self.client.post('/api/quiz/submit-answer', json={
+            'quiz_record_id': quiz_record_id,
+            'question_id': question_id,
+            'selected_option_id': option_id,
+            'time_taken': time_taken,
+        }, headers=self.headers(key))
+
+    def finish(self, quiz_record_id):
+        return self.client.post('/api/quiz/finish', json={'quiz_record_id': quiz_record_id},
+                                headers=self.headers())
+
+@pytest.fixture
+def new_player(client):
+    """按名称注册并登录一个新用户"""
+    return lambda username: Player(client, username)
+
+def question_options(conn, count, offset=0):
+    """前 count 道题（按 id，跳过 offset 道）的 [(题目ID, 正确选项ID, 错误选项ID)]"""
+    rows = conn.execute("""
+        SELECT q.id,
+               (SELECT MIN(id) FROM options WHERE question_id = q.id AND is_correct),
+               (SELECT MIN(id) FROM options WHERE question_id = q.id AND NOT is_correct)
+        FROM questions q ORDER BY q.id LIMIT ? OFFSET ?
+    """, (count, offset)).fetchall()
+    return [tuple(row) for row in rows]
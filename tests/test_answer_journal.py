@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""作答日志：压缩后的单题记录、用户累计、逐题统计与掌握度与直接写入一致"""
+
+from conftest import question_options
+from services import answer_journal
+from services.maintenance import connect as maintenance_connect
+
+# 学习模式的一轮作答：(题目序号, 是否选正确选项, 用时毫秒)，同一题重复作答会合并为一行
+SCRIPT = [
+    (0, False, 4000), (0, True, 2500),
+    (1, True, 1200),
+    (2, False, 800), (2, False, 900), (2, True, 3000),
+    (3, False, 61000),
+]
+
+def play(player, questions):
+    quiz_record_id = player.start([question_id for question_id, _, _ in questions])
+    for index, correct, time_taken in SCRIPT:
+        question_id, right, wrong = questions[index]
+        response = player.submit(quiz_record_id, question_id, right if correct else wrong, time_taken)
+        assert response.status_code == 200, response.get_json()
+    return quiz_record_id
+
+def answers(db, quiz_record_id):
+    return [tuple(row) for row in db.execute("""
+        SELECT question_id, selected_option_id, is_correct, attempt_count, time_taken
+        FROM question_answers WHERE quiz_record_id = ? ORDER BY question_id
+    """, (quiz_record_id,))]
+
+def user_totals(db, user_id):
+    return tuple(db.execute(
+        "SELECT total_questions_answered, total_correct_answers FROM users WHERE id = ?", (user_id,)
+    ).fetchone())
+
+def mastery_rows(db, user_id):
+    # 复习时间取决于作答时刻，只比较计数
+    return [tuple(row) for row in db.execute("""
+        SELECT question_id, attempts, correct, avg_time_taken, streak
+        FROM user_question_stats WHERE user_id = ? ORDER BY question_id
+    """, (user_id,))]
+
+def question_stats(db):
+    """逐题统计汇总的当前值：(表, 键) -> 计数"""
+    stats = {}
+    for table, keys, values in (
+        ('question_stats', ('question_id',), ('answers', 'attempts', 'first_try_correct', 'total_time_taken')),
+        ('question_time_buckets', ('question_id', 'bucket'), ('answers',)),
+        ('question_option_picks', ('question_id', 'option_id'), ('picks',)),
+    ):
+        for row in db.execute(f"SELECT {', '.join(keys + values)} FROM {table}"):
+            for offset, column in enumerate(values):
+                stats[(table, column) + tuple(row)[:len(keys)]] = row[len(keys) + offset]
+    return stats
+
+def delta(before, after):
+    return {key: after.get(key, 0) - before.get(key, 0)
+            for key in before.keys() | after.keys() if after.get(key, 0) != before.get(key, 0)}
+
+def test_compacted_journal_matches_direct_writes(app, db, new_player):
+    questions = question_options(db, 4)
+    direct, journaled = new_player('journal_direct'), new_player('journal_events')
+
+    stats = question_stats(db)
+    app.config['ANSWER_JOURNAL'] = False
+    direct_quiz = play(direct, questions)
+    direct_delta = delta(stats, question_stats(db))
+
+    stats = question_stats(db)
+    app.config['ANSWER_JOURNAL'] = True
+    try:
+        journaled_quiz = play(journaled, questions)
+    finally:
+        app.config['ANSWER_JOURNAL'] = False
+    pending = db.execute("SELECT COUNT(*) FROM answer_events WHERE quiz_record_id = ?",
+                         (journaled_quiz,)).fetchone()[0]
+    assert pending == len(SCRIPT)
+    assert answers(db, journaled_quiz) == []
+
+    # 后台压缩：小批量，同一题的事件分在不同批次中
+    conn = maintenance_connect(app.config['DATABASE_PATH'])
+    try:
+        assert answer_journal.compact(conn, batch_size=3) == len(SCRIPT)
+    finally:
+        conn.close()
+
+    assert db.execute("SELECT COUNT(*) FROM answer_events").fetchone()[0] == 0
+    assert answers(db, journaled_quiz) == answers(db, direct_quiz)
+    assert user_totals(db, journaled.user_id) == user_totals(db, direct.user_id)
+    assert mastery_rows(db, journaled.user_id) == mastery_rows(db, direct.user_id)
+    assert delta(stats, question_stats(db)) == direct_delta
+
+    direct_result, journaled_result = direct.finish(direct_quiz), journaled.finish(journaled_quiz)
+    assert direct_result.status_code == journaled_result.status_code == 200
+    for field in ('total_questions', 'correct_answers'):
+        assert journaled_result.get_json()[field] == direct_result.get_json()[field]
+
+def test_finish_compacts_pending_events(app, db, new_player):
+    questions = question_options(db, 4, offset=4)
+    direct, journaled = new_player('finish_direct'), new_player('finish_events')
+
+    app.config['ANSWER_JOURNAL'] = False
+    direct_quiz = play(direct, questions)
+    app.config['ANSWER_JOURNAL'] = True
+    try:
+        journaled_quiz = play(journaled, questions)
+    finally:
+        app.config['ANSWER_JOURNAL'] = False
+
+    # 未经后台压缩直接结束：结束答题在自己的事务中合并本轮的事件
+    direct_result, journaled_result = direct.finish(direct_quiz), journaled.finish(journaled_quiz)
+    assert direct_result.status_code == journaled_result.status_code == 200
+    assert db.execute("SELECT COUNT(*) FROM answer_events WHERE quiz_record_id = ?",
+                      (journaled_quiz,)).fetchone()[0] == 0
+    assert answers(db, journaled_quiz) == answers(db, direct_quiz)
+    assert user_totals(db, journaled.user_id) == user_totals(db, direct.user_id)
+    for field in ('total_questions', 'correct_answers'):
+        assert journaled_result.get_json()[field] == direct_result.get_json()[field]
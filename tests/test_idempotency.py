@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""提交答案的幂等重放：同一个键只计入一次，重试返回首次的结果"""
+
+from conftest import question_options
+from services import idempotency
+
+def answer_row(db, quiz_record_id, question_id):
+    return tuple(db.execute("""
+        SELECT COUNT(*), SUM(attempt_count), SUM(time_taken)
+        FROM question_answers WHERE quiz_record_id = ? AND question_id = ?
+    """, (quiz_record_id, question_id)).fetchone())
+
+def test_replay_returns_first_response_once(db, new_player):
+    (question_id, right, _), = question_options(db, 1, offset=8)
+    player = new_player('idempotent_retry')
+    quiz_record_id = player.start([question_id])
+
+    first = player.submit(quiz_record_id, question_id, right, 3000, key='answer-1')
+    assert first.status_code == 200
+    assert 'Idempotent-Replayed' not in first.headers
+
+    # 进程内缓存命中
+    retry = player.submit(quiz_record_id, question_id, right, 3000, key='answer-1')
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+
+    # 缓存已淘汰（重启或由其他进程处理）：从幂等记录表重放
+    idempotency.replays.entries.clear()
+    retry = player.submit(quiz_record_id, question_id, right, 3000, key='answer-1')
+    assert retry.status_code == 200
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.get_json() == first.get_json()
+
+    assert answer_row(db, quiz_record_id, question_id) == (1, 1, 3000)
+    assert db.execute("SELECT COUNT(*) FROM answer_submissions WHERE user_id = ?",
+                      (player.user_id,)).fetchone()[0] == 1
+
+def test_key_reused_for_different_request_is_rejected(db, new_player):
+    (question_id, right, wrong), = question_options(db, 1, offset=9)
+    player = new_player('idempotent_conflict')
+    quiz_record_id = player.start([question_id])
+
+    assert player.submit(quiz_record_id, question_id, wrong, 2000, key='answer-1').status_code == 200
+    conflict = player.submit(quiz_record_id, question_id, right, 2000, key='answer-1')
+    assert conflict.status_code == 409
+    assert answer_row(db, quiz_record_id, question_id) == (1, 1, 2000)
+
+    # 新的键是一次新的作答（学习模式累计尝试次数与用时）
+    assert player.submit(quiz_record_id, question_id, right, 1000, key='answer-2').status_code == 200
+    assert answer_row(db, quiz_record_id, question_id) == (1, 2, 3000)
+
+def test_invalid_key_is_rejected(db, new_player):
+    (question_id, right, _), = question_options(db, 1, offset=10)
+    player = new_player('idempotent_invalid')
+    quiz_record_id = player.start([question_id])
+
+    assert player.submit(quiz_record_id, question_id, right, 1000, key='x' * 200).status_code == 400
+    assert answer_row(db, quiz_record_id, question_id) == (0, None, None)
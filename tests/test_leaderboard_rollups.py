@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""排行榜汇总表：各时段只保留每个用户的最佳成绩，过期时段在跨日后清理"""
+
+import datetime
+import shutil
+import sqlite3
+
+import pytest
+
+from conftest import create_database
+from services import leaderboard_rollups
+from services.leaderboard_rollups import PERIODS
+
+NOW = datetime.datetime(2024, 5, 1, 12, 0, 0)  # 周三
+
+@pytest.fixture(scope='module')
+def template(tmp_path_factory):
+    return create_database(tmp_path_factory.mktemp('rollups') / 'template.db')
+
+@pytest.fixture
+def conn(template, tmp_path):
+    # 每个用例使用新的数据库文件（清理与首次重建的检查按文件各做一次）
+    conn = sqlite3.connect(shutil.copy(template, tmp_path / 'rollups.db'))
+    yield conn
+    conn.close()
+
+def record(conn, mode, quiz_record_id, correct_answers, total_questions, time_spent, now=NOW, user_id=2):
+    leaderboard_rollups.record_result(conn, user_id, mode, quiz_record_id, correct_answers, total_questions,
+                                      time_spent, str(now), now)
+
+def best(conn, mode, user_id=2):
+    """各时段当前保留的 {时段: (时段起始, 答题记录ID)}"""
+    return {row[0]: (row[1], row[2]) for row in conn.execute(
+        "SELECT period, period_start, quiz_record_id FROM leaderboard_rollups WHERE mode = ? AND user_id = ?",
+        (mode, user_id)
+    )}
+
+def kept(conn, mode, quiz_record_id):
+    assert {period: entry[1] for period, entry in best(conn, mode).items()} == dict.fromkeys(PERIODS, quiz_record_id)
+
+def test_speed_keeps_most_correct_then_fastest(conn):
+    record(conn, 'speed', 1, 5, 10, 60)
+    assert best(conn, 'speed') == {'daily': ('2024-05-01', 1), 'weekly': ('2024-04-29', 1), 'all': ('', 1)}
+
+    record(conn, 'speed', 2, 4, 10, 30)  # 答对更少：不覆盖
+    kept(conn, 'speed', 1)
+    record(conn, 'speed', 3, 5, 10, 50)  # 答对相同、用时更短：覆盖
+    kept(conn, 'speed', 3)
+    record(conn, 'speed', 4, 5, 10, 55)
+    kept(conn, 'speed', 3)
+    record(conn, 'speed', 5, 7, 10, 90)
+    kept(conn, 'speed', 5)
+
+def test_study_keeps_most_questions(conn):
+    record(conn, 'study', 1, 8, 20, 300)
+    record(conn, 'study', 2, 15, 15, 100)  # 题数更少：不覆盖
+    kept(conn, 'study', 1)
+    record(conn, 'study', 3, 5, 30, 200)
+    kept(conn, 'study', 3)
+    # 两种模式互不影响
+    record(conn, 'speed', 4, 1, 10, 10)
+    kept(conn, 'study', 3)
+    kept(conn, 'speed', 4)
+
+def test_rollover_starts_new_periods(conn):
+    record(conn, 'speed', 1, 9, 10, 30)
+    # 次日的成绩较差：当日榜重新开始，本周与总榜保留原成绩，前一日的当日榜被清理
+    tomorrow = NOW + datetime.timedelta(days=1)
+    record(conn, 'speed', 2, 3, 10, 30, now=tomorrow)
+    assert best(conn, 'speed') == {'daily': ('2024-05-02', 2), 'weekly': ('2024-04-29', 1), 'all': ('', 1)}
+
+    next_week = NOW + datetime.timedelta(days=7)
+    record(conn, 'speed', 3, 2, 10, 30, now=next_week)
+    assert best(conn, 'speed') == {'daily': ('2024-05-08', 3), 'weekly': ('2024-05-06', 3), 'all': ('', 1)}
+    assert conn.execute("SELECT COUNT(*) FROM leaderboard_rollups").fetchone()[0] == 3
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""发布/订阅中心：订阅数上限（总数与按主题类别）、同一用户重连时取代旧订阅"""
+
+import threading
+
+from services.pubsub import PubSubHub
+
+def test_kind_limit_and_total_limit():
+    hub = PubSubHub(max_subscribers=3)
+    hub.limits['battle'] = 2
+    first, second = hub.subscribe('battle:AAAAAA', owner=1), hub.subscribe('battle:BBBBBB', owner=1)
+    assert first and second
+    assert hub.subscribe('battle:AAAAAA', owner=2) is None
+    leaderboard = hub.subscribe('leaderboard:speed', owner=2)
+    assert leaderboard is not None
+    assert hub.subscribe('leaderboard:study', owner=2) is None  # 总数已满
+
+    hub.unsubscribe(second)
+    hub.unsubscribe(second)  # 重复取消不影响计数
+    assert hub.subscriber_count() == 2 and hub.kind_counts['battle'] == 1
+    assert hub.subscribe('battle:CCCCCC', owner=3) is not None
+
+def test_reconnect_supersedes_stale_stream():
+    hub = PubSubHub()
+    hub.limits['battle'] = 1
+    stale = hub.subscribe('battle:AAAAAA', owner=1)
+    received = []
+    waiting = threading.Thread(target=lambda: received.append(stale.get(30)))
+    waiting.start()
+
+    # 上限已满，但同一用户重连时取代旧订阅
+    fresh = hub.subscribe('battle:AAAAAA', owner=1)
+    waiting.join(5)
+    assert fresh is not None and not waiting.is_alive()
+    assert stale.superseded and not fresh.superseded
+    assert hub.subscriber_count('battle:AAAAAA') == 1
+
+    # 旧连接退出时的取消订阅不影响新订阅
+    hub.unsubscribe(stale)
+    assert hub.subscriber_count() == 1 and hub.kind_counts['battle'] == 1
+    assert hub.publish('battle:AAAAAA', b'data') == 1 and fresh.get(0) == b'data'
+    # 其他用户不受影响，仍受上限约束
+    assert hub.subscribe('battle:AAAAAA', owner=2) is None
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""自动结束被放弃的答题：在后台线程（没有应用上下文）中执行，并向排行榜订阅者推送"""
+
+import json
+
+from conftest import question_options
+from api.leaderboard import board_key, stream_topic
+from services.pubsub import hub
+
+def test_sweep_publishes_to_board_subscribers(app, db, new_player):
+    (question_id, right, _), = question_options(db, 1, offset=11)
+    player = new_player('sweep_abandoned')
+    quiz_record_id = player.start([question_id], mode='speed')
+    assert player.submit(quiz_record_id, question_id, right, 2000).status_code == 200
+    # 开始时间早于自动结束的时限：视为已放弃
+    db.execute("UPDATE quiz_records SET start_time = '2000-01-01 00:00:00' WHERE id = ?", (quiz_record_id,))
+    db.commit()
+
+    quiz_tasks = app.extensions['quiz_tasks']
+    failures = quiz_tasks.snapshot()['sweep_quizzes']['failures']
+    subscriber = hub.subscribe(stream_topic(board_key('speed', 'all')))
+    try:
+        assert quiz_tasks.run_task('sweep_quizzes') >= 1
+        assert quiz_tasks.snapshot()['sweep_quizzes']['failures'] == failures
+
+        frame = subscriber.get(1)
+        assert frame is not None
+        data = json.loads(frame.decode('utf-8').split('data: ', 1)[1])
+        rows = data['leaderboard'] if 'leaderboard' in data else [change['row'] for change in data['changes']
+                                                                  if change['op'] == 'upsert']
+        assert any(row['user_id'] == player.user_id for row in rows)
+    finally:
+        hub.unsubscribe(subscriber)
+
+    completed, correct_answers = db.execute(
+        "SELECT completed, correct_answers FROM quiz_records WHERE id = ?", (quiz_record_id,)
+    ).fetchone()
+    assert completed and correct_answers == 1
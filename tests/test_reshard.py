@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""重新分片：主库 → 多个分片 → 其他分片数 → 合并回主库，各表的行（含ID）与逐题统计保持不变"""
+
+import collections
+import io
+import os
+import sqlite3
+
+import pytest
+
+import reshard
+from seed import seed_database
+from services import answer_journal
+from services.shards import default_shard_paths, shard_index
+
+# 随用户搬移的表（与 reshard.py 核对行数的表相同）
+USER_TABLES = ('quiz_records', 'question_answers', 'archived_quizzes') + reshard.USER_TABLES
+
+@pytest.fixture
+def main_path(tmp_path):
+    path = str(tmp_path / 'quiz_app.db')
+    seed_database(path, users=12, quizzes_per_user=4, answers_per_quiz=5, questions=40, seed=7, log=io.StringIO())
+    conn = sqlite3.connect(path)
+    # 一条已归档标记，覆盖跟随答题记录搬移的表
+    conn.execute("INSERT INTO archived_quizzes (quiz_record_id) SELECT MIN(id) FROM quiz_records")
+    conn.commit()
+    conn.close()
+    return path
+
+def table_rows(paths, table):
+    """各库中该表的全部行（合在一起排序，与所在的库无关）"""
+    rows = []
+    for path in paths:
+        conn = sqlite3.connect(path)
+        try:
+            rows += [tuple(row) for row in conn.execute(f"SELECT * FROM {table}")]
+        finally:
+            conn.close()
+    return sorted(rows, key=repr)
+
+def snapshot(paths):
+    return {table: table_rows(paths, table) for table in USER_TABLES}
+
+def question_stats(paths):
+    """各库逐题统计之和"""
+    totals = collections.Counter()
+    for table, keys, values in reshard.STAT_TABLES:
+        for path in paths:
+            conn = sqlite3.connect(path)
+            try:
+                for row in conn.execute(f"SELECT {', '.join(keys + values)} FROM {table}"):
+                    for offset, column in enumerate(values):
+                        totals[(table, column) + tuple(row)[:len(keys)]] += row[len(keys) + offset]
+            finally:
+                conn.close()
+    return {key: value for key, value in totals.items() if value}
+
+def user_totals(paths):
+    totals = {}
+    for path in paths:
+        conn = sqlite3.connect(path)
+        try:
+            totals.update((row[0], row[1:]) for row in conn.execute(
+                "SELECT id, total_questions_answered, total_correct_answers FROM users"
+            ))
+        finally:
+            conn.close()
+    return totals
+
+def run_reshard(main_path, shard_count):
+    reshard.reshard(main_path, shard_count, batch_size=50, log=lambda message: None)
+    return default_shard_paths(main_path, shard_count) or [main_path]
+
+def test_round_trip_preserves_rows_and_ids(main_path):
+    original = snapshot([main_path])
+    stats = question_stats([main_path])
+    totals = user_totals([main_path])
+    assert original['quiz_records'] and original['question_answers'] and original['archived_quizzes']
+
+    for shard_count in (3, 2, 0):
+        paths = run_reshard(main_path, shard_count)
+        assert snapshot(paths) == original, f'{shard_count} 个分片'
+        assert question_stats(paths) == stats, f'{shard_count} 个分片'
+        if shard_count:
+            # 用户数据都在其所属的分片中
+            for index, path in enumerate(paths):
+                conn = sqlite3.connect(path)
+                try:
+                    user_ids = {row[0] for row in conn.execute("SELECT DISTINCT user_id FROM quiz_records")}
+                finally:
+                    conn.close()
+                assert all(shard_index(user_id, shard_count) == index for user_id in user_ids)
+            shard_totals = user_totals(paths)
+            assert all(shard_totals[user_id] == totals[user_id] for user_id in shard_totals)
+        else:
+            assert user_totals(paths) == totals
+            assert not any(os.path.exists(path) for path in default_shard_paths(main_path, 3))
+
+def test_reshard_compacts_journal_first(main_path):
+    conn = sqlite3.connect(main_path)
+    quiz_record_id, user_id, question_id = conn.execute("""
+        SELECT qa.quiz_record_id, qr.user_id, qa.question_id
+        FROM question_answers qa JOIN quiz_records qr ON qr.id = qa.quiz_record_id
+        ORDER BY qa.id LIMIT 1
+    """).fetchone()
+    answer_journal.ensure_journal(conn)
+    answer_journal.append_event(conn, quiz_record_id, user_id, question_id, None, False, 1, 500)
+    conn.commit()
+    attempts = conn.execute(
+        "SELECT attempt_count FROM question_answers WHERE quiz_record_id = ? AND question_id = ?",
+        (quiz_record_id, question_id)
+    ).fetchone()[0]
+    conn.close()
+
+    paths = run_reshard(main_path, 2)
+    merged = [row for row in table_rows(paths, 'question_answers')
+              if row[1:3] == (quiz_record_id, question_id)]
+    assert len(merged) == 1
+    shard = sqlite3.connect(paths[shard_index(user_id, 2)])
+    try:
+        assert shard.execute(
+            "SELECT attempt_count FROM question_answers WHERE quiz_record_id = ? AND question_id = ?",
+            (quiz_record_id, question_id)
+        ).fetchone()[0] == attempts + 1
+    finally:
+        shard.close()
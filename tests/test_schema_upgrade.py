@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""旧库升级：补建后与新建的数据库对象一致，题库快照在升级后的库上可用"""
+
+import sqlite3
+import time
+
+import pytest
+
+from conftest import create_database
+from services.bank_snapshot import bank_revision, write_snapshot
+from services.question_bank import QuestionBank, load_subject_bank
+from services.schema import upgrade_databases
+
+# 升级机制引入之前的数据库中已有的对象（database_schema.sql 与最初的 extended_schema.sql）
+BASELINE_OBJECTS = {
+    'subjects', 'question_types', 'questions', 'options',
+    'idx_questions_subject', 'idx_questions_type', 'idx_questions_difficulty', 'idx_options_question',
+    'update_questions_timestamp',
+    'users', 'user_sessions', 'quiz_records', 'question_answers',
+    'speed_leaderboard', 'study_leaderboard', 'user_stats',
+    'idx_users_username', 'idx_user_sessions_user_id', 'idx_user_sessions_token_jti', 'idx_quiz_records_user_id',
+    'idx_quiz_records_mode', 'idx_quiz_records_created_at', 'idx_question_answers_quiz_record_id',
+    'idx_question_answers_question_id',
+    'update_user_stats_after_answer', 'cleanup_expired_sessions',
+}
+
+def schema_objects(conn):
+    return {tuple(row) for row in conn.execute(
+        "SELECT type, name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'"
+    )}
+
+@pytest.fixture(scope='module')
+def fresh_path(tmp_path_factory):
+    return create_database(tmp_path_factory.mktemp('upgrade') / 'fresh.db')
+
+@pytest.fixture
+def old_path(fresh_path, tmp_path):
+    """新建后删去升级机制引入之后新增的对象，模拟旧库"""
+    path = str(tmp_path / 'old.db')
+    source, conn = sqlite3.connect(fresh_path), sqlite3.connect(path)
+    source.backup(conn)
+    source.close()
+    for kind in ('trigger', 'index', 'table'):
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = ? AND name NOT LIKE 'sqlite_%'",
+                                    (kind,)).fetchall():
+            if name not in BASELINE_OBJECTS:
+                conn.execute(f"DROP {kind.upper()} {name}")
+    conn.commit()
+    assert bank_revision(conn) is None
+    conn.close()
+    return path
+
+def test_upgrade_creates_every_new_object(fresh_path, old_path):
+    upgraded = upgrade_databases([old_path])
+    assert 'bank_revision' in upgraded[old_path]
+
+    fresh, old = sqlite3.connect(fresh_path), sqlite3.connect(old_path)
+    try:
+        assert schema_objects(old) == schema_objects(fresh)
+    finally:
+        fresh.close()
+        old.close()
+    # 再次升级不再新建
+    assert upgrade_databases([old_path]) == {old_path: []}
+
+def test_history_query_uses_covering_index(old_path):
+    upgrade_databases([old_path])
+    conn = sqlite3.connect(old_path)
+    try:
+        plan = ' '.join(row[3] for row in conn.execute("""
+            EXPLAIN QUERY PLAN
+            SELECT id, created_at FROM quiz_records WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT 21
+        """, (1,)))
+    finally:
+        conn.close()
+    assert 'COVERING INDEX idx_quiz_records_user_history' in plan
+    assert 'TEMP B-TREE' not in plan
+
+def test_snapshot_is_used_after_upgrade(old_path, tmp_path):
+    upgrade_databases([old_path])
+    conn = sqlite3.connect(old_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        assert bank_revision(conn) == 0
+        snapshot_path = str(tmp_path / 'old.bank')
+        write_snapshot(conn, snapshot_path)
+
+        bank = QuestionBank(snapshot_path=snapshot_path)
+        snapshot = bank._current_snapshot(conn, time.monotonic())
+        assert snapshot is not None and snapshot.revision == 0
+        subject = conn.execute("SELECT name FROM subjects ORDER BY id LIMIT 1").fetchone()[0]
+        assert bank.get(conn, subject) is snapshot.subject(subject)
+        assert [dict(question) for question in snapshot.subject(subject).questions] == \
+            load_subject_bank(conn, subject).questions
+
+        # 题库被修改后修订号递增，快照不再使用
+        conn.execute("UPDATE questions SET title = title || '（改）' WHERE id = (SELECT MIN(id) FROM questions)")
+        conn.commit()
+        assert bank_revision(conn) > 0
+        bank.invalidate()
+        assert bank._current_snapshot(conn, time.monotonic()) is None
+    finally:
+        conn.close()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""分片模式下请求中打开的分片连接都会被关闭（只有一个分片）"""
+
+import sqlite3
+
+import pytest
+
+from api.leaderboard import cached_board, count_better_results
+from services.leaderboard_cache import leaderboard_cache
+from services.schema import SCHEMA_PATH
+from services.shards import router as shard_router, init_shard
+
+class TrackedConnection(sqlite3.Connection):
+    """记录是否附加过主库（即分片连接）以及是否已关闭"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.attached = self.closed = False
+        opened.append(self)
+
+    def execute(self, sql, *args):
+        if sql.lstrip().upper().startswith('ATTACH'):
+            self.attached = True
+        return super().execute(sql, *args)
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+opened = []
+
+def open_shard_connections():
+    return [conn for conn in opened if conn.attached and not conn.closed]
+
+@pytest.fixture
+def sharded(app, monkeypatch, tmp_path):
+    shard_path = str(tmp_path / 'quiz_app.shard0.db')
+    conn = sqlite3.connect(shard_path)
+    init_shard(conn, 0, 1, SCHEMA_PATH.read_text(encoding='utf-8'))
+    conn.close()
+    monkeypatch.setattr(shard_router, 'shard_paths', [shard_path])
+    monkeypatch.setitem(app.config, 'DB_CONNECTION_FACTORY', TrackedConnection)
+    opened.clear()
+    yield
+    opened.clear()
+
+def test_requests_close_shard_connections(sharded, client, new_player):
+    player = new_player('shard_connections')
+    assert open_shard_connections() == []
+
+    for key in ('stats', 'speed'):
+        leaderboard_cache.invalidate(key)
+    group = client.post('/api/groups', json={'name': '分片连接'}, headers=player.headers())
+    assert group.status_code == 201
+    for url in (
+        '/api/questions/random?subject=语文&limit=5&strategy=adaptive',
+        '/api/questions/1/stats',
+        '/api/profile',
+        '/api/leaderboard/personal',
+        '/api/leaderboard/stats',
+        '/api/leaderboard/speed',
+        f"/api/groups/{group.get_json()['id']}/leaderboard",
+    ):
+        response = client.get(url, headers=player.headers())
+        assert response.status_code == 200, (url, response.get_json())
+        assert open_shard_connections() == [], url
+    assert any(conn.attached for conn in opened)
+
+def test_shard_loops_close_before_context_ends(sharded, app):
+    with app.app_context():
+        leaderboard_cache.invalidate('speed')
+        cached_board('speed')
+        count_better_results('speed', 0, 0)
+        assert opened and open_shard_connections() == []